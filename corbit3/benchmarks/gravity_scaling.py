@@ -0,0 +1,83 @@
+#! /usr/bin/env python3
+"""Measures how much faster gravity gets when it's spread over several processes with corbit.parallel, compared to
+working it out in one process with corbit.batch.gravity_on().
+
+Run from corbit3/, like server.py and client.py:
+    python benchmarks/gravity_scaling.py                # 1, 2, 4, ... workers, up to one per CPU
+    python benchmarks/gravity_scaling.py 1 2 3 6 12     # those worker counts
+
+Worlds are random discs of bodies, from a few hundred up to tens of thousands of them.
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy
+
+import corbit.batch
+import corbit.parallel
+
+BODIES = [500, 2000, 5000, 10000, 20000]
+RUNS = 5    # each measurement is the best of this many runs
+TICK = 1 / 60  # s, for comparing against
+
+
+def random_world(count, seed=0):
+    random = numpy.random.RandomState(seed)
+    radius = numpy.sqrt(random.uniform(0, 1, count)) * 1e11
+    theta = random.uniform(0, 2 * numpy.pi, count)
+    positions = numpy.column_stack((radius * numpy.cos(theta), radius * numpy.sin(theta)))
+    masses = random.uniform(1e20, 1e24, count)
+    return positions, masses
+
+
+def best_time(function):
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    if len(sys.argv) > 1:
+        worker_counts = [int(arg) for arg in sys.argv[1:]]
+    else:
+        worker_counts = [1]
+        while worker_counts[-1] * 2 <= (os.cpu_count() or 1):
+            worker_counts.append(worker_counts[-1] * 2)
+        if worker_counts[-1] != os.cpu_count():
+            worker_counts.append(os.cpu_count())
+
+    print("%d CPUs" % os.cpu_count())
+    print("%8s %12s" % ("bodies", "1 process") + "".join("%18s" % ("%d workers" % n) for n in worker_counts))
+
+    pools = {n: corbit.parallel.ParallelGravity(max(BODIES), workers=n) for n in worker_counts}
+    try:
+        for count in BODIES:
+            positions, masses = random_world(count)
+            expected = corbit.batch.gravity_on(positions, positions, masses, offset=0)
+            single = best_time(lambda: corbit.batch.gravity_on(positions, positions, masses, offset=0))
+            line = "%8d %10.1fms" % (count, single * 1000)
+            for n in worker_counts:
+                pool = pools[n]
+                pool.positions[:count] = positions
+                pool.masses[:count] = masses
+                assert numpy.allclose(pool.compute(count), expected, rtol=1e-9, atol=0)
+                parallel = best_time(lambda: pool.compute(count))
+                line += " %8.1fms %5.2fx" % (parallel * 1000, single / parallel)
+            if single > TICK:
+                line += "   (one process can't keep up with 60 ticks/s)"
+            print(line)
+    finally:
+        for pool in pools.values():
+            pool.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
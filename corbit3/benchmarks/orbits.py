@@ -0,0 +1,169 @@
+#! /usr/bin/env python3
+"""Checks that corbit.orbits gives the same answers as corbit.physics, and measures how much faster it is.
+
+Run from corbit3/, like server.py and client.py:
+    python benchmarks/orbits.py
+
+Every body of OCESS.json against Earth and every pair of them is checked against the scalar functions, then the
+scalar and array versions are timed for one reference against every body of OCESS.json and of a synthetic scene with
+10000 bodies, and every pair and RECORDED_FRAMES propagated frames of OCESS.json are timed with the array versions.
+Exits with 1 if any answer is off by more than TOLERANCE.
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy
+from unum.units import m, s
+
+import corbit.batch
+import corbit.mysqlio
+import corbit.orbits
+import corbit.physics
+
+REFERENCE = "Earth"
+SYNTHETIC_BODIES = 10000
+RECORDED_FRAMES = 1000
+TOLERANCE = 1e-6    # relative
+FUNCTIONS = ["distance", "speed", "altitude", "Vcen", "Vtan", "Vorbit", "semimajor_axis", "ecc", "periapsis",
+             "apoapsis"]
+
+
+def arguments(function, A, B):
+    """:return: the arguments function in corbit.orbits takes, from A's and B's (positions, velocities, masses,
+    radii)"""
+    positions, velocities, masses, radii = range(4)
+    columns = {"distance": (positions,), "speed": (velocities,), "altitude": (positions, radii),
+               "Vcen": (positions, velocities), "Vtan": (positions, velocities), "Vorbit": (positions, masses),
+               "semimajor_axis": (positions, velocities, masses), "ecc": (positions, velocities, masses),
+               "periapsis": (positions, velocities, masses, radii), "apoapsis": (positions, velocities, masses, radii)}
+    return [side[column] for column in columns[function] for side in (A, B)]
+
+
+def scalar(function, A, B):
+    """:return: corbit.physics' answer as a plain number"""
+    answer = getattr(corbit.physics, function)(A, B)
+    if function == "ecc":
+        return float(answer)
+    return answer.asNumber(m / s if function in ("speed", "Vcen", "Vtan", "Vorbit") else m)
+
+
+def state(world):
+    return world.positions, world.velocities, world.masses, world.radii
+
+
+def off(expected, got):
+    """:return: the worst relative difference, counting nan as a match for nan"""
+    expected = numpy.asarray(expected, dtype=float)
+    both_nan = numpy.isnan(expected) & numpy.isnan(got)
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        difference = numpy.abs(got - expected) / numpy.maximum(numpy.abs(expected), 1.0)
+    difference[both_nan] = 0.0
+    difference[numpy.isnan(difference)] = numpy.inf
+    return difference.max()
+
+
+def check(entities, world):
+    """:return: True if every function agrees with corbit.physics for every body against REFERENCE and every pair"""
+    reference = world.index(REFERENCE)
+    everything = state(world)
+    one = tuple(column[reference] for column in everything)
+    all_pairs = [corbit.orbits.pairs(column) for column in everything]
+    A = tuple(column[0] for column in all_pairs)
+    B = tuple(column[1] for column in all_pairs)
+    ok = True
+    for function in FUNCTIONS:
+        array = getattr(corbit.orbits, function)
+        expected = [scalar(function, entity, entities[reference]) for i, entity in enumerate(entities)
+                    if i != reference]
+        got = numpy.delete(array(*arguments(function, everything, one)), reference)
+        worst = off(expected, got)
+
+        with numpy.errstate(all="ignore"):
+            expected = [[scalar(function, a, b) for b in entities] for a in entities]
+        got = array(*arguments(function, A, B))
+        expected, got = numpy.array(expected), numpy.array(got)
+        # the scalar versions divide by zero on the diagonal
+        diagonal = numpy.eye(len(entities), dtype=bool)
+        worst = max(worst, off(expected[~diagonal], got[~diagonal]))
+        print("%-16s worst relative difference %g" % (function, worst))
+        ok &= worst <= TOLERANCE
+    return ok
+
+
+def synthetic(count=SYNTHETIC_BODIES, seed=0):
+    """:return: a World with count bodies scattered around a star at the center"""
+    random = numpy.random.RandomState(seed)
+    radius = random.uniform(1e10, 1e12, count)
+    phase = random.uniform(0, 2 * numpy.pi, count)
+    speed = numpy.sqrt(corbit.batch.G * 2e30 / radius) * random.uniform(0.5, 1.5, count)
+    positions = numpy.column_stack((radius * numpy.cos(phase), radius * numpy.sin(phase)))
+    velocities = numpy.column_stack((-speed * numpy.sin(phase), speed * numpy.cos(phase)))
+    return corbit.batch.World(["Sun"] + ["body %d" % i for i in range(count - 1)],
+                              numpy.r_[2e30, numpy.full(count - 1, 1e20)], numpy.r_[7e8, numpy.full(count - 1, 1e5)],
+                              numpy.r_[[[0, 0]], positions[1:]], numpy.r_[[[0, 0]], velocities[1:]])
+
+
+def timed(function, repeat=5):
+    """:return: the best time out of repeat, in s"""
+    best = numpy.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def everything(A, B):
+    # what a HUD table needs, all at once
+    positions_A, velocities_A, masses_A, radii_A = A
+    positions_B, velocities_B, masses_B, radii_B = B
+    corbit.orbits.altitude(positions_A, positions_B, radii_A, radii_B)
+    corbit.orbits.speed(velocities_A, velocities_B)
+    corbit.orbits.Vorbit(positions_A, positions_B, masses_A, masses_B)
+    corbit.orbits.apsides(positions_A, positions_B, velocities_A, velocities_B, masses_A, masses_B, radii_A, radii_B)
+
+
+def main():
+    with open("saves/OCESS.json", "r") as loadfile:
+        entities = corbit.mysqlio.load_json(loadfile)
+    world = corbit.batch.World.from_entities(entities)
+    ok = check(entities, world)
+
+    print()
+    print("%-44s %12s %12s" % ("altitude, speed, Vorbit, periapsis, apoapsis", "scalar ms", "array ms"))
+    reference = entities[world.index(REFERENCE)]
+    scalar_time = timed(lambda: [(corbit.physics.altitude(entity, reference), corbit.physics.speed(entity, reference),
+                                  corbit.physics.Vorbit(entity, reference), corbit.physics.periapsis(entity, reference),
+                                  corbit.physics.apoapsis(entity, reference))
+                                 for entity in entities if entity is not reference], repeat=1)
+    one = tuple(column[world.index(REFERENCE)] for column in state(world))
+    print("%-44s %12.2f %12.3f" % ("OCESS.json, every body against %s" % REFERENCE, scalar_time * 1e3,
+                                   timed(lambda: everything(state(world), one)) * 1e3))
+
+    pairs = [corbit.orbits.pairs(column) for column in state(world)]
+    print("%-44s %12s %12.3f" % ("OCESS.json, every pair", "",
+                                 timed(lambda: everything(tuple(column[0] for column in pairs),
+                                                          tuple(column[1] for column in pairs))) * 1e3))
+
+    big = synthetic()
+    print("%-44s %12s %12.3f" % ("%d bodies, every body against the star" % SYNTHETIC_BODIES, "",
+                                 timed(lambda: everything(state(big), tuple(column[0] for column in state(big))))
+                                 * 1e3))
+
+    times, positions, velocities = corbit.batch.propagate(world.copy(), 3600 * 24, RECORDED_FRAMES)
+    frames = (positions, velocities, world.masses, world.radii)
+    recorded = (positions[:, world.index(REFERENCE), numpy.newaxis], velocities[:, world.index(REFERENCE),
+                numpy.newaxis], world.masses[world.index(REFERENCE)], world.radii[world.index(REFERENCE)])
+    print("%-44s %12s %12.3f" % ("%d recorded frames, every body against %s" % (len(times), REFERENCE), "",
+                                 timed(lambda: everything(frames, recorded)) * 1e3))
+    if not ok:
+        print("corbit.orbits doesn't agree with corbit.physics")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+#! /usr/bin/env python3
+"""Measures how small corbit.snapshot gets the world compared to sending every column of every row every tick, how
+long encoding and decoding take, and checks that decoded positions are never further off than they're meant to be.
+
+Run from corbit3/, like server.py and client.py:
+    python benchmarks/snapshot_codec.py
+
+Scenes are OCESS.json and a synthetic one with 10000 bodies on circular orbits, each at normal speed and with time
+sped up 1000 times, and each for a pilot zoomed out like the pilot starts, one zoomed right in, and one zoomed way
+out that only cares about the bodies corbit.interest finds relevant, so the rest are only sent a few at a time.
+Exits with 1 if any decoded position is off by more than it should be.
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy
+
+import corbit.batch
+import corbit.interest
+import corbit.mysqlio
+import corbit.snapshot
+
+TICKS = 120             # snapshots sent per measurement
+TICK = 1 / 60           # s of real time per tick, like the server
+ACK_DELAY = 3           # ticks it takes for an acknowledgement to get back to the server
+ACCELERATIONS = [1, 1000]
+ZOOM_LEVELS = [0.0001, 1000.0]  # pixels per m, what the pilot starts at, and zoomed right in
+SYNTHETIC_BODIES = 10000
+INTEREST_ZOOM = 1e-7    # pixels per m, for the scenes where the pilot only cares about some of the bodies
+RAW_BYTES = 18 * 8      # a row, as 18 doubles
+
+
+def ocess_ticks(dt):
+    """:return: a list of (time, rows), one for every tick of OCESS.json"""
+    with open("saves/OCESS.json", "r") as loadfile:
+        entities = corbit.mysqlio.load_json(loadfile)
+    template = [corbit.mysqlio.entity_row(entity) for entity in entities]
+    world = corbit.batch.World.from_entities(entities)
+    times, positions, velocities = corbit.batch.propagate(world, dt * TICKS, TICKS)
+    ticks = []
+    for t, tick_positions, tick_velocities in zip(times, positions, velocities):
+        ticks.append((t, [row[:7] + tuple(position) + tuple(velocity) + row[11:]
+                          for row, position, velocity in zip(template, tick_positions.tolist(),
+                                                             tick_velocities.tolist())]))
+    return ticks
+
+
+def synthetic_ticks(dt, count=SYNTHETIC_BODIES, seed=0):
+    """:return: a list of (time, rows) of count bodies on circular orbits around a star"""
+    random = numpy.random.RandomState(seed)
+    radius = random.uniform(1e10, 1e12, count)
+    phase = random.uniform(0, 2 * numpy.pi, count)
+    rate = numpy.sqrt(corbit.batch.G * 2e30 / radius ** 3) * numpy.where(random.uniform(size=count) < 0.5, -1, 1)
+    statics = [("entity", "body %d" % i, 1e20, 1e5, 200, 200, 200) for i in range(count)]
+    ticks = []
+    for tick in range(TICKS + 1):
+        t = tick * dt
+        angle = phase + rate * t
+        positions = numpy.column_stack((radius * numpy.cos(angle), radius * numpy.sin(angle)))
+        velocities = numpy.column_stack((-radius * rate * numpy.sin(angle), radius * rate * numpy.cos(angle)))
+        ticks.append((t, [static + tuple(position) + tuple(velocity) + (0.0,) * 7
+                          for static, position, velocity in zip(statics, positions.tolist(), velocities.tolist())]))
+    return ticks
+
+
+def measure(ticks, zoom_level, interest=None):
+    """Sends every tick through an Encoder and a Decoder, with acknowledgements arriving ACK_DELAY ticks late
+    :param interest: a corbit.interest.Interest, to only keep the bodies it finds relevant up to date. Its camera
+    follows its control craft. Only relevant bodies are checked for being precise enough
+    :return: (bytes of the first message, average bytes once the pilot's acknowledged something, s making a
+    corbit.snapshot.Table, encode s, decode s, worst position error in m, allowed position error in m, True if that was
+    ever broken)
+    """
+    encoder = corbit.snapshot.Encoder()
+    decoder = corbit.snapshot.Decoder()
+    sizes = []
+    tabling = encoding = decoding = 0.0
+    table = None
+    worst = 0.0
+    broken = False
+    allowed = corbit.snapshot.position_error(zoom_level)
+    acknowledgements = []
+    names = [row[1] for row in ticks[0][1]]
+    radii = numpy.array([row[3] for row in ticks[0][1]])
+    for t, rows in ticks:
+        positions = numpy.array([row[7:9] for row in rows])
+        relevant = None
+        if interest is not None:
+            interest.update_view(positions[names.index(interest.control)], zoom_level)
+            relevant = interest.relevant(names, positions, radii)
+        # a server makes one of these every tick and shares it between all the pilots' encoders
+        start = time.perf_counter()
+        table = corbit.snapshot.Table(rows, table)
+        tabling += time.perf_counter() - start
+        start = time.perf_counter()
+        message = encoder.encode(table, t, relevant)
+        encoding += time.perf_counter() - start
+        start = time.perf_counter()
+        snapshot = decoder.decode(message)
+        decoding += time.perf_counter() - start
+        if encoder.acknowledged is not None or not sizes:
+            sizes.append(len(message))  # until then, everything goes in full
+
+        if encoder.acknowledged is not None:
+            # only once the encoder knows the pilot's zoom level, the first few go out with MAX_POSITION_ERROR
+            checked = numpy.ones(len(rows), dtype=bool) if relevant is None else relevant
+            exact = positions[checked]
+            error = numpy.abs(snapshot.numbers[checked, 0:2] - exact)
+            worst = max(worst, error.max())
+            # out at 1e12 m, doubles are only good to about 1e-4 m, so allow for a few of those as well
+            broken |= (error > allowed + 4 * numpy.spacing(numpy.abs(exact))).any()
+        acknowledgements.append(decoder.latest)
+        if len(acknowledgements) > ACK_DELAY:
+            encoder.acknowledge(acknowledgements.pop(0), zoom_level)
+    return (sizes[0], sum(sizes[1:]) / (len(sizes) - 1), tabling / len(ticks), encoding / len(ticks),
+            decoding / len(ticks), worst, allowed, broken)
+
+
+def main():
+    broken = False
+    print("%-29s %10s %10s %13s %6s %9s %10s %10s %10s" % ("scene", "error (m)", "first (B)", "per tick (B)", "ratio",
+                                                            "table ms", "encode ms", "decode ms", "worst (m)"))
+    scenes = (("OCESS.json", ocess_ticks, "Habitat", "Earth"),
+              ("%d bodies" % SYNTHETIC_BODIES, synthetic_ticks, "body 0", "body 1"))
+    for name, make, control, reference in scenes:
+        for acceleration in ACCELERATIONS:
+            ticks = make(TICK * acceleration)
+            raw = len(ticks[0][1]) * RAW_BYTES
+            cases = [("%s, %dx" % (name, acceleration), zoom_level, None) for zoom_level in ZOOM_LEVELS]
+            cases.append(("%s, %dx, interest" % (name, acceleration), INTEREST_ZOOM,
+                          corbit.interest.Interest(control, reference)))
+            for label, zoom_level, interest in cases:
+                first, per_tick, tabling, encoding, decoding, worst, allowed, off = measure(ticks, zoom_level, interest)
+                print("%-29s %10g %10d %13.0f %6.0f %9.2f %10.2f %10.2f %10.3g" % (
+                    label, allowed, first, per_tick, raw / per_tick, tabling * 1e3, encoding * 1e3, decoding * 1e3,
+                    worst))
+                if off:
+                    broken = True
+                    print("    positions were off by more than %g m" % allowed)
+    return 1 if broken else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+#! /usr/bin/env python3
+"""Measures how long the server takes to get to its first tick and the pilot takes to get to its first frame,
+plus which imports that time goes into.
+
+Run from corbit3/, like server.py and client.py:
+    python benchmarks/startup.py --save     # measure, and save the results as this machine's baseline
+    python benchmarks/startup.py            # measure, and compare against startup_baseline.json
+
+What's timed is server.py and client.py themselves, with CORBIT_STARTUP_ONLY set so they stop after their first
+tick or frame, and their own "First tick done in" and "First frame drawn in" times are what's compared. Neither needs
+a database: CORBIT_SQLITE points them both at a SQLite file that only lives as long as the benchmark, and the pilot
+draws to pygame's dummy video driver. Exits with 1 if anything got more than TOLERANCE times slower than the
+baseline, if either of them failed to start, or if there's no baseline to compare against. Timings depend on the
+machine, so the baseline isn't checked in, make one first.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+CORBIT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "startup_baseline.json")
+TOLERANCE = 1.5  # how much slower than the baseline is still considered fine
+RUNS = 5         # each measurement is the best of this many runs, since startup times are noisy
+TIMEOUT = 60     # s, a run that takes longer than this has hung, e.g. a pilot waiting for a world that never comes
+
+# (entry point, what it prints when it gets there). The server goes first, so there's a world for the pilot to read
+FIRST_TICK = ("server.py", "First tick done in")
+FIRST_FRAME = ("client.py", "First frame drawn in")
+
+
+def environment(sqlite_file):
+    return dict(os.environ, CORBIT_SQLITE=sqlite_file, CORBIT_STARTUP_ONLY="1", SDL_VIDEODRIVER="dummy")
+
+
+def time_to(entry_point, sqlite_file):
+    """Runs an entry point until its first tick or frame, and returns how long it said that took, in s"""
+    script, message = entry_point
+    output = subprocess.check_output([sys.executable, script], cwd=CORBIT_DIR, env=environment(sqlite_file),
+                                     universal_newlines=True, timeout=TIMEOUT)
+    for line in output.splitlines():
+        # lines look like "First tick done in 0.123 s"
+        if line.startswith(message):
+            return float(line.split()[-2])
+    raise ValueError(script + " stopped without saying \"" + message + "\"")
+
+
+def import_times(entry_point, sqlite_file, top=10):
+    """Runs an entry point with -X importtime, and returns the top slowest imports as (cumulative us, module name)
+    pairs"""
+    result = subprocess.run([sys.executable, "-X", "importtime", entry_point[0]], cwd=CORBIT_DIR,
+                            env=environment(sqlite_file), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                            universal_newlines=True, timeout=TIMEOUT)
+    times = []
+    for line in result.stderr.splitlines():
+        # lines look like "import time:       123 |       4567 | corbit.physics"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_time, cumulative, name = line[len("import time:"):].split("|")
+        times.append((int(cumulative), name.strip()))
+    return sorted(times, reverse=True)[:top]
+
+
+def measure():
+    """:return: {"first tick": s, "first frame": s}, or None if either failed to start"""
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        sqlite_file = os.path.join(directory, "corbit.sqlite3")
+        for name, entry_point in (("first tick", FIRST_TICK), ("first frame", FIRST_FRAME)):
+            try:
+                results[name] = min(time_to(entry_point, sqlite_file) for _ in range(RUNS))
+            except (subprocess.CalledProcessError, subprocess.TimeoutExpired, ValueError) as error:
+                # a startup that's broken can't be let through as if it were fast
+                print("FAILED: %s: %s" % (name, error), file=sys.stderr)
+                return None
+            print("%s: %.3f s" % (name, results[name]))
+            for cumulative, module in import_times(entry_point, sqlite_file):
+                print("    %8.1f ms  %s" % (cumulative / 1000, module))
+    return results
+
+
+def main():
+    results = measure()
+    if results is None:
+        return 1
+
+    if "--save" in sys.argv:
+        with open(BASELINE_FILE, "w") as baseline_file:
+            json.dump(results, baseline_file, indent=4, sort_keys=True)
+        print("saved baseline to", BASELINE_FILE)
+        return 0
+
+    if not os.path.exists(BASELINE_FILE):
+        # baselines depend on the machine, so there isn't one checked in. Not having one can't be let through
+        # though, or this would never catch anything
+        print("FAILED: no baseline to compare against at %s, run with --save on this machine to make one"
+              % BASELINE_FILE, file=sys.stderr)
+        return 1
+
+    with open(BASELINE_FILE, "r") as baseline_file:
+        baseline = json.load(baseline_file)
+    regressed = False
+    for name, seconds in results.items():
+        if name in baseline and seconds > baseline[name] * TOLERANCE:
+            print("REGRESSION: %s took %.3f s, baseline is %.3f s" % (name, seconds, baseline[name]))
+            regressed = True
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+#! /usr/bin/env python3
+"""Measures how fast every storage backend (see corbit.storage) is, so you can pick the fastest one that works for
+how you're running corbit. That they all behave the same way is checked by tests/test_storage.py.
+
+Run from corbit3/, like server.py and client.py:
+    python benchmarks/storage.py                                      # in memory, SQLite and shared memory
+    python benchmarks/storage.py --mysql localhost,root,pass,corbit   # MySQL as well. Empties out that database!
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import corbit.mysqlio
+import corbit.storage
+
+SECONDS = 2.0  # how long each throughput measurement runs for
+COMMANDS_PER_POP = 10
+
+
+def load_world():
+    with open("saves/OCESS.json", "r") as loadfile:
+        return corbit.mysqlio.load_json(loadfile)
+
+
+def rate(function):
+    """How many times a second function can be called"""
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < SECONDS:
+        function()
+        count += 1
+    return count / (time.perf_counter() - start)
+
+
+def throughput(storage):
+    """:return: (entity pushes/s, entity gets/s, command push and pop round trips/s)"""
+    entities = load_world()
+    storage.flush()
+
+    def tick():
+        storage.push_entities(entities)
+        storage.end_tick()
+    push = rate(tick)
+    storage.commit()
+    get = rate(storage.get_entities)
+    commands = [("fire_rcs", "AC", 0.0)] * COMMANDS_PER_POP
+
+    def round_trip():
+        storage.push_commands(commands)
+        storage.commit()
+        storage.pop_commands()
+    commands_rate = rate(round_trip)
+    storage.flush()
+    return push, get, commands_rate
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    backends = [("memory", corbit.storage.MemoryStorage),
+                ("sqlite", lambda: corbit.storage.SQLiteStorage(os.path.join(directory, "corbit.sqlite3"))),
+                ("shared memory", lambda: corbit.storage.SharedMemoryStorage(corbit.storage.MemoryStorage(), server=True,
+                                                                             name="corbit-benchmark"))]
+    if "--mysql" in sys.argv:
+        db_info = tuple(sys.argv[sys.argv.index("--mysql") + 1].split(","))
+        backends.append(("mysql", lambda: corbit.storage.MySQLStorage(db_info)))
+        backends.append(("mysql, batched", lambda: corbit.storage.MySQLStorage(db_info, commit_interval=10)))
+
+    print("%-16s %16s %16s %24s" % ("backend", "pushes/s", "gets/s", "command round trips/s"))
+    for name, make in backends:
+        storage = make()
+        try:
+            print("%-16s %16.0f %16.0f %24.0f" % ((name,) + throughput(storage)))
+        finally:
+            # shared memory outlives the process if it isn't let go of
+            if hasattr(storage, "close"):
+                storage.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
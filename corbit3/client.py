@@ -1,26 +1,64 @@
 #! /usr/bin/env python3
 
 __version__ = "3.0.0"
-import corbit.physics
+import time
+launch_time = time.time()  # for measuring how long it takes to get to the first frame
+import os
+# only import the bits of pygame we actually use, the rest gets imported if and when it's needed.
+# This has to be set before anything imports pygame
+os.environ.setdefault("PYGAME_LAZY_IMPORT", "1")
+os.environ.setdefault("PYGAME_EAGER_MODULES", "display,draw,font,event,key,time,transform")
 import corbit.objects
 import corbit.network
-import corbit.mysqlio
+import corbit.storage
+import corbit.entitycache
+import corbit.commands
+import corbit.ingest
+import corbit.render
+import corbit.view
+import corbit.prediction
+import corbit.batch
+import corbit.frames
+import corbit.telemetry
 import sys  # used to exit the program
+import socket
 import pygame  # used for drawing and a couple other things
 import pygame.locals as gui  # for things like KB_LEFT
 import unum
 import unum.units as un
-import scipy
-import numpy.linalg as LA
+import numpy
 import math
 
 import pygame.gfxdraw
 print("Corbit PILOT " + __version__)
 fps = 60 * un.Hz
 entities = []  # this list will store all the entities
+cache = corbit.entitycache.EntityCache()  # keeps the same entity objects from frame to frame
+PILOT = "%s:%d" % (socket.gethostname(), os.getpid())  # so the server can tell us apart from other pilots
+own_commands = corbit.commands.OwnCommands(PILOT)  # shows our commands before the server's got to them
+predicted = False  # whether entities had our commands applied to them last frame
+world = None  # the entities as arrays, see corbit.batch.World
+frames = None  # the entities relative to their parents, see corbit.frames
+index = None  # the bodies sorted for culling, see corbit.view.SpatialIndex. None when it needs building again
+index_center = None  # what the positions in index are relative to
+telemetry = []  # the newest telemetry rows the server published, see corbit.telemetry
+watching = None  # the (control, reference) pair we last asked the server for telemetry on
 ADDRESS = "localhost"
+LOCKSTEP = False  # has to match the server. Simulates the world here from the server's commands, see corbit.lockstep
+DRAW_PARTICLES = True  # False to never read or draw particles. If no pilot draws them, turn them off in server.py too
+# what benchmarks/startup.py sets, see server.py: a SQLiteStorage file to use instead of MySQL, and to stop after the
+# first frame
+SQLITE_FILE = os.environ.get("CORBIT_SQLITE")
+STARTUP_ONLY = "CORBIT_STARTUP_ONLY" in os.environ
 print("alright come over her")
-corbit.mysqlio.connect_to_db((ADDRESS, "root", "3.1415pi", "corbit"))
+# has to be the same kind of storage the server uses, see corbit.storage
+if SQLITE_FILE:
+    storage = corbit.storage.SQLiteStorage(SQLITE_FILE)
+else:
+    storage = corbit.storage.MySQLStorage((ADDRESS, "root", "3.1415pi", "corbit"))
+#storage = corbit.storage.SQLiteStorage("corbit.sqlite3")
+# if the server's on this machine, get the world from its shared memory instead
+storage = corbit.storage.SharedMemoryStorage(storage)
 print("hey what are u doing")
 
 
@@ -35,6 +73,9 @@ pygame.display.set_caption("Corbit " + __version__)
 pygame.key.set_repeat(800, 25)
 
 camera = corbit.objects.Camera(0.0001, corbit.objects.center)
+hud = corbit.render.Hud()
+predictor = corbit.prediction.OrbitPredictor()  # works out where we're going, in the background
+predictor.start()
 screen_size = screen.get_size()
 screen = pygame.display.set_mode(screen_size, display_flags)
 #TODO: I'm trying to set the default format string, but I haven't found the right variable to change yet
@@ -42,120 +83,126 @@ unum.Unum.VALUE_FORMAT = "%8.2f"
 
 
 
+def reading(readings, channel):
+    """:return: a telemetry channel's value to show, "" if the server hasn't sent it or it doesn't make sense"""
+    value = readings.get(channel)
+    return "" if value is None else value.__str__()
+
+
+def closest_approach():
+    """Describes the next closest approach to the target, or returns "" if there isn't one coming up"""
+    encounters = predictor.encounters
+    if encounters is None or encounters[:2] != (corbit.objects.control, (corbit.objects.target,)):
+        return ""
+    for encounter in encounters[2]:
+        if encounter.kind == "closest approach":
+            return "%s, %.0f m" % (encounter.target, encounter.distance)
+    return ""
+
+
 def draw(display):
-    for entity in entities:
-        # calculating the on-screen position
-        screen_position =  [int(
-                camera.zoom_level *
-                (entity.displacement - camera.displacement).asNumber()[0]
-                + screen_size[0] / 2),
-                int(
-                 camera.zoom_level * (entity.displacement - camera.displacement).asNumber()[1]
-                 + screen_size[1] / 2)]
-        # calculating the on-screen radius
-        screen_radius = int(entity.radius.asNumber() * camera.zoom_level)
-
-        #circle_distance = [0, 0]
-        #circle_distance[0] = abs(screen_position[0] - screen_size[0])
-        #circle_distance[1] = abs(screen_position[1] - screen_size[1])
-
-        #if circle_distance[0] > (screen_size[0]/2 + screen_radius):
-        #    if entity.name == "Earth":
-        #        print("poof")
-        #    continue
-        #if circle_distance[1] > (screen_size[1]/2 + screen_radius):
-        #    if entity.name == "Earth":
-        #        print("poof")
-        #    continue
-
-        #corner_distance_sq = (circle_distance[0] - screen_size[0]/2)**2 +\
-        #(circle_distance[1] - screen_size[1]/2)**2
-
-        #if (circle_distance[0] > screen_size[0]/2) or\
-        #        (circle_distance[1] > screen_size[1]/2) or\
-        #        (corner_distance_sq > screen_radius**2):
-        #    pass
-
-        if type(entity) == corbit.objects.Entity:
-            # entity drawing is the simplest, just a circle
-            #print("circle drawing", entity.name, screen_position, screen_radius)
-            pygame.draw.circle(screen, entity.color, screen_position, screen_radius)
-        elif type(entity) == corbit.objects.Habitat:
-            # habitat is the entity drawing, but with a line pointing forwards
-            #print("circle drawing", entity.name, screen_position, screen_radius)
-            pygame.draw.circle(screen, entity.color, screen_position, screen_radius)
-            pygame.draw.aaline(screen, (0, 255, 0), screen_position,
+    # the predicted path of the control craft, underneath everything else
+    prediction = predictor.path
+    reference = corbit.objects.find_entity(corbit.objects.reference, entities)
+    if prediction is not None and reference is not None and \
+            prediction[:2] == (corbit.objects.control, corbit.objects.reference):
+        path = prediction[2] + reference.displacement.asNumber(un.m)
+        corbit.render.draw_path(screen, (0, 120, 0),
+                                corbit.view.world_to_screen(path, camera.displacement.asNumber(un.m),
+                                                              camera.zoom_level, screen_size),
+                                prediction[3])
+
+    # particles are just dots, and there can be tens of thousands of them, so they're all drawn in one go
+    particle_positions, particle_colors = particles
+    if len(particle_positions):
+        corbit.render.draw_points(screen,
+                                  corbit.view.world_to_screen(particle_positions, camera.displacement.asNumber(un.m),
+                                                                camera.zoom_level, screen_size),
+                                  particle_colors)
+
+    # bodies are positioned relative to whatever the camera is centred on, a floating origin, so they stay precise
+    # near the camera however far from the Sun it is, see corbit.frames
+    origin = corbit.objects.find_entity(camera.center, entities).displacement.asNumber(un.m)
+    global index, index_center
+    positions, _ = frames.relative_to(camera.center)
+    radii = world.radii
+    # only the bodies that overlap the screen get drawn, see corbit.view.SpatialIndex. It's only built again when
+    # the positions have changed, or they're relative to something else now
+    if index is None or index_center != camera.center:
+        index = corbit.view.SpatialIndex(positions, radii)
+        index_center = camera.center
+    visible = index.query(*corbit.view.view_rectangle(camera, screen_size, origin))
+    # calculating the on-screen positions and radii
+    screen_positions = corbit.view.world_to_screen(positions[visible], camera.displacement.asNumber(un.m) - origin,
+                                                     camera.zoom_level, screen_size)
+    screen_radii = radii[visible] * camera.zoom_level
+
+    for i, screen_position, screen_radius in zip(visible, screen_positions, screen_radii):
+        entity = entities[i]
+        # entity drawing is the simplest, just a circle (or a dot, or a horizon, depending on how big it is)
+        corbit.render.draw_body(screen, entity.color, screen_position, screen_radius)
+        if type(entity) == corbit.objects.Habitat:
+            # habitat is the entity drawing, but with a line pointing forwards.
+            # minus sin, because y is flipped on screen
+            pygame.draw.aaline(screen, (0, 255, 0), (int(screen_position[0]), int(screen_position[1])),
                                [int(screen_position[0] + screen_radius * math.cos(entity.angular_position)),
-                                int(screen_position[1] + screen_radius * math.sin(entity.angular_position))])
+                                int(screen_position[1] - screen_radius * math.sin(entity.angular_position))])
 
     # test big circle drawing
     #pygame.draw.circle(screen, (0, 255, 0), (int(-1e7+500), 0), int(1e7))
     #pygame.gfxdraw.line(screen, 0, 0, 500, 700, (255, 0, 0))
 
-    # flip the screen upside down, so that y values increase upwards like on a cartesian plane
-    screen.blit(pygame.transform.flip(screen, False, True), (0, 0))
-
-    # This is where the magic HUD drawing hapen
+    # This is where the magic HUD drawing hapen. The orbit numbers are worked out by the server, see corbit.telemetry,
+    # there's no physics done here. Until the server's published them for this pair they're just blank
     # TODO: can never hurt to add more
-    def print_text(text, line_number, padding, display):
-        gap = [10, 10]
-        font = pygame.font.SysFont("monospace", 15)
-        display.blit(font.render(text[0], 1, (100, 100, 100)), # field name
-                     (gap[0], gap[1] * 2 * line_number))
-        display.blit(font.render(text[1], 1, (200, 200, 200)), # field value
-                     (gap[0] + padding*10, gap[1] * 2 * line_number)) # padding*10 ensures a constant distance
-                                                                      # between the field name and the field value
-        return line_number + 1
-
+    readings = corbit.telemetry.readings(telemetry).get((corbit.objects.control, corbit.objects.reference), {})
+    control = corbit.objects.find_entity(corbit.objects.control, entities)
     lines_to_draw = \
-    [("Altitude:",
-      corbit.physics.altitude(corbit.objects.find_entity(corbit.objects.control, entities),
-                              corbit.objects.find_entity(corbit.objects.reference, entities)).__str__()),
-     ("Speed:",
-      corbit.physics.speed(corbit.objects.find_entity(corbit.objects.control, entities),
-                           corbit.objects.find_entity(corbit.objects.reference, entities)).__str__()),
-     ("Acceleration:",
-      (un.m/un.s/un.s *
-       LA.norm((corbit.objects.find_entity(corbit.objects.control, entities).acceleration -
-                corbit.physics.gravitational_force(corbit.objects.find_entity(corbit.objects.control, entities),
-                                                   corbit.objects.find_entity(corbit.objects.reference, entities))
-                /corbit.objects.find_entity(corbit.objects.control, entities).mass_fun()).asNumber(un.m/un.s/un.s))).__str__()),
-     ("Rotation:",
-      corbit.objects.find_entity(corbit.objects.control, entities).angular_speed.__str__()),
-     ("Torque:",
-      corbit.objects.find_entity(corbit.objects.control, entities).angular_acceleration.__str__()),
+    [("Altitude:", reading(readings, "altitude")),
+     ("Speed:", reading(readings, "speed")),
+     ("Acceleration:", reading(readings, "acceleration")),
+     ("Rotation:", control.angular_speed.__str__()),
+     ("Torque:", control.angular_acceleration.__str__()),
      ("",""),
-     ("Orbital Speed:",
-      corbit.physics.Vorbit(corbit.objects.find_entity(corbit.objects.control, entities),
-                            corbit.objects.find_entity(corbit.objects.reference, entities)).__str__()),
-     ("Periapsis:",
-      corbit.physics.periapsis(corbit.objects.find_entity(corbit.objects.control, entities),
-                               corbit.objects.find_entity(corbit.objects.reference, entities)).__str__()),
-     ("Apoapsis:",
-      corbit.physics.apoapsis(corbit.objects.find_entity(corbit.objects.control, entities),
-                               corbit.objects.find_entity(corbit.objects.reference, entities)).__str__()),
+     ("Orbital Speed:", reading(readings, "orbital_speed")),
+     ("Periapsis:", reading(readings, "periapsis")),
+     ("Apoapsis:", reading(readings, "apoapsis")),
+     ("Closest approach:", closest_approach()),
      ("",""),
-     ("Fuel:",
-      corbit.objects.find_entity(corbit.objects.control, entities).engine_system.fuel.__str__()),
-     ("Zoom:",
-      camera.zoom_level.__str__())
+     ("Fuel:", control.engine_system.fuel.__str__()),
+     ("Zoom:", camera.zoom_level.__str__())
     ]
 
-    line_number = 0
-    field_padding = 2 + max([len(i[0]) for i in lines_to_draw])
-
-    for text in lines_to_draw:
-        line_number = print_text(text, line_number, field_padding, display)
+    hud.draw(display, lines_to_draw)
 
+# storage only gets used from here on by the ingest thread, so a slow read never holds up a frame, see corbit.ingest
+ingest = (corbit.ingest.LockstepIngest if LOCKSTEP else corbit.ingest.StateIngest)(storage, PILOT, DRAW_PARTICLES)
+ingest.start()
+snapshot = None  # the newest (acknowledgement, entity rows, particles, telemetry) from ingest
 while not entities:
-    entities = corbit.mysqlio.get_entities()
+    clock.tick(fps.asNumber(un.Hz))
+    pygame.event.pump()  # so the window doesn't look like it's hung while we wait
+    snapshot = ingest.latest
+    if snapshot is not None:
+        entities = cache.update(snapshot[1])
+acknowledgement, _, particles, telemetry = snapshot
+latest = entities  # the newest entities from the server, before our own commands are applied to them
 while True:
-    while not entities:
-        entities = corbit.mysqlio.get_entities()
+    # frames are paced here, whatever storage is doing
+    clock.tick(fps.asNumber(un.Hz))
+    changed = False
+    newest = ingest.latest
+    if newest is not snapshot:
+        snapshot = newest
+        acknowledgement, rows, particles, telemetry = snapshot
+        if rows:
+            latest = cache.update(rows)
+            changed = cache.changed
+    entities = own_commands.predict(latest, acknowledgement)
 
     # commands_to_send is a : list of (COMMAND, TARGET, AMOUNT) 3-tuples
     # of type                         (string,  string, float)
-    # whenever a command is appended, that command is written to the corbit.flightcommands table
+    # whenever a command is appended, that command is written to the flightcommands table (see corbit.storage)
     # where the server checks for a command and acts on it
     commands_to_send = []
 
@@ -174,30 +221,29 @@ while True:
                 camera.locked = not camera.locked
                 print("locked=", camera.locked)
             elif event.key == gui.K_LEFT:
-                camera.pan(un.m / un.s / un.s * scipy.array((-1, 0)))
+                camera.pan(un.m / un.s / un.s * numpy.array((-1, 0)))
             elif event.key == gui.K_RIGHT:
-                camera.pan(un.m / un.s / un.s * scipy.array((1, 0)))
+                camera.pan(un.m / un.s / un.s * numpy.array((1, 0)))
             elif event.key == gui.K_UP:
-                camera.pan(un.m / un.s / un.s * scipy.array((0, 1)))
+                camera.pan(un.m / un.s / un.s * numpy.array((0, 1)))
             elif event.key == gui.K_DOWN:
-                camera.pan(un.m / un.s / un.s * scipy.array((0, -1)))
+                camera.pan(un.m / un.s / un.s * numpy.array((0, -1)))
             elif event.unicode == "a":
-                commands_to_send += "fire_verniers|AC,-1 "
-                commands_to_send.append(("fire verniers", "AC", -1))
+                commands_to_send.append(("fire_verniers", corbit.objects.control, -1))
             elif event.unicode == "d":
-                commands_to_send.append(("fire_verniers", "AC", 1))
+                commands_to_send.append(("fire_verniers", corbit.objects.control, 1))
             elif event.unicode == "w":
-                commands_to_send.append(("change_engines", "AC", 0.01))
+                commands_to_send.append(("change_engines", corbit.objects.control, 0.01))
             elif event.unicode == "s":
-                commands_to_send.append(("change_engines", "AC", -0.01))
+                commands_to_send.append(("change_engines", corbit.objects.control, -0.01))
             elif event.unicode == "W":
-                commands_to_send.append(("fire_rcs", "AC", 0))
+                commands_to_send.append(("fire_rcs", corbit.objects.control, 0))
             elif event.unicode == "A":
-                commands_to_send.append(("fire_rcs", "AC", str(math.pi / 2)))
+                commands_to_send.append(("fire_rcs", corbit.objects.control, math.pi / 2))
             elif event.unicode == "S":
-                commands_to_send.append(("fire_rcs", "AC", str(math.pi)))
+                commands_to_send.append(("fire_rcs", corbit.objects.control, math.pi))
             elif event.unicode == "D":
-                commands_to_send.append(("fire_rcs", "AC", str(-math.pi / 2)))
+                commands_to_send.append(("fire_rcs", corbit.objects.control, -math.pi / 2))
             elif event.unicode == "-":
                 camera.zoom(-0.1)
             elif event.unicode == "+":
@@ -209,17 +255,45 @@ while True:
             elif event.unicode == "r":
                 commands_to_send.append(("open", "saves/OCESS.json",))
 
+    if world is None or changed or predicted or entities is not latest:
+        predicted = entities is not latest
+        # straight from the rows, no units, so it's cheap enough to do whenever anything changes
+        world = corbit.batch.World.from_rows(cache.rows)
+        if predicted:
+            # our own commands only change the velocities (and fuel) of a craft or two, see corbit.commands
+            for i, (entity, server_entity) in enumerate(zip(entities, latest)):
+                if entity is not server_entity:
+                    world.velocities[i] = entity.velocity.asNumber(un.m / un.s)
+                    world.masses[i] = entity.mass_fun().asNumber(un.kg)
+        if frames is None or frames.names != world.names:
+            frames = corbit.frames.Frames(world)
+        else:
+            frames.update(world)
+        if changed:
+            index = None  # positions only change when the server's sent something new
+    predictor.submit(entities, corbit.objects.control, corbit.objects.reference, [corbit.objects.target], world)
+
+    if (corbit.objects.control, corbit.objects.reference) != watching:
+        # the old pair's left alone, another pilot might be watching it too. Pairs are cheap for the server
+        watching = (corbit.objects.control, corbit.objects.reference)
+        commands_to_send.append((corbit.telemetry.WATCH, corbit.telemetry.pair_target(*watching), None))
+
     if commands_to_send:
         print(commands_to_send)
-        corbit.mysqlio.push_commands(commands_to_send)
+        ingest.send(own_commands.send(commands_to_send))
 
     camera.move(1/fps)
     #print(corbit.objects.find_entity("Sun", entities))
     camera.update(corbit.objects.find_entity(camera.center, entities))
+    # so ingest can read mostly just what's worth drawing, see corbit.ingest
+    ingest.look(corbit.objects.control, corbit.objects.reference, corbit.objects.target,
+                camera.displacement.asNumber(un.m), camera.zoom_level, screen_size)
 
     draw(screen)
     pygame.display.flip()
+    if launch_time is not None:
+        print("First frame drawn in", time.time() - launch_time, "s")
+        launch_time = None
+        if STARTUP_ONLY:
+            sys.exit()
     screen.fill((0, 0, 0))
-
-    # time.sleep(1/fps.asNumber(Hz))
-    # time.sleep(1/fps.asNumber(Hz) - time_spent_on_last_frame)
@@ -0,0 +1,128 @@
+import numpy
+from unum.units import m, s, kg
+
+# Headless, vectorized simulation on plain arrays. Nothing in here knows about units or Entity objects, so it's fast
+# enough to look far ahead (predictions, planning) without slowing the server or the pilot down.
+# Positions are in m, velocities in m/s, masses in kg, times in s.
+
+G = 6.673e-11  # same as corbit.physics.G, but without the units
+
+
+class World:
+    """A copy of the world as arrays, one row per body"""
+
+    def __init__(self, names, masses, radii, positions, velocities):
+        self.names = list(names)
+        self.masses = numpy.asarray(masses, dtype=float)
+        self.radii = numpy.asarray(radii, dtype=float)
+        self.positions = numpy.asarray(positions, dtype=float).reshape(-1, 2)
+        self.velocities = numpy.asarray(velocities, dtype=float).reshape(-1, 2)
+        self.time = 0.0
+
+    @classmethod
+    def from_entities(cls, entities):
+        """Copies the state of a list of entities into a new World"""
+        return cls([entity.name for entity in entities],
+                   [entity.mass_fun().asNumber(kg) for entity in entities],
+                   [entity.radius.asNumber(m) for entity in entities],
+                   [entity.displacement.asNumber(m) for entity in entities],
+                   [entity.velocity.asNumber(m/s) for entity in entities])
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Makes a World straight from flight table rows (see corbit.mysqlio.entity_row()), which is a lot faster
+        than making entities out of them first"""
+        names = [row[1] for row in rows]
+        numbers = numpy.array([row[2:4] + row[7:11] + (row[16] or 0, row[17] or 0) for row in rows],
+                              dtype=float).reshape(-1, 8)
+        # MASS is the dry mass, the fuel is part of the mass too
+        return cls(names, numbers[:, 0] + numbers[:, 6] + numbers[:, 7], numbers[:, 1], numbers[:, 2:4],
+                   numbers[:, 4:6])
+
+    def copy(self):
+        world = World(self.names, self.masses.copy(), self.radii.copy(),
+                      self.positions.copy(), self.velocities.copy())
+        world.time = self.time
+        return world
+
+    def index(self, name):
+        """Returns the row of the body with the given name"""
+        return self.names.index(name)
+
+
+def gravity(positions, masses):
+    """The gravitational acceleration every body feels from every other body
+    :param positions: (..., N, 2) array of positions. Any leading axes are treated as separate worlds
+    :param masses: (..., N) array of masses, or (N,) if they're the same for every world
+    :return: (..., N, 2) array of accelerations
+    """
+    # delta[..., i, j] is the vector from body i to body j
+    delta = positions[..., numpy.newaxis, :, :] - positions[..., :, numpy.newaxis, :]
+    distance_sq = (delta ** 2).sum(axis=-1)
+    n = positions.shape[-2]
+    distance_sq[..., numpy.arange(n), numpy.arange(n)] = numpy.inf  # bodies don't pull on themselves
+    strength = G * masses[..., numpy.newaxis, :] * distance_sq ** -1.5
+    return (delta * strength[..., numpy.newaxis]).sum(axis=-2)
+
+
+def gravity_on(points, positions, masses, chunk=2 ** 14, offset=None):
+    """The gravitational acceleration that massless points feel from massive bodies, which is only
+    O(points * bodies) instead of O((points + bodies)^2), since the points don't pull on anything
+    :param points: (P, 2) array of the points' positions
+    :param positions: (N, 2) array of the massive bodies' positions
+    :param masses: (N,) array of the massive bodies' masses
+    :param chunk: how many point-body pairs to work on at once. Small enough that the temporary arrays stay in the
+    CPU's cache is a lot faster than doing everything in one go
+    :param offset: if the points are really bodies offset to offset + P of positions, so they don't pull on themselves.
+    gravity_on(positions, positions, masses, offset=0) is the same as gravity(positions, masses), but doesn't need
+    N^2 memory
+    :return: (P, 2) array of accelerations
+    """
+    # x and y are kept apart, and the power is done with a sqrt, since both are a lot faster than the (..., 2) arrays
+    # and ** -1.5 that gravity() uses, and with this many points that matters
+    acceleration = numpy.empty_like(points)
+    chunk = max(1, chunk // max(1, len(positions)))
+    for start in range(0, len(points), chunk):
+        chunk_points = points[start:start + chunk]
+        dx = positions[:, 0] - chunk_points[:, 0, numpy.newaxis]
+        dy = positions[:, 1] - chunk_points[:, 1, numpy.newaxis]
+        distance_sq = dx * dx + dy * dy
+        if offset is not None:
+            rows = numpy.arange(len(chunk_points))
+            distance_sq[rows, offset + start + rows] = numpy.inf
+        strength = masses / (distance_sq * numpy.sqrt(distance_sq))
+        acceleration[start:start + chunk, 0] = (dx * strength).sum(axis=1)
+        acceleration[start:start + chunk, 1] = (dy * strength).sum(axis=1)
+    acceleration *= G
+    return acceleration
+
+
+def propagate(world, time, steps, record_every=1, gravity=gravity):
+    """Moves the world forwards with a leapfrog (kick-drift-kick) integrator, which keeps orbits from spiralling in or
+    out the way the server's simple Euler steps do over long times
+    :param world: the World to move, it is changed in place
+    :param time: how far ahead to go, in s
+    :param steps: how many steps to take to get there
+    :param record_every: keep the positions and velocities every this many steps
+    :param gravity: the function that works out accelerations, e.g. the gravity() of a corbit.parallel.ParallelGravity
+    :return: (times, positions, velocities), a (samples,) array and two (samples, N, 2) arrays, starting with the
+    current state
+    """
+    dt = time / steps
+    times = [world.time]
+    positions = [world.positions.copy()]
+    velocities = [world.velocities.copy()]
+
+    acceleration = gravity(world.positions, world.masses)
+    for i in range(1, steps + 1):
+        world.velocities += acceleration * (dt / 2)
+        world.positions += world.velocities * dt
+        acceleration = gravity(world.positions, world.masses)
+        world.velocities += acceleration * (dt / 2)
+        world.time += dt
+        if i % record_every == 0:
+            times.append(world.time)
+            positions.append(world.positions.copy())
+            velocities.append(world.velocities.copy())
+
+    return numpy.array(times), numpy.array(positions), numpy.array(velocities)
@@ -0,0 +1,127 @@
+import math
+
+import numpy
+from unum.units import N, rad, s
+
+import corbit.mysqlio
+from corbit.objects import Habitat, find_entity
+
+# The commands that fly a craft, as opposed to the ones that run the server (accelerate_time, open). The server
+# applies them for real. A pilot also applies its own ones to a copy of its craft as soon as it sends them, so it
+# doesn't have to wait for them to go through the database and the server and back before it sees its thrusters
+# firing, see OwnCommands. Both go through apply(), so they do exactly the same thing.
+#
+# Every batch of commands a pilot sends ends with an ("acknowledge", pilot name, number) command. Once the server has
+# simulated a tick with that batch in it, it publishes the number (see Storage.push_acknowledgement), and the pilot
+# stops predicting those commands itself, since the server's state has them in it now.
+
+CRAFT_COMMANDS = ("fire_rcs", "fire_verniers", "change_engines")
+ACKNOWLEDGE = "acknowledge"
+TICK_TIME = 1 / 60  # s, what a pilot assumes a server tick is until the server says otherwise
+
+
+def burn(engine_system, throttle, time):
+    """Fires an engine system at a throttle for time, then puts its throttle back
+    :return: the thrust of every engine in it put together
+    """
+    previous = engine_system.throttle
+    engine_system.throttle = throttle
+    thrust = engine_system.thrust(time) * len(engine_system.engine_placements)
+    engine_system.throttle = previous
+    return thrust
+
+
+def fire_rcs(entity, direction, time):
+    """Pushes a habitat with its RCS thrusters for time
+    :param direction: which way to push, in rad from where the habitat is pointing
+    """
+    thrust = burn(entity.rcs_system, 1, time).asNumber(N)
+    theta = direction + entity.angular_position.asNumber(rad)
+    # pushing in line with the center doesn't spin the habitat at all
+    entity.accelerate(N * numpy.array((math.cos(theta), math.sin(theta))) * thrust, theta)
+
+
+def fire_verniers(entity, amount, time):
+    """Spins a habitat with its RCS thrusters for time
+    :param amount: fraction of the thrusters' rated thrust to fire them at, positive for anticlockwise
+    """
+    thrust = burn(entity.rcs_system, abs(amount), time).asNumber(N)
+    # sideways, on the edge, so it's all torque
+    theta = entity.angular_position.asNumber(rad) + math.pi / 2
+    entity.accelerate(N * numpy.array((math.cos(theta), math.sin(theta))) * thrust,
+                      theta + math.copysign(math.pi / 2, amount))
+
+
+def apply(entities, command, time):
+    """Applies a command to whichever of entities it's for
+    :param command: (COMMAND, TARGET, AMOUNT), TARGET being the name of a habitat
+    :param time: how long a tick is, in s
+    :return: True if it was a craft command, False if it's something for the server to deal with
+    """
+    function, target, amount = command
+    if function not in CRAFT_COMMANDS:
+        return False
+    entity = find_entity(target, entities)
+    if type(entity) is not Habitat:
+        return True  # nothing to fly
+    if function == "fire_rcs":
+        fire_rcs(entity, float(amount), time)
+    elif function == "fire_verniers":
+        fire_verniers(entity, float(amount), time)
+    elif function == "change_engines":
+        entity.engine_system.throttle = min(max(entity.engine_system.throttle + float(amount), 0), 1)
+    return True
+
+
+class OwnCommands:
+    """The pilot's end. Remembers the commands it's sent until the server says it's done with them, and shows them
+    on a copy of their target in the meantime
+    """
+
+    def __init__(self, pilot):
+        """:param pilot: a name for this pilot, that no other pilot is using"""
+        self.pilot = pilot
+        self.seq = 0
+        self.pending = []       # (seq, commands) sent but not acknowledged yet, oldest first
+        self.tick_time = TICK_TIME
+
+    def send(self, commands):
+        """:return: the commands to actually push, with an acknowledge command on the end"""
+        self.seq += 1
+        self.pending.append((self.seq, list(commands)))
+        return list(commands) + [(ACKNOWLEDGE, self.pilot, self.seq)]
+
+    def predict(self, entities, acknowledgement):
+        """
+        :param entities: the newest entities from the server
+        :param acknowledgement: the newest (seq, tick_time) from Storage.get_acknowledgement(), or None. Has to be
+        read before the entities, so that the entities are at least as new as it
+        :return: entities, with copies of the ones that have commands the server hasn't got to yet, with those
+        commands applied. Velocities and spins change right away, positions catch up once the server has them
+        """
+        if acknowledgement is not None:
+            seq, self.tick_time = acknowledgement
+            self.pending = [(sent, commands) for sent, commands in self.pending if sent > seq]
+        commands = [command for sent, batch in self.pending for command in batch if command[0] in CRAFT_COMMANDS]
+        targets = set(command[1] for command in commands)
+        if not targets:
+            return entities
+
+        predicted = [corbit.mysqlio.row_entity(corbit.mysqlio.entity_row(entity)) if entity.name in targets
+                     else entity for entity in entities]
+        time = self.tick_time * s
+        for entity in predicted:
+            if entity.name in targets:
+                acceleration, angular_acceleration = entity.acceleration, entity.angular_acceleration
+                entity.acceleration = 0 * acceleration
+                entity.angular_acceleration = 0 * angular_acceleration
+                for command in commands:
+                    if command[1] == entity.name:
+                        apply([entity], command, time)
+                        # each one lasts a tick, like on the server
+                        entity.velocity += entity.acceleration * time
+                        entity.angular_speed += entity.angular_acceleration * time
+                        entity.acceleration = 0 * acceleration
+                        entity.angular_acceleration = 0 * angular_acceleration
+                entity.acceleration, entity.angular_acceleration = acceleration, angular_acceleration
+        return predicted
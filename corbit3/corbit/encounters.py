@@ -0,0 +1,138 @@
+import numpy
+
+import corbit.batch
+
+# Finding out when the craft gets closest to its targets, and when it enters or leaves their spheres of influence.
+# The craft and all targets are propagated together in one batch, then every target's relative range rate is
+# checked for sign changes all at once, and every root is narrowed down at the same time.
+
+STEPS_PER_ORBIT = 200   # steps per orbit of the craft around whatever pulls on it hardest. More is more accurate,
+                        # and finds brief flybys better, but takes longer
+REFINE_ITERATIONS = 40  # bisection steps when narrowing down an event, each one halves the error
+
+
+class Encounter:
+    """Something that happens between the craft and a target"""
+
+    def __init__(self, kind, target, time, distance):
+        self.kind = kind            # "closest approach", "enter SOI" or "leave SOI"
+        self.target = target        # the target's name
+        self.time = time            # s from now
+        self.distance = distance    # m, center to center
+
+    def __repr__(self):
+        return "%s %s in %.0f s at %.0f m" % (self.kind, self.target, self.time, self.distance)
+
+
+def spheres_of_influence(world):
+    """Works out every body's sphere of influence (Laplace's r = a * (m / M)^(2/5)), taking the body that pulls on it
+    the hardest as its parent. The body nothing out-pulls (the Sun) gets an infinite one
+    :return: (N,) array of radii, in m
+    """
+    delta = world.positions[numpy.newaxis, :, :] - world.positions[:, numpy.newaxis, :]
+    distance = numpy.sqrt((delta ** 2).sum(axis=-1))
+    numpy.fill_diagonal(distance, numpy.inf)
+    pull = world.masses[numpy.newaxis, :] / distance ** 2
+    parent = pull.argmax(axis=1)
+    rows = numpy.arange(len(world.names))
+
+    soi = distance[rows, parent] * (world.masses / world.masses[parent]) ** 0.4
+    soi[world.masses >= world.masses[parent]] = numpy.inf
+    return soi
+
+
+def steps_needed(world, craft, horizon):
+    """How many steps it takes to look horizon seconds ahead, while still following the craft's orbit closely"""
+    delta = world.positions - world.positions[craft]
+    distance_sq = (delta ** 2).sum(axis=-1)
+    distance_sq[craft] = numpy.inf
+    parent = (world.masses / distance_sq).argmax()
+    period = 2 * numpy.pi * numpy.sqrt(distance_sq[parent] ** 1.5 / (corbit.batch.G * world.masses[parent]))
+    return max(1, int(numpy.ceil(horizon / period * STEPS_PER_ORBIT)))
+
+
+def hermite(p0, v0, p1, v1, dt, tau):
+    """Cubic Hermite interpolation between two samples, which uses the velocities so it follows curves well
+    :param tau: how far between the samples, from 0 to 1. Can be an array, as long as it broadcasts
+    :return: (position, velocity) at tau
+    """
+    tau = tau[..., numpy.newaxis]
+    tau2 = tau * tau
+    tau3 = tau2 * tau
+    position = (2 * tau3 - 3 * tau2 + 1) * p0 + (tau3 - 2 * tau2 + tau) * dt * v0 \
+        + (-2 * tau3 + 3 * tau2) * p1 + (tau3 - tau2) * dt * v1
+    velocity = ((6 * tau2 - 6 * tau) * p0 + (3 * tau2 - 4 * tau + 1) * dt * v0
+                + (-6 * tau2 + 6 * tau) * p1 + (3 * tau2 - 2 * tau) * dt * v1) / dt
+    return position, velocity
+
+
+def refine(function, p0, v0, p1, v1, dt):
+    """Narrows down where function changes sign between two samples, for a whole batch of sample pairs at once.
+    function takes interpolated (position, velocity) arrays and returns an array of values, and must be negative at
+    tau = 0 and positive at tau = 1
+    :return: array of tau where function is zero
+    """
+    low = numpy.zeros(len(p0))
+    high = numpy.ones(len(p0))
+    for _ in range(REFINE_ITERATIONS):
+        middle = (low + high) / 2
+        value = function(*hermite(p0, v0, p1, v1, dt, middle))
+        below = value < 0
+        low = numpy.where(below, middle, low)
+        high = numpy.where(below, high, middle)
+    return (low + high) / 2
+
+
+def find_encounters(world, craft, targets, horizon, steps=None):
+    """Finds every closest approach and sphere of influence crossing between a craft and its targets
+    :param world: the World to look ahead in, it isn't changed
+    :param craft: name of the craft
+    :param targets: list of names of the targets
+    :param horizon: how far ahead to look, in s
+    :param steps: how many steps to take, None works it out with steps_needed()
+    :return: list of Encounters, soonest first
+    """
+    craft_index = world.index(craft)
+    target_indices = numpy.array([world.index(target) for target in targets])
+    soi = spheres_of_influence(world)[target_indices]
+    if steps is None:
+        steps = steps_needed(world, craft_index, horizon)
+
+    times, positions, velocities = corbit.batch.propagate(world.copy(), horizon, steps)
+    times -= world.time
+    dt = times[1] - times[0]
+
+    # relative to each target: (samples, targets, 2)
+    relative_position = positions[:, craft_index, numpy.newaxis, :] - positions[:, target_indices, :]
+    relative_velocity = velocities[:, craft_index, numpy.newaxis, :] - velocities[:, target_indices, :]
+    range_rate = (relative_position * relative_velocity).sum(axis=-1)  # same sign as d|r|/dt
+    distance = numpy.sqrt((relative_position ** 2).sum(axis=-1))
+
+    def between(sample, target):
+        return (relative_position[sample, target], relative_velocity[sample, target],
+                relative_position[sample + 1, target], relative_velocity[sample + 1, target])
+
+    encounters = []
+
+    # closest approaches are where the range rate goes from negative (closing in) to positive (moving away)
+    sample, target = numpy.nonzero((range_rate[:-1] < 0) & (range_rate[1:] >= 0))
+    if len(sample):
+        tau = refine(lambda r, v: (r * v).sum(axis=-1), *between(sample, target), dt=dt)
+        position, _ = hermite(*between(sample, target), dt=dt, tau=tau)
+        for i in range(len(sample)):
+            encounters.append(Encounter("closest approach", targets[target[i]], times[sample[i]] + tau[i] * dt,
+                                        numpy.sqrt((position[i] ** 2).sum())))
+
+    # sphere of influence crossings are where the distance minus the sphere's radius changes sign
+    outside = distance - soi
+    for kind, crossing, sign in (("enter SOI", (outside[:-1] >= 0) & (outside[1:] < 0), -1),
+                                 ("leave SOI", (outside[:-1] < 0) & (outside[1:] >= 0), 1)):
+        sample, target = numpy.nonzero(crossing)
+        if not len(sample):
+            continue
+        radius = soi[target]
+        tau = refine(lambda r, v: sign * (numpy.sqrt((r ** 2).sum(axis=-1)) - radius), *between(sample, target), dt=dt)
+        for i in range(len(sample)):
+            encounters.append(Encounter(kind, targets[target[i]], times[sample[i]] + tau[i] * dt, radius[i]))
+
+    return sorted(encounters, key=lambda encounter: encounter.time)
@@ -0,0 +1,162 @@
+import sys
+
+import numpy
+
+import corbit.batch
+import corbit.encounters
+
+# Running the same scenario lots of times with slightly different starting states or burns, to see how much the
+# outcome depends on them (Monte Carlo). Every member of the ensemble is a copy of the world along a leading axis of
+# the arrays, and corbit.batch.gravity() and propagate() already treat leading axes as separate worlds, so one call
+# moves every member at once.
+#
+# From corbit3/:
+#     python -m corbit.ensemble [save file] [craft] [reference] [members] [hours] [velocity sigma in m/s]
+
+CHUNK_STEPS = 500   # steps propagated at a time, after which the samples are checked and thrown away
+
+
+class Ensemble:
+    """members copies of a World, with positions and velocities of shape (members, N, 2).
+    Has the same attributes as a World, so corbit.batch.propagate() works on it as is
+    """
+
+    def __init__(self, world, members):
+        self.names = list(world.names)
+        self.masses = world.masses.copy()   # (N,), the same for every member
+        self.radii = world.radii.copy()
+        self.positions = numpy.repeat(world.positions[numpy.newaxis], members, axis=0)
+        self.velocities = numpy.repeat(world.velocities[numpy.newaxis], members, axis=0)
+        self.time = world.time
+
+    def __len__(self):
+        return len(self.positions)
+
+    def index(self, name):
+        return self.names.index(name)
+
+    def scatter(self, name, position_sigma=0.0, velocity_sigma=0.0, seed=None):
+        """Nudges a body's starting state by a different random amount in every member
+        :param position_sigma: standard deviation of the nudge to each coordinate, in m
+        :param velocity_sigma: standard deviation of the nudge to each velocity component, in m/s
+        """
+        random = numpy.random.RandomState(seed)
+        body = self.index(name)
+        self.positions[:, body] += random.normal(0, position_sigma, (len(self), 2))
+        self.velocities[:, body] += random.normal(0, velocity_sigma, (len(self), 2))
+
+    def burn(self, name, delta_v, magnitude_sigma=0.0, angle_sigma=0.0, seed=None):
+        """Makes a body do the same burn in every member, but with a random error in how big it is and where it points
+        :param delta_v: (x, y) change in velocity, in m/s
+        :param magnitude_sigma: standard deviation of the error in size, as a fraction of the size
+        :param angle_sigma: standard deviation of the error in direction, in rad
+        """
+        random = numpy.random.RandomState(seed)
+        scale = 1 + random.normal(0, magnitude_sigma, len(self))
+        angle = random.normal(0, angle_sigma, len(self))
+        cos = numpy.cos(angle)
+        sin = numpy.sin(angle)
+        body = self.index(name)
+        self.velocities[:, body, 0] += scale * (cos * delta_v[0] - sin * delta_v[1])
+        self.velocities[:, body, 1] += scale * (sin * delta_v[0] + cos * delta_v[1])
+
+
+class Summary:
+    """How every member of an ensemble run turned out, for one craft"""
+
+    def __init__(self, craft, reference, periapsis, collided_with, collision_time):
+        self.craft = craft
+        self.reference = reference
+        self.periapsis = periapsis              # (members,) closest the craft got to the reference, in m
+        self.collided_with = collided_with      # (members,) name of what the craft hit first, or None
+        self.collision_time = collision_time    # (members,) s from the start until it hit, or nan
+
+    def collision_probability(self, name=None):
+        """The fraction of members where the craft hit something, or hit name if it's given"""
+        if name is None:
+            return numpy.mean([hit is not None for hit in self.collided_with])
+        return numpy.mean([hit == name for hit in self.collided_with])
+
+    def periapsis_percentiles(self, percentiles=(5, 50, 95)):
+        """:return: the periapsis distances at those percentiles, in m"""
+        return numpy.percentile(self.periapsis, percentiles)
+
+    def __repr__(self):
+        lines = ["%s around %s, %d members" % (self.craft, self.reference, len(self.periapsis)),
+                 "periapsis: min %.0f m, mean %.0f m, max %.0f m, std %.0f m" %
+                 (self.periapsis.min(), self.periapsis.mean(), self.periapsis.max(), self.periapsis.std()),
+                 "periapsis 5%%/50%%/95%%: %.0f m / %.0f m / %.0f m" % tuple(self.periapsis_percentiles()),
+                 "collision probability: %.3f" % self.collision_probability()]
+        for name in sorted(set(hit for hit in self.collided_with if hit is not None)):
+            lines.append("    with %s: %.3f" % (name, self.collision_probability(name)))
+        return "\n".join(lines)
+
+
+def run(ensemble, craft, reference, time, steps=None):
+    """Moves every member of an ensemble forwards, keeping track of how close the craft gets to the reference and
+    whether it hits anything. Members stop counting once their craft has hit something, though they're still moved
+    :param ensemble: the Ensemble, it is changed in place
+    :param craft: name of the craft
+    :param reference: name of the body to measure periapsis from
+    :param time: how far ahead to go, in s
+    :param steps: how many steps to take, None works it out with corbit.encounters.steps_needed() for the first member
+    :return: a Summary
+    """
+    craft_index = ensemble.index(craft)
+    reference_index = ensemble.index(reference)
+    if steps is None:
+        first = corbit.batch.World(ensemble.names, ensemble.masses, ensemble.radii,
+                                   ensemble.positions[0], ensemble.velocities[0])
+        steps = corbit.encounters.steps_needed(first, craft_index, time)
+    dt = time / steps
+    start_time = ensemble.time
+    members = len(ensemble)
+    others = numpy.array([i for i in range(len(ensemble.names)) if i != craft_index])
+    touching = ensemble.radii[craft_index] + ensemble.radii[others]  # (N - 1,)
+
+    periapsis = numpy.full(members, numpy.inf)
+    hit = numpy.full(members, -1)
+    collision_time = numpy.full(members, numpy.nan)
+
+    done = 0
+    while done < steps:
+        chunk = min(CHUNK_STEPS, steps - done)
+        times, positions, _ = corbit.batch.propagate(ensemble, chunk * dt, chunk)
+        # (samples, members, N - 1) distances from the craft to everything else
+        delta = positions[:, :, others] - positions[:, :, craft_index, numpy.newaxis]
+        distance = numpy.sqrt((delta ** 2).sum(axis=-1))
+        inside = distance < touching
+
+        # where each member's craft first touches something in this chunk, if it does
+        any_inside = inside.any(axis=-1)                     # (samples, members)
+        first_sample = numpy.where(any_inside.any(axis=0), any_inside.argmax(axis=0), len(times))
+        newly_hit = (hit < 0) & (first_sample < len(times))
+        for member in numpy.flatnonzero(newly_hit):
+            sample = first_sample[member]
+            hit[member] = others[inside[sample, member].argmax()]
+            collision_time[member] = times[sample] - start_time
+
+        # only count periapsis up to the collision, or the whole chunk for members that haven't hit anything
+        reference_distance = distance[:, :, numpy.flatnonzero(others == reference_index)[0]]
+        counted = numpy.arange(len(times))[:, numpy.newaxis] <= numpy.where(hit < 0, len(times), first_sample)
+        counted &= ~((hit >= 0) & ~newly_hit)[numpy.newaxis, :]  # members that hit something in an earlier chunk
+        periapsis = numpy.minimum(periapsis, numpy.where(counted, reference_distance, numpy.inf).min(axis=0))
+        done += chunk
+
+    return Summary(craft, reference, periapsis,
+                   [ensemble.names[i] if i >= 0 else None for i in hit], collision_time)
+
+
+if __name__ == "__main__":
+    import corbit.mysqlio
+    save_file = sys.argv[1] if len(sys.argv) > 1 else "saves/OCESS.json"
+    craft = sys.argv[2] if len(sys.argv) > 2 else "Habitat"
+    reference = sys.argv[3] if len(sys.argv) > 3 else "Earth"
+    members = int(sys.argv[4]) if len(sys.argv) > 4 else 200
+    hours = float(sys.argv[5]) if len(sys.argv) > 5 else 24
+    velocity_sigma = float(sys.argv[6]) if len(sys.argv) > 6 else 1.0
+    with open(save_file, "r") as loadfile:
+        entities = corbit.mysqlio.load_json(loadfile)
+    ensemble = Ensemble(corbit.batch.World.from_entities(entities), members)
+    ensemble.scatter(craft, velocity_sigma=velocity_sigma)
+    print(run(ensemble, craft, reference, hours * 3600))
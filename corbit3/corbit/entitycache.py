@@ -0,0 +1,89 @@
+import numpy
+from unum.units import kg, m, s, rad
+
+from corbit.mysqlio import row_entity
+
+# The pilot's copy of the world. Making an Entity or Habitat goes through a pile of asserts and unit conversions (and
+# two EngineSystems for every Habitat), which is way too slow to do for every body on every frame. Instead the cache
+# keeps one object per name, and only moves the bits that change from frame to frame (position, velocity, rotation,
+# fuel) into it. Objects only get made when a new name shows up, or when one of the columns that never changes for a
+# body (type, mass, radius, color) does, like after the server opens another save. Rows that are the very same objects
+# as last time, which corbit.ingest keeps for the bodies it didn't read again, are skipped altogether.
+
+# units, worked out once instead of for every body on every frame
+M_S = m / s
+M_S2 = m / s / s
+RAD_S = rad / s
+RAD_S2 = rad / s / s
+
+
+def static_columns(row):
+    """The columns of a flight table row that never change for a body: TYPE, MASS, RADIUS, COLORR, COLORG, COLORB"""
+    return (row[0],) + tuple(row[2:7])
+
+
+def update_entity(entity, row):
+    """Moves everything that changes from frame to frame from a flight table row into an existing entity"""
+    entity.displacement = m * numpy.array(row[7:9], dtype=float)
+    entity.velocity = M_S * numpy.array(row[9:11], dtype=float)
+    entity.acceleration = M_S2 * numpy.array(row[11:13], dtype=float)
+    entity.angular_position = row[13] * rad
+    entity.angular_speed = row[14] * RAD_S
+    entity.angular_acceleration = row[15] * RAD_S2
+    if row[0] == "habitat":
+        entity.engine_system.fuel = row[16] * kg
+        entity.rcs_system.fuel = row[17] * kg
+
+
+class EntityCache:
+    """Keeps the same entity objects from one frame to the next, see the top of this file"""
+
+    def __init__(self):
+        self.entities = []      # the current entities, in the order the rows came in
+        self.by_name = {}       # name -> entity
+        self.statics = {}       # name -> static_columns() of the row it was made from
+        self.rows = None        # the last rows, so the same ones can be skipped
+        self.changed = False    # True if the last update() moved anything
+
+    def update(self, rows):
+        """Brings the cached entities up to date
+        :param rows: flight table rows, e.g. from Storage.get_entity_rows()
+        :return: a list of the entities, in the same order as rows. Entities that were in the last list are the same
+        objects, as long as they still have the same name and static_columns()
+        """
+        if rows is self.rows:
+            # nothing new was published, see SharedMemoryStorage.get_entity_rows()
+            self.changed = False
+            return self.entities
+
+        previous = self.rows if self.rows is not None and len(self.rows) == len(rows) else None
+        changed = False
+        entities = []
+        for i, row in enumerate(rows):
+            if previous is not None and previous[i] is row:
+                entities.append(self.entities[i])
+                continue
+            changed = True
+            name = row[1]
+            static = static_columns(row)
+            entity = self.by_name.get(name)
+            if entity is None or self.statics[name] != static:
+                entity = row_entity(row)
+                self.by_name[name] = entity
+                self.statics[name] = static
+            else:
+                update_entity(entity, row)
+            entities.append(entity)
+
+        if len(self.by_name) != len(entities):
+            # something's gone, forget about it
+            names = set(row[1] for row in rows)
+            for name in list(self.by_name):
+                if name not in names:
+                    del self.by_name[name]
+                    del self.statics[name]
+
+        self.rows = rows
+        self.entities = entities
+        self.changed = changed
+        return entities
@@ -0,0 +1,212 @@
+import math
+import sys
+
+import numpy
+
+import corbit.batch
+from corbit.objects import Entity
+from unum.units import m, s
+
+# Planets and moons don't get pushed around by anything the pilot does, so instead of integrating them every tick
+# they can be worked out ahead of time. An ephemeris is built by propagating the world offline with corbit.batch, then
+# fitting a Chebyshev polynomial to each body's path over each segment of time. Looking up where everything is at
+# any moment is then just picking the right segment and evaluating a polynomial, for every body at once, which is
+# both faster than integrating and lets you jump straight to any time.
+#
+# Build one from corbit3/ with:
+#     python -m corbit.ephemeris saves/OCESS.json [days]
+# which saves it next to the save file as saves/OCESS.ephemeris.npz
+
+DEGREE = 12                 # degree of the Chebyshev polynomials
+STEPS_PER_ORBIT = 256       # integration steps per orbit of the fastest body (Phobos, for OCESS)
+FIT_TOLERANCE = 10.0        # m, segments are split until the polynomials miss by less than this
+MIN_SEGMENT_STEPS = 16      # segments are at least this many integration steps long, building fails if that's not
+                            # short enough
+MAX_SEGMENT_STEPS = 2 ** 14  # and at most this many, which is also how many steps are propagated at a time
+DAY = 24 * 3600.0
+
+
+def ephemeris_file(save_file):
+    """Where the ephemeris for a save file goes, e.g. saves/OCESS.json -> saves/OCESS.ephemeris.npz"""
+    return save_file.rsplit(".", 1)[0] + ".ephemeris.npz"
+
+
+def shortest_period(world):
+    """The period of the tightest orbit in the world (Phobos around Mars, for OCESS), found by looking at every pair of
+    bodies as if they were orbiting each other, since the pair that really is will have the shortest one
+    """
+    delta = world.positions[numpy.newaxis, :, :] - world.positions[:, numpy.newaxis, :]
+    distance_sq = (delta ** 2).sum(axis=-1)
+    numpy.fill_diagonal(distance_sq, numpy.inf)
+    mu = corbit.batch.G * (world.masses[numpy.newaxis, :] + world.masses[:, numpy.newaxis])
+    return 2 * numpy.pi * numpy.sqrt(distance_sq ** 1.5 / mu).min()
+
+
+class Ephemeris:
+    """Piecewise Chebyshev polynomials for the paths of a set of bodies.
+    Segments are as long as they can be while still fitting well, so a moon gets much shorter segments than a planet,
+    and a body gets shorter ones where its path is tighter. All the segments are kept in one big array. Which one
+    covers a moment is looked up in a table of equally long cells of time, one row for each body, so finding every
+    body's segment is one lookup however many segments there are
+    """
+
+    def __init__(self, names, start_time, cell_length, lookup, segment_starts, segment_lengths, coefficients):
+        self.names = list(names)
+        self.start_time = start_time                            # s, when the first segment of every body starts
+        self.cell_length = cell_length                          # s, how long a cell of the lookup table is
+        self.lookup = numpy.asarray(lookup)                     # (N, cells) the segment each body is in for each cell
+        self.segment_starts = numpy.asarray(segment_starts)     # (segments,) s
+        self.segment_lengths = numpy.asarray(segment_lengths)   # (segments,) s
+        self.coefficients = numpy.asarray(coefficients)         # (segments, DEGREE + 1, 2)
+        self.end_time = start_time + self.lookup.shape[1] * cell_length
+        self.index = {name: i for i, name in enumerate(self.names)}
+        # velocities come from the derivative of the polynomials, which is worked out once here
+        self.derivatives = numpy.polynomial.chebyshev.chebder(self.coefficients, axis=1)
+
+    def covers(self, time):
+        """True if every body's path is known at time"""
+        return self.start_time <= time <= self.end_time
+
+    def evaluate(self, time):
+        """Where every body is at a time, and how fast it's going
+        :param time: s, anywhere between start_time and end_time
+        :return: (positions, velocities), two (N, 2) arrays in the same order as names
+        """
+        if not self.covers(time):
+            raise ValueError("%f s is outside the ephemeris, which goes from %f s to %f s" %
+                             (time, self.start_time, self.end_time))
+        cell = min(int((time - self.start_time) // self.cell_length), self.lookup.shape[1] - 1)
+        rows = self.lookup[:, cell]
+        lengths = self.segment_lengths[rows]
+        # where in its segment each body is, from -1 to 1, which is where Chebyshev polynomials are defined
+        x = 2 * (time - self.segment_starts[rows]) / lengths - 1
+        positions = clenshaw(self.coefficients[rows], x)
+        velocities = clenshaw(self.derivatives[rows], x) * (2 / lengths)[:, numpy.newaxis]
+        return positions, velocities
+
+    def apply(self, entities, time):
+        """Puts every entity the ephemeris knows about where it is at time, and leaves the rest alone"""
+        positions, velocities = self.evaluate(time)
+        for entity in entities:
+            if entity.name in self.index:
+                i = self.index[entity.name]
+                entity.displacement = m * positions[i]
+                entity.velocity = m/s * velocities[i]
+
+    def save(self, filename):
+        numpy.savez(filename, names=numpy.array(self.names), start_time=self.start_time,
+                    cell_length=self.cell_length, lookup=self.lookup, segment_starts=self.segment_starts,
+                    segment_lengths=self.segment_lengths, coefficients=self.coefficients)
+
+    @classmethod
+    def load(cls, filename):
+        data = numpy.load(filename)
+        if "lookup" not in data:
+            # made before segments could have different lengths, build it again
+            raise IOError("%s is an old ephemeris" % filename)
+        return cls(data["names"].tolist(), float(data["start_time"]), float(data["cell_length"]), data["lookup"],
+                   data["segment_starts"], data["segment_lengths"], data["coefficients"])
+
+
+def clenshaw(coefficients, x):
+    """Evaluates a batch of 2D Chebyshev series, each at its own point
+    :param coefficients: (N, degree + 1, 2) array
+    :param x: (N,) array of points between -1 and 1
+    :return: (N, 2) array
+    """
+    x = x[:, numpy.newaxis]
+    b1 = numpy.zeros_like(coefficients[:, 0])
+    b2 = numpy.zeros_like(b1)
+    for k in range(coefficients.shape[1] - 1, 0, -1):
+        b1, b2 = 2 * x * b1 - b2 + coefficients[:, k], b1
+    return x * b1 - b2 + coefficients[:, 0]
+
+
+def build(world, duration, degree=DEGREE):
+    """Propagates the world and fits an ephemeris to it
+    :param world: the World to build it for, which isn't changed. Every body in it is in the ephemeris
+    :param duration: how far ahead the ephemeris goes, in s
+    :return: an Ephemeris, starting at world.time
+    """
+    world = world.copy()
+    dt = shortest_period(world) / STEPS_PER_ORBIT
+    chunk_steps = MAX_SEGMENT_STEPS
+    chunks = max(1, int(math.ceil(duration / (chunk_steps * dt))))
+
+    # one least squares fit per segment length, reused for every segment of every body that has that length
+    fits = {}
+    steps = chunk_steps
+    while steps >= MIN_SEGMENT_STEPS:
+        x = numpy.linspace(-1, 1, steps + 1)
+        vander = numpy.polynomial.chebyshev.chebvander(x, degree)
+        fits[steps] = (numpy.linalg.pinv(vander), vander)
+        steps //= 2
+
+    def fit(samples, steps, starts):
+        """Fits the segments of steps steps that start at starts, in a chunk's samples of one body
+        :return: ((segments, degree + 1, 2) coefficients, (segments,) biggest miss on any sample of each, in m)
+        """
+        # (segments, steps + 1, 2), neighbouring segments share their end points
+        samples = numpy.stack([samples[start:start + steps + 1] for start in starts])
+        pinv, vander = fits[steps]
+        coefficients = numpy.einsum("ks,nsd->nkd", pinv, samples)
+        miss = numpy.einsum("sk,nkd->nsd", vander, coefficients) - samples
+        return coefficients, numpy.sqrt((miss ** 2).sum(axis=-1)).max(axis=1)
+
+    def segments(samples, name):
+        """Fits a chunk's samples of one body with segments that all miss by less than FIT_TOLERANCE. Every segment is
+        a power of two steps long, and starts at a multiple of its length, so they always tile the chunk exactly.
+        Everything starts as one segment, and any segment that misses is split in half until it doesn't
+        :return: a list of (first step, steps, coefficients), in order
+        """
+        fitted = []
+        steps = chunk_steps
+        starts = [0]
+        while starts:
+            coefficients, misses = fit(samples, steps, starts)
+            missed = misses > FIT_TOLERANCE
+            if missed.any() and steps // 2 < MIN_SEGMENT_STEPS:
+                raise ValueError("can't fit the path of %s to within %g m even with segments of %d steps, it missed "
+                                 "by %g m" % (name, FIT_TOLERANCE, steps, misses.max()))
+            fitted += [(start, steps, coefficient) for start, coefficient, miss
+                       in zip(starts, coefficients, missed) if not miss]
+            steps //= 2
+            starts = [half for start, miss in zip(starts, missed) if miss for half in (start, start + steps)]
+        return sorted(fitted, key=lambda segment: segment[0])
+
+    cells_per_chunk = chunk_steps // MIN_SEGMENT_STEPS
+    lookup = numpy.zeros((len(world.names), chunks * cells_per_chunk), dtype=int)
+    segment_starts = []
+    segment_lengths = []
+    coefficients = []
+    start_time = world.time
+    for chunk in range(chunks):
+        times, positions, velocities = corbit.batch.propagate(world, chunk_steps * dt, chunk_steps)
+        for body, name in enumerate(world.names):
+            for start, steps, coefficient in segments(positions[:, body], name):
+                first_cell = chunk * cells_per_chunk + start // MIN_SEGMENT_STEPS
+                lookup[body, first_cell:first_cell + steps // MIN_SEGMENT_STEPS] = len(coefficients)
+                segment_starts.append(start_time + (chunk * chunk_steps + start) * dt)
+                segment_lengths.append(steps * dt)
+                coefficients.append(coefficient)
+
+    return Ephemeris(world.names, start_time, MIN_SEGMENT_STEPS * dt, lookup, segment_starts, segment_lengths,
+                     coefficients)
+
+
+def build_for(entities, duration):
+    """build() for the entities that have known paths, which is all of them except habitats"""
+    return build(corbit.batch.World.from_entities([entity for entity in entities if type(entity) is Entity]),
+                 duration)
+
+
+if __name__ == "__main__":
+    import corbit.mysqlio
+    save_file = sys.argv[1] if len(sys.argv) > 1 else "saves/OCESS.json"
+    days = float(sys.argv[2]) if len(sys.argv) > 2 else 365
+    with open(save_file, "r") as loadfile:
+        entities = corbit.mysqlio.load_json(loadfile)
+    ephemeris = build_for(entities, days * DAY)
+    ephemeris.save(ephemeris_file(save_file))
+    print("saved", len(ephemeris.names), "bodies,", len(ephemeris.coefficients), "segments, covering",
+          (ephemeris.end_time - ephemeris.start_time) / DAY, "days to", ephemeris_file(save_file))
@@ -0,0 +1,114 @@
+import numpy
+
+import corbit.encounters
+
+# Hierarchical reference frames. Instead of every body's position being heliocentric (up to 1e13 m out at Sedna,
+# which needs float64 to be any good), every body's state is kept relative to its parent: the Sun, then Earth, then
+# the Moon and the habitats around it. Those local states are small enough to fit in float32, which is half the
+# memory (and memory bandwidth) for big scenes.
+# Positions in some other frame are only put together when someone asks for them, and kept until the next update().
+# Asking for them relative to the body the camera is centred on (a floating origin) keeps everything near the camera
+# precise, no matter how far from the Sun it is.
+
+
+def find_parents(world):
+    """Picks every body's parent: the smallest sphere of influence of something heavier that it's inside of.
+    That puts the Moon under Earth even though the Sun pulls on it harder
+    :return: (N,) array of parent indices, -1 for bodies with no parent (the Sun)
+    """
+    soi = corbit.encounters.spheres_of_influence(world)
+    delta = world.positions[numpy.newaxis, :, :] - world.positions[:, numpy.newaxis, :]
+    distance = numpy.sqrt((delta ** 2).sum(axis=-1))
+    # candidate[i, j] is True if j could be i's parent
+    candidate = (distance < soi[numpy.newaxis, :]) & (world.masses[numpy.newaxis, :] > world.masses[:, numpy.newaxis])
+    size = numpy.where(candidate, soi[numpy.newaxis, :], numpy.inf)
+    parents = size.argmin(axis=1)
+    parents[~candidate.any(axis=1)] = -1
+    return parents
+
+
+class Frames:
+    """The state of a World, with every body relative to its parent.
+    Parents are picked again on every update(), so a craft that leaves Earth's sphere of influence for the Moon's is
+    from then on kept relative to the Moon
+    """
+
+    def __init__(self, world, parents=None):
+        """
+        :param world: the World to take the bodies and their first state from
+        :param parents: (N,) array of parent indices, -1 for roots, which are then kept for good. None picks them
+        with find_parents(), and picks them again whenever bodies move from one sphere of influence to another
+        """
+        self.names = list(world.names)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.fixed = parents is not None
+        self.parents = None
+        self.local_positions = numpy.zeros((len(self.names), 2), dtype=numpy.float32)
+        self.local_velocities = numpy.zeros((len(self.names), 2), dtype=numpy.float32)
+        self.set_parents(find_parents(world) if parents is None else parents)
+        self.update(world)
+
+    def set_parents(self, parents):
+        """Rearranges the tree. Only update() makes the local states match it"""
+        self.parents = numpy.array(parents)
+        # bodies grouped by how deep in the tree they are, so each group can be put together all at once
+        depth = numpy.zeros(len(self.names), dtype=int)
+        for i in range(len(self.names)):
+            parent = self.parents[i]
+            while parent >= 0:
+                depth[i] += 1
+                parent = self.parents[parent]
+        self.roots = numpy.flatnonzero(self.parents < 0)
+        self.levels = [numpy.flatnonzero(depth == level) for level in range(1, depth.max() + 1)]
+        # roots don't have anything to be relative to, so they're the only ones kept in float64
+        self.root_positions = numpy.zeros((len(self.roots), 2))
+        self.root_velocities = numpy.zeros((len(self.roots), 2))
+
+    def update(self, world):
+        """Takes the newest state from a World with the same bodies in the same order, e.g. once per tick
+        :return: (M,) array of the bodies that crossed into another sphere of influence, and so got another parent
+        """
+        crossed = numpy.zeros(0, dtype=int)
+        if not self.fixed:
+            parents = find_parents(world)
+            crossed = numpy.flatnonzero(parents != self.parents)
+            if len(crossed):
+                self.set_parents(parents)
+        children = self.parents >= 0
+        self.local_positions[children] = world.positions[children] - world.positions[self.parents[children]]
+        self.local_velocities[children] = world.velocities[children] - world.velocities[self.parents[children]]
+        self.root_positions[:] = world.positions[self.roots]
+        self.root_velocities[:] = world.velocities[self.roots]
+        self.cache = {}
+        return crossed
+
+    def parent(self, name):
+        """:return: the name of a body's parent, or None for a root"""
+        parent = self.parents[self.index[name]]
+        return None if parent < 0 else self.names[parent]
+
+    def compose(self):
+        """Puts the local states together into the frame of the roots
+        :return: (positions, velocities), two float64 (N, 2) arrays
+        """
+        if None not in self.cache:
+            positions = numpy.zeros((len(self.names), 2))
+            velocities = numpy.zeros((len(self.names), 2))
+            positions[self.roots] = self.root_positions
+            velocities[self.roots] = self.root_velocities
+            for level in self.levels:
+                positions[level] = positions[self.parents[level]] + self.local_positions[level]
+                velocities[level] = velocities[self.parents[level]] + self.local_velocities[level]
+            self.cache[None] = (positions, velocities)
+        return self.cache[None]
+
+    def relative_to(self, origin):
+        """Every body's state relative to one of them, e.g. whatever the camera is centred on
+        :param origin: name of the body to put at (0, 0)
+        :return: (positions, velocities), two float64 (N, 2) arrays. Don't change them, they're kept until update()
+        """
+        if origin not in self.cache:
+            positions, velocities = self.compose()
+            i = self.index[origin]
+            self.cache[origin] = (positions - positions[i], velocities - velocities[i])
+        return self.cache[origin]
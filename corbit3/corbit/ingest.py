@@ -0,0 +1,202 @@
+import queue
+import threading
+import time
+
+import numpy
+from unum.units import s
+
+import corbit.interest
+import corbit.lockstep
+import corbit.storage
+from corbit.mysqlio import entity_row, row_entity
+
+# Everything the pilot gets from and sends to storage happens in here, in a thread of its own, so a slow database
+# never holds up drawing or reacting to keys. The pilot's render loop only ever looks at the newest snapshot this
+# thread got, and drops commands off to be sent, neither of which waits on anything.
+#
+# With a server in lockstep mode, LockstepIngest simulates the world here instead, from the commands the server
+# applied, so the whole world only has to be read once.
+#
+# The newest snapshot is just an attribute that gets replaced with a whole new tuple, which is atomic in Python, so the
+# render loop never sees half of one and neither side needs a lock. The same goes for what the pilot's looking at,
+# which the render loop hands over every frame (see StateIngest.look). Once that's known, most reads only get the
+# bodies the pilot cares about (see corbit.interest), and the rest keep their last rows until everything is read
+# again every SWEEP_INTERVAL, which is also when bodies that came or went get noticed. So how much is read, and how
+# much the pilot has to turn into entities, doesn't go up with how many bodies there are.
+
+POLL_INTERVAL = 1 / 120  # s, how long to wait between reads when there are no commands to send
+SWEEP_INTERVAL = 1.0     # s between reading every body, not just the ones the pilot cares about
+
+
+class StateIngest(threading.Thread):
+    """Keeps reading the world from storage in the background, and sends the pilot's commands"""
+
+    def __init__(self, storage, pilot, particles=True):
+        """
+        :param storage: where to read from and send to, see corbit.storage. Nothing else should use it while this
+        is running
+        :param pilot: the pilot's name, to read its acknowledgements, see corbit.commands
+        :param particles: False to never read the particles, for pilots that don't draw them
+        """
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.storage = storage
+        self.pilot = pilot
+        self.outbox = queue.SimpleQueue()
+        self.unsent = []  # commands taken out of outbox that haven't made it to storage yet, in order
+        self.wakeup = threading.Event()
+        # the newest (acknowledgement, entity rows, particles, telemetry), or None until the first read. Replaced all
+        # at once
+        self.latest = None
+        self.error = None  # the last thing that went wrong reading or sending, for the pilot to show
+        self.wants_particles = particles
+        # the particles last read, and the generation they were read at. They're big and only published every few
+        # ticks, so they're only read again once the generation changes
+        self.particles = corbit.storage.no_particles()
+        self.particles_generation = None
+        # (control, reference, target, camera position in m, zoom level, screen size) from look(), None until then.
+        # Replaced all at once
+        self.view = None
+        # the rows from the last time everything was read, with the ones read since put in. Only ever replaced
+        self.rows = []
+        self.names = []  # of rows
+        self.index = {}  # name -> where it is in rows
+        self.positions = numpy.zeros((0, 2))  # of rows, in m
+        self.radii = numpy.zeros(0)
+        self.swept = None  # time.monotonic() of the last time everything was read
+
+    def look(self, control, reference, target, camera_position, zoom_level, screen_size):
+        """Tells the thread what the pilot's looking at, so it only has to read the bodies that matter for that most
+        of the time, see corbit.interest.Interest. Doesn't wait for anything
+        :param camera_position: where the camera is, in m
+        :param zoom_level: pixels per m
+        :param screen_size: (width, height), in pixels
+        """
+        self.view = (control, reference, target, camera_position, zoom_level, screen_size)
+
+    def send(self, commands):
+        """Drops commands off to be pushed to storage. Doesn't wait for anything"""
+        self.outbox.put(commands)
+        self.wakeup.set()
+
+    def run(self):
+        while True:
+            self.wakeup.wait(POLL_INTERVAL)
+            self.wakeup.clear()
+            try:
+                while True:
+                    self.unsent += self.outbox.get_nowait()
+            except queue.Empty:
+                pass
+            if self.unsent:
+                try:
+                    self.storage.push_commands(self.unsent)
+                    self.unsent = []
+                except Exception as error:
+                    self.error = error  # they'll go with the next lot
+
+            try:
+                latest = self.read()
+            except Exception as error:
+                # keep going, the database might be back next time
+                self.error = error
+                continue
+            self.error = None
+            if latest is not None:
+                self.latest = latest
+
+    def read(self):
+        """:return: the newest (acknowledgement, entity rows, particles, telemetry), or None if there's nothing new yet.
+        Telemetry is the rows Storage.get_telemetry() returned, see corbit.telemetry
+        """
+        # the acknowledgement has to be read first, so the entities are at least as new as it
+        acknowledgement = self.storage.get_acknowledgement(self.pilot)
+        rows = self.read_entity_rows()
+        return acknowledgement, rows, self.read_particles(), self.storage.get_telemetry()
+
+    def read_entity_rows(self):
+        """:return: the newest rows of the bodies the pilot cares about, and the last ones read of the rest. Every
+        SWEEP_INTERVAL, or until the pilot says what it's looking at, the newest rows of everything
+        """
+        view = self.view
+        now = time.monotonic()
+        if view is None or self.swept is None or now - self.swept >= SWEEP_INTERVAL:
+            rows = self.storage.get_entity_rows()
+            if rows is not self.rows:
+                self.names = [row[1] for row in rows]
+                self.index = {name: i for i, name in enumerate(self.names)}
+                self.positions = numpy.array([row[7:9] for row in rows], dtype=float).reshape(-1, 2)
+                self.radii = numpy.array([row[3] for row in rows], dtype=float)
+                self.rows = rows
+            self.swept = now
+            return rows
+
+        control, reference, target, camera_position, zoom_level, screen_size = view
+        interest = corbit.interest.Interest(control, reference, screen_size, target)
+        interest.update_view(camera_position, zoom_level)
+        wanted = numpy.flatnonzero(interest.relevant(self.names, self.positions, self.radii))
+        rows = None
+        for row in self.storage.get_entity_rows([self.names[i] for i in wanted.tolist()]):
+            i = self.index.get(row[1])
+            if i is None or self.rows[i] == row:
+                continue  # new bodies wait for the next sweep
+            if rows is None:
+                rows = list(self.rows)
+            rows[i] = row
+            self.positions[i] = row[7:9]
+        if rows is not None:
+            # a new list, the old one might still be in latest
+            self.rows = rows
+        return self.rows
+
+    def read_particles(self):
+        """:return: the newest particles, only read from storage if they've changed since last time"""
+        if not self.wants_particles:
+            return self.particles
+        generation = self.storage.get_particles_generation()
+        if generation != self.particles_generation:
+            self.particles = self.storage.get_particles()
+            self.particles_generation = generation
+        return self.particles
+
+
+class LockstepIngest(StateIngest):
+    """For a server in lockstep mode. Only reads the whole world to start from, then simulates it here from the
+    server's command log, see corbit.lockstep.Replica. If it ever gets out of sync, it starts again from the next
+    state the server publishes
+    """
+
+    def __init__(self, storage, pilot, particles=True):
+        StateIngest.__init__(self, storage, pilot, particles)
+        self.replica = None
+
+    def start_replica(self):
+        """:return: a Replica of the newest state the server published, or None if there isn't one yet"""
+        published = self.storage.get_latest_state_hash()
+        if published is None:
+            return None
+        tick, expected = published
+        entities = corbit.lockstep.canonical_order([row_entity(row) for row in self.storage.get_entity_rows()])
+        if corbit.lockstep.state_hash(entities) != expected:
+            return None  # the server published again in between, try again next time
+        return corbit.lockstep.Replica(entities, int(tick))
+
+    def read(self):
+        if self.replica is None:
+            self.replica = self.start_replica()
+            if self.replica is None:
+                return None
+        replica = self.replica
+        # the hash first, so the log is at least as new as it
+        published = self.storage.get_latest_state_hash()
+        replica.receive(self.storage.get_command_log(replica.logged + 1))
+        if published is not None and replica.verify(int(published[0]), published[1]) is False \
+                or not replica.advance():
+            self.replica = None
+            return None
+
+        acknowledgement = None
+        if self.pilot in replica.acknowledgements:
+            acknowledgement = (replica.acknowledgements[self.pilot], replica.time.asNumber(s))
+        return (acknowledgement, [entity_row(entity) for entity in replica.entities], self.read_particles(),
+                self.storage.get_telemetry())
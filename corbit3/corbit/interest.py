@@ -0,0 +1,59 @@
+import numpy
+
+# Which bodies a pilot cares about right now, so those can be kept up to date all the time and the rest let slide. The
+# pilot's ingest thread only reads these from storage most of the time (see corbit.ingest), and a server sending
+# snapshots over a network only sends these every tick (see corbit.snapshot.Encoder.encode). A pilot cares about:
+#  - its control craft and reference body, which the HUD is all about, and its target
+#  - anything on screen, or close enough to the edge of it that it could be on screen soon
+#  - anything big enough to show up as more than a dot at the pilot's zoom level, wherever it is
+# Everything else is off screen and tiny, so nobody can tell if it's a bit out of date.
+
+MARGIN = 0.5        # the screen is widened by this much of its size on every side, for bodies about to come on screen
+MIN_PIXELS = 2.0    # bodies at least this many pixels across are always relevant
+
+
+class Interest:
+    """What one pilot is looking at, as far as the server knows"""
+
+    def __init__(self, control, reference, screen_size=(681, 745), target=None):
+        """
+        :param control: name of the pilot's control craft, see corbit.objects.control
+        :param reference: name of the pilot's reference body, see corbit.objects.reference
+        :param screen_size: (width, height) of the pilot's screen, in pixels
+        :param target: name of the pilot's target, see corbit.objects.target
+        """
+        self.control = control
+        self.reference = reference
+        self.target = target
+        self.screen_size = screen_size
+        self.camera_position = None  # m, None until the pilot says where it's looking
+        self.zoom_level = None       # pixels per m
+
+    def update_view(self, camera_position, zoom_level, screen_size=None):
+        """Called whenever the pilot says where its camera is, see corbit.objects.Camera"""
+        self.camera_position = numpy.asarray(camera_position, dtype=float)
+        self.zoom_level = zoom_level
+        if screen_size is not None:
+            self.screen_size = screen_size
+
+    def relevant(self, names, positions, radii):
+        """
+        :param names: list of the names of the bodies
+        :param positions: (N, 2) array of positions, in m
+        :param radii: (N,) array of radii, in m
+        :return: (N,) bool array, True for the bodies the pilot cares about
+        """
+        if self.camera_position is None:
+            return numpy.ones(len(names), dtype=bool)  # no idea what it's looking at, so everything
+        relevant = numpy.zeros(len(names), dtype=bool)
+        for name in (self.control, self.reference, self.target):
+            if name in names:
+                relevant[names.index(name)] = True
+
+        # anything overlapping the (widened) screen. Treating bodies as squares is a little generous at the corners
+        half_size = (1 + 2 * MARGIN) * numpy.array(self.screen_size, dtype=float) / 2 / self.zoom_level
+        distance = numpy.abs(positions - self.camera_position) - radii[:, numpy.newaxis]
+        relevant |= (distance <= half_size).all(axis=1)
+
+        relevant |= 2 * radii * self.zoom_level >= MIN_PIXELS
+        return relevant
@@ -0,0 +1,186 @@
+import hashlib
+import itertools
+import struct
+
+import corbit.commands
+import corbit.physics
+from corbit.objects import Habitat
+from unum.units import m, s, kg, rad
+
+# Lockstep mode: every process that starts from the same save file and applies the same commands on the
+# same ticks ends up with bit-for-bit the same world. That way the server only has to publish the commands
+# it applied and, every so often, a hash of its state and the state itself, instead of the whole flight table every
+# tick. A pilot starts a Replica from the state, then keeps it going from the commands (see
+# corbit.ingest.LockstepIngest).
+#
+# Every tick's commands are logged with a (TICK_TIME, None, dt) command on the end, since time acceleration changes dt
+# and a replica has to step exactly as far as the server did. Only the commands that fly a craft get replayed, the rest
+# are the server's business, except for "open", which loads a world that isn't in the log at all, so a replica that
+# sees one has to start again from the next published state.
+
+COMMAND_DELAY = 2       # commands popped on tick n are scheduled for tick n + COMMAND_DELAY
+HASH_INTERVAL = 60      # publish a state hash (and the state) every this many ticks
+TICK_TIME = "tick_time"
+
+
+def canonical_order(entities):
+    """Returns the entities in the order every lockstep peer iterates them in
+    :param entities: list of entities, in any order
+    :return: a new list, sorted by name
+    """
+    return sorted(entities, key=lambda entity: entity.name)
+
+
+def canonical_commands(commands):
+    """Sorts the commands scheduled for a single tick so that every peer applies them in the same order.
+    Commands are (COMMAND, TARGET, AMOUNT) tuples, TARGET and AMOUNT may be missing or None
+    """
+    return sorted(commands, key=lambda command: tuple(str(field) for field in command))
+
+
+def step(entities, time, after_gravity=None):
+    """Simulates one tick in a fixed order: gravity over every pair, then moving and colliding.
+    :param entities: the entities to simulate, already in canonical_order()
+    :param time: the fixed dt of the tick
+    :param after_gravity: called with no arguments once gravity's been added to the accelerations, before they get
+    used up moving everything. For looking at them only, e.g. the server's telemetry, it mustn't change anything
+    """
+    # summing the forces pair by pair in canonical order means every peer adds up the same
+    # floats in the same order, which is what makes the result reproducible
+    for A, B in itertools.combinations(entities, 2):
+        gravity = corbit.physics.gravitational_force(A, B)
+        theta = corbit.physics.angle(A, B)
+        A.accelerate(gravity, theta)
+        B.accelerate(-gravity, theta)
+    if after_gravity is not None:
+        after_gravity()
+
+    # collisions are handled in order of when they happen, ties broken by canonical order
+    corbit.physics.resolve_collisions(entities, time)
+
+
+def act_on_commands(entities, commands, time):
+    """Flies the crafts the way a tick's commands say to, the part of a tick's commands the server and every replica
+    apply the same way. Anything that isn't a craft command is left alone
+    :param commands: the tick's commands, in canonical_commands() order
+    :param time: the dt of the tick, after any of its commands that changed it
+    """
+    for command in commands:
+        corbit.commands.apply(entities, command, time)
+
+
+def state_hash(entities):
+    """Hashes the exact binary state of the world, so peers can check they haven't desynced
+    :param entities: the entities, in canonical_order()
+    :return: a hex digest string
+    """
+    digest = hashlib.sha1()
+    for entity in entities:
+        digest.update(entity.name.encode("UTF-8"))
+        digest.update(struct.pack("<9d",
+                                  entity.mass_fun().asNumber(kg),
+                                  entity.displacement[0].asNumber(m),
+                                  entity.displacement[1].asNumber(m),
+                                  entity.velocity[0].asNumber(m/s),
+                                  entity.velocity[1].asNumber(m/s),
+                                  entity.acceleration[0].asNumber(m/s/s),
+                                  entity.acceleration[1].asNumber(m/s/s),
+                                  entity.angular_position.asNumber(rad),
+                                  entity.angular_speed.asNumber(rad/s)))
+        if type(entity) is Habitat:
+            digest.update(struct.pack("<2d",
+                                      entity.engine_system.fuel.asNumber(kg),
+                                      entity.rcs_system.fuel.asNumber(kg)))
+    return digest.hexdigest()
+
+
+class CommandSchedule:
+    """Holds commands until the tick they are to be applied on"""
+
+    def __init__(self):
+        self.pending = {}
+
+    def schedule(self, tick, commands):
+        """Queues up commands to be applied at the start of a tick"""
+        self.pending.setdefault(tick, []).extend(commands)
+
+    def due(self, tick):
+        """Removes and returns the commands for a tick, in canonical order.
+        Commands that were scheduled for a tick that has already passed are applied now, since that can
+        only happen on the server, which is the one deciding which tick a command belongs to anyways
+        """
+        commands = []
+        for scheduled_tick in sorted(self.pending):
+            if scheduled_tick > tick:
+                break
+            commands += self.pending.pop(scheduled_tick)
+        return canonical_commands(commands)
+
+
+class Replica:
+    """A local copy of the server's world, kept in sync by replaying the server's command log"""
+
+    def __init__(self, entities, tick=0):
+        """
+        :param entities: the state the server published for tick, see Storage.get_latest_state_hash()
+        :param tick: the tick that state is from, the start of it, before any of its commands
+        """
+        self.entities = canonical_order(entities)
+        self.tick = tick
+        self.time = None        # the dt of the last tick, which every tick's log says
+        self.logged = tick - 1  # the last tick whose commands have been received
+        self.commands = CommandSchedule()
+        self.hashes = {}        # tick: the server's hash for it, for ticks the replica hasn't got to yet
+        self.acknowledgements = {}  # pilot: number of its last acknowledge command replayed, see corbit.commands
+
+    def receive(self, log):
+        """Schedules the commands from the server's log, see Storage.get_command_log(). Ticks that have already been
+        received are skipped, so it's fine to pass the same ticks in more than once
+        :param log: {tick: [commands]}, the ticks in it have to be all there is of the log from self.logged + 1 on
+        """
+        for tick in sorted(log):
+            if tick > self.logged:
+                self.commands.schedule(tick, log[tick])
+                self.logged = tick
+
+    def advance(self):
+        """Simulates every tick there's a log for
+        :return: True if it's still in sync, False if the replica has diverged or a new world was loaded, and it needs
+        starting again from a full state
+        """
+        while self.tick <= self.logged:
+            if not self.check():
+                return False
+            commands = self.commands.due(self.tick)
+            for function, target, amount in commands:
+                if function == TICK_TIME:
+                    self.time = float(amount) * s
+                elif function == "open":
+                    return False
+            if self.time is None:
+                return False  # only happens if the log's missing ticks
+            act_on_commands(self.entities, commands, self.time)
+            step(self.entities, self.time)
+            for function, target, amount in commands:
+                if function == corbit.commands.ACKNOWLEDGE:
+                    self.acknowledgements[target] = int(amount)
+            self.tick += 1
+        return self.check()
+
+    def check(self):
+        # compares against the server's hash for the tick the replica's at, if there is one
+        expected = self.hashes.pop(self.tick, None)
+        return expected is None or state_hash(self.entities) == expected
+
+    def verify(self, tick, expected_hash):
+        """Checks the replica against a hash published by the server. If the replica isn't at that tick yet, it's
+        checked once it gets there, see advance()
+        :return: True if in sync, False if the replica has diverged and needs a full state reload.
+        None if it hasn't got to that tick yet, or is already past it
+        """
+        if tick > self.tick:
+            self.hashes[tick] = expected_hash
+            return None
+        if tick != self.tick:
+            return None
+        return state_hash(self.entities) == expected_hash
@@ -1,8 +1,9 @@
+import contextlib
 import io
-import MySQLdb as msd # msd -> My Sql Db
 import json
-import scipy
-from corbit.objects import Entity, EngineSystem, Habitat
+import queue
+import numpy
+from corbit.objects import Entity, Habitat
 from unum.units import kg, m, s, rad
 
 __author__ = 'vac'
@@ -94,12 +95,49 @@ def load_json(input_stream):
     return json_entities
 
 
-db_cursor = None
-db = None
-def flush_db(entities, db_info):
-    global db
-    db = msd.connect(*db_info)
-    global db_cursor
+POOL_SIZE = 2  # connections kept open, so publishing the world and picking up commands don't wait on each other
+NAMES_PER_QUERY = 500  # names to look up in one SELECT, so queries don't get too long
+
+
+def open_connection(db_info):
+    # MySQLdb takes a while to import, and plenty of things use this module without ever touching the database
+    # (e.g. load_json), so it only gets imported once we actually connect
+    import MySQLdb as msd # msd -> My Sql Db
+    return msd.connect(*db_info)
+
+
+class ConnectionPool:
+    """A few open connections, handed out one at a time. Use it like
+        with pool.connection() as db:
+            ...
+    """
+
+    def __init__(self, db_info, size=POOL_SIZE):
+        self.idle = queue.LifoQueue()
+        for _ in range(size):
+            self.idle.put(open_connection(db_info))
+
+    def acquire(self):
+        """Takes a connection out of the pool, waiting for one if they're all in use"""
+        return self.idle.get()
+
+    def release(self, db):
+        self.idle.put(db)
+
+    @contextlib.contextmanager
+    def connection(self):
+        db = self.acquire()
+        try:
+            yield db
+        finally:
+            self.release(db)
+
+
+# Everything below takes an open connection, and leaves committing up to the caller, so that several writes can go
+# out in one commit. Everything is parameterized, so MySQLdb sends every double at full precision and takes care of
+# quoting. TRUNCATE would commit on its own, so tables are emptied with DELETE instead.
+
+def flush_db(db):
     db_cursor = db.cursor()
     # TODO: in the future, if you want to implement a "restore previous state" option, like what orbit has right now,
     # you can just not run this function, and then and then load whatever is in
@@ -111,100 +149,185 @@ def flush_db(entities, db_info):
         ACCX DOUBLE NOT NULL, ACCY DOUBLE NOT NULL,
         ANGPOS DOUBLE NOT NULL, ANGV DOUBLE NOT NULL, ANGACC DOUBLE NOT NULL,
         FUEL DOUBLE, RCSFUEL DOUBLE)""")
+    # SEQ keeps commands in order, and lets pop_commands() delete exactly the ones it read
     db_cursor.execute("DROP TABLE IF EXISTS flightcommands")
-    db_cursor.execute("""CREATE TABLE flightcommands ( COMMAND CHAR(64) NOT NULL, TARGET CHAR(64), AMOUNT DOUBLE)""")
+    db_cursor.execute("""CREATE TABLE flightcommands (
+        SEQ BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY, COMMAND CHAR(64) NOT NULL, TARGET CHAR(64), AMOUNT DOUBLE)""")
+    # these two are only written to in lockstep mode, see corbit.lockstep
+    db_cursor.execute("DROP TABLE IF EXISTS commandlog")
+    db_cursor.execute("""CREATE TABLE commandlog (
+        TICK BIGINT NOT NULL, SEQ INT NOT NULL, COMMAND CHAR(64) NOT NULL, TARGET CHAR(64), AMOUNT DOUBLE)""")
+    db_cursor.execute("DROP TABLE IF EXISTS statehashes")
+    db_cursor.execute("""CREATE TABLE statehashes ( TICK BIGINT NOT NULL, HASH CHAR(40) NOT NULL)""")
+    # particles go in as one row of packed arrays, since a row per particle would be far too slow, see corbit.particles
+    db_cursor.execute("DROP TABLE IF EXISTS particles")
+    # GENERATION goes up with every push, so pilots only read the blobs again when they've changed
+    db_cursor.execute("""CREATE TABLE particles (
+        GENERATION BIGINT NOT NULL, COUNT INT NOT NULL, POSITIONS LONGBLOB NOT NULL, COLORS LONGBLOB NOT NULL)""")
+    # how far through each pilot's commands the server's got, see corbit.commands
+    db_cursor.execute("DROP TABLE IF EXISTS acknowledgements")
+    db_cursor.execute("""CREATE TABLE acknowledgements (
+        PILOT CHAR(64) NOT NULL PRIMARY KEY, SEQ BIGINT NOT NULL, TICKTIME DOUBLE NOT NULL)""")
+    # the server's HUD numbers for every registered (craft, reference) pair, see corbit.telemetry
+    db_cursor.execute("DROP TABLE IF EXISTS telemetry")
+    db_cursor.execute("""CREATE TABLE telemetry (
+        SEQ INT NOT NULL PRIMARY KEY, CRAFT CHAR(64) NOT NULL, REFERENCE CHAR(64) NOT NULL, CHANNEL CHAR(64) NOT NULL,
+        VALUE DOUBLE)""")
     db.commit()
 
-def connect_to_db(db_info):
-    global db
-    db = msd.connect(*db_info)
-    global db_cursor
+
+def entity_row(entity):
+    """Turns an entity into a row of the flight table, in the order of its columns:
+    TYPE, NAME, MASS, RADIUS, COLORR, COLORG, COLORB, POSX, POSY, VX, VY, ACCX, ACCY, ANGPOS, ANGV, ANGACC, FUEL, RCSFUEL
+    MASS is the dry mass, the fuel is added back on by the Habitat
+    """
+    row = (entity.name,
+           entity.dry_mass.asNumber(kg),
+           entity.radius.asNumber(m),
+           int(entity.color[0]),
+           int(entity.color[1]),
+           int(entity.color[2]),
+           float(entity.displacement[0].asNumber(m)),
+           float(entity.displacement[1].asNumber(m)),
+           float(entity.velocity[0].asNumber(m/s)),
+           float(entity.velocity[1].asNumber(m/s)),
+           float(entity.acceleration[0].asNumber(m/s/s)),
+           float(entity.acceleration[1].asNumber(m/s/s)),
+           entity.angular_position.asNumber(rad),
+           entity.angular_speed.asNumber(rad/s),
+           entity.angular_acceleration.asNumber(rad/s/s))
+    if type(entity) is Entity:
+        return ("entity",) + row + (0.0, 0.0)
+    return ("habitat",) + row + (entity.engine_system.fuel.asNumber(kg), entity.rcs_system.fuel.asNumber(kg))
+
+def row_entity(entity):
+    """Turns a row of the flight table back into an entity, see entity_row()"""
+    # sorry for not being able to access fields in a clearer manner, but here's a conversion list
+    # that is true, but everything just comes in the order that the columns are in:
+    # TYPE, NAME, MASS, RADIUS, COLORR, COLORG, COLORB, POSX, POSY, VX, VY, ACCX, ACCY, ANGPOS, ANGV, ANGACC,
+    # (FUEL, RCSFUEL)
+    if entity[0] == "entity":
+        return Entity(entity[1], entity[2], entity[3], (entity[4], entity[5], entity[6]), [entity[7], entity[8]],
+                      [entity[9], entity[10]], [entity[11], entity[12]], entity[13], entity[14], entity[15])
+    elif entity[0] == "habitat":
+        return Habitat(entity[1], entity[2], entity[3], (entity[4], entity[5], entity[6]), [entity[7], entity[8]],
+                       [entity[9], entity[10]], [entity[11], entity[12]], entity[13], entity[14], entity[15],
+                       entity[16], entity[17])
+
+def push_entities(db, entities):
     db_cursor = db.cursor()
+    db_cursor.execute("DELETE FROM flight")
+    # executemany turns this into a single INSERT with a row for every entity
+    db_cursor.executemany("""INSERT INTO flight(
+        TYPE, NAME, MASS, RADIUS, COLORR, COLORG, COLORB, POSX, POSY, VX, VY, ACCX, ACCY, ANGPOS, ANGV, ANGACC, FUEL, RCSFUEL)
+        VALUES(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
+                          [entity_row(entity) for entity in entities])
 
+def get_entity_rows(db, names=None):
+    """:return: the rows of the flight table, without turning them into entities, see row_entity()
+    :param names: only get the rows of the entities with these names, in no particular order. None for all of them
+    """
+    db_cursor = db.cursor()
+    if names is None:
+        db_cursor.execute("SELECT * FROM flight")
+        rows = db_cursor.fetchall()
+    else:
+        names = list(names)
+        rows = []
+        for start in range(0, len(names), NAMES_PER_QUERY):
+            chunk = names[start:start + NAMES_PER_QUERY]
+            db_cursor.execute("SELECT * FROM flight WHERE NAME IN (" + ", ".join(["%s"] * len(chunk)) + ")", chunk)
+            rows += db_cursor.fetchall()
+    return [row for row in rows if row[0] in ("entity", "habitat")]
 
-def push_entities(entities):
-    list_of_values = []
-    sql_code = """INSERT INTO flight(
-            TYPE, NAME, MASS, RADIUS, COLORR, COLORG, COLORB, POSX, POSY, VX, VY, ACCX, ACCY, ANGPOS, ANGV, ANGACC, FUEL, RCSFUEL)
-            VALUES"""
-    for entity in entities:
-        fields = """ (
-            '%s', '%s', %f,   %f,     %d,     %d,     %d,     %f,   %f,   %f, %f, %f,   %f,   %f,     %f,   %f,     %f,   %f),"""
-
-        values = (entity.name,
-                  entity.mass_fun().asNumber(kg),
-                  entity.radius.asNumber(m),
-                  entity.color[0],
-                  entity.color[1],
-                  entity.color[2],
-                  entity.displacement[0].asNumber(m),
-                  entity.displacement[1].asNumber(m),
-                  entity.velocity[0].asNumber(m/s),
-                  entity.velocity[1].asNumber(m/s),
-                  entity.acceleration[0].asNumber(m/s/s),
-                  entity.acceleration[1].asNumber(m/s/s),
-                  entity.angular_position.asNumber(rad),
-                  entity.angular_speed.asNumber(rad/s),
-                  entity.angular_acceleration.asNumber(rad/s/s))
-        if type(entity) is Entity:
-            values = ("entity",) + values
-            values += (0,0,)
-        else:
-            values = ("habitat",) + values
-            values += (entity.engine_system.fuel.asNumber(kg), entity.rcs_system.fuel.asNumber(kg),)
-        sql_code += fields % values
-    try:
-        sql_code = sql_code[:-1] # removes the last ","
-        db_cursor.execute("TRUNCATE TABLE flight")
-        db_cursor.execute(sql_code)
-        db.commit()
-    except Exception as excp:
-        print(sql_code)
-        print("HELP", excp, entity.name)
-        db.rollback()
-
-def get_entities():
-    db_cursor.execute("SELECT * FROM flight")
-    sql_object = db_cursor.fetchall()
-    db.commit()
-    retrieved_entities = []
-    for entity in sql_object:
-        # sorry for not being able to access fields in a clearer manner, but here's a conversion list
-        # that is true, but everything just comes in the order that the columns are in:
-        # TYPE, NAME, MASS, RADIUS, COLORR, COLORG, COLORB, POSX, POSY, VX, VY, ACCX, ACCY, ANGPOS, ANGV, ANGACC,
-        # (FUEL, RCSFUEL)
-        if entity[0] == "entity":
-            retrieved_entities.append(
-                Entity(entity[1], entity[2], entity[3], (entity[4], entity[5], entity[6]), [entity[7], entity[8]],
-                       [entity[9], entity[10]], [entity[11], entity[12]], entity[13], entity[14], entity[15]))
-        elif entity[0] == "habitat":
-            retrieved_entities.append(
-                Habitat(entity[1], entity[2], entity[3], (entity[4], entity[5], entity[6]), [entity[7], entity[8]],
-                        [entity[9], entity[10]], [entity[11], entity[12]], entity[13], entity[14], entity[15],
-                        entity[16], entity[17]))
-    return retrieved_entities
-
-def push_commands(list_of_commands):
-    for comm in list_of_commands:
-        values = "VALUES('%s'"
-        try:
-            if type(comm[1]) is str:
-                values += ", %s"
-            if type(comm[2]) is float:
-                values += ", %f"
-        except IndexError:
-            pass
-        values += ")"
-        db_cursor.execute("INSERT INTO flightcommands(COMMAND, TARGET, AMOUNT) " + values)
-        db.commit()
-
-def pop_commands():
-    commands = []
-    try:
-        db_cursor.execute("SELECT * FROM pilotcommands")
-        commands = db_cursor.fetchall()
-        db_cursor.execute("TRUNCATE TABLE pilotcommands")
-        db.commit()
-    except:
-        db.rollback()
-    return commands
+def get_entities(db):
+    return [row_entity(row) for row in get_entity_rows(db)]
+
+def push_commands(db, list_of_commands):
+    db.cursor().executemany("INSERT INTO flightcommands(COMMAND, TARGET, AMOUNT) VALUES(%s, %s, %s)",
+                            [(tuple(comm) + (None,) * 3)[:3] for comm in list_of_commands])
+
+def pop_commands(db):
+    """:return: the commands pushed since the last pop, in order"""
+    db_cursor = db.cursor()
+    db_cursor.execute("SELECT SEQ, COMMAND, TARGET, AMOUNT FROM flightcommands ORDER BY SEQ")
+    rows = db_cursor.fetchall()
+    if rows:
+        # only the ones we read, anything pushed since then stays for next time
+        db_cursor.execute("DELETE FROM flightcommands WHERE SEQ <= %s", (rows[-1][0],))
+    return [tuple(row[1:]) for row in rows]
+
+def push_command_log(db, tick, commands):
+    """Records the commands the server applied on a tick, in the order it applied them"""
+    db.cursor().executemany("INSERT INTO commandlog(TICK, SEQ, COMMAND, TARGET, AMOUNT) VALUES(%s, %s, %s, %s, %s)",
+                            [(tick, seq) + (tuple(comm) + (None,) * 3)[:3] for seq, comm in enumerate(commands)])
+
+def get_command_log(db, since_tick):
+    """Returns a {tick: [commands]} dict of every command applied on or after since_tick"""
+    db_cursor = db.cursor()
+    db_cursor.execute("SELECT TICK, COMMAND, TARGET, AMOUNT FROM commandlog WHERE TICK >= %s ORDER BY TICK, SEQ",
+                      (since_tick,))
+    log = {}
+    for tick, command, target, amount in db_cursor.fetchall():
+        log.setdefault(tick, []).append((command, target, amount))
+    return log
+
+def push_state_hash(db, tick, state_hash):
+    db.cursor().execute("INSERT INTO statehashes(TICK, HASH) VALUES(%s, %s)", (tick, state_hash))
+
+def get_latest_state_hash(db):
+    """:return: the most recent (TICK, HASH) pair the server published, or None"""
+    db_cursor = db.cursor()
+    db_cursor.execute("SELECT TICK, HASH FROM statehashes ORDER BY TICK DESC LIMIT 1")
+    return db_cursor.fetchone()
+
+def push_acknowledgement(db, pilot, seq, tick_time):
+    db.cursor().execute("REPLACE INTO acknowledgements(PILOT, SEQ, TICKTIME) VALUES(%s, %s, %s)",
+                        (pilot, seq, tick_time))
+
+def get_acknowledgement(db, pilot):
+    """:return: (SEQ, TICKTIME) for the pilot, or None"""
+    db_cursor = db.cursor()
+    db_cursor.execute("SELECT SEQ, TICKTIME FROM acknowledgements WHERE PILOT = %s", (pilot,))
+    return db_cursor.fetchone()
+
+def push_telemetry(db, rows):
+    """Replaces the published telemetry with a list of (CRAFT, REFERENCE, CHANNEL, VALUE) rows"""
+    db_cursor = db.cursor()
+    db_cursor.execute("DELETE FROM telemetry")
+    db_cursor.executemany("INSERT INTO telemetry(SEQ, CRAFT, REFERENCE, CHANNEL, VALUE) VALUES(%s, %s, %s, %s, %s)",
+                          [(seq,) + tuple(row) for seq, row in enumerate(rows)])
+
+def get_telemetry(db):
+    """:return: a list of (CRAFT, REFERENCE, CHANNEL, VALUE) rows, in the order they were pushed"""
+    db_cursor = db.cursor()
+    db_cursor.execute("SELECT CRAFT, REFERENCE, CHANNEL, VALUE FROM telemetry ORDER BY SEQ")
+    return list(db_cursor.fetchall())
+
+def push_particles(db, particles):
+    """Replaces the published particles with the current ones, see corbit.particles.Particles"""
+    count = len(particles)
+    blobs = (count, particles.positions[:count].tobytes(), particles.colors[:count].tobytes())
+    db_cursor = db.cursor()
+    db_cursor.execute("UPDATE particles SET GENERATION = GENERATION + 1, COUNT = %s, POSITIONS = %s, COLORS = %s",
+                      blobs)
+    if db_cursor.rowcount == 0:
+        db_cursor.execute("INSERT INTO particles(GENERATION, COUNT, POSITIONS, COLORS) VALUES(1, %s, %s, %s)", blobs)
+
+def get_particles_generation(db):
+    """:return: a number that changes every time particles are pushed, or None if they never have been"""
+    db_cursor = db.cursor()
+    db_cursor.execute("SELECT GENERATION FROM particles")
+    row = db_cursor.fetchone()
+    return None if row is None else row[0]
+
+def get_particles(db):
+    """:return: (positions, colors), a (P, 2) float array in m and a (P, 3) uint8 array. Both empty if there are none"""
+    db_cursor = db.cursor()
+    db_cursor.execute("SELECT COUNT, POSITIONS, COLORS FROM particles")
+    row = db_cursor.fetchone()
+    if row is None:
+        return numpy.zeros((0, 2)), numpy.zeros((0, 3), dtype=numpy.uint8)
+    count, positions, colors = row
+    return (numpy.frombuffer(positions, dtype=float).reshape(count, 2),
+            numpy.frombuffer(colors, dtype=numpy.uint8).reshape(count, 3))
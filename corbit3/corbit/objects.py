@@ -1,8 +1,8 @@
 import math
 import json
 
-import scipy
-from scipy import linalg as LA
+import numpy
+from numpy import linalg as LA
 
 from unum.units import rad, m, s, kg, N
 
@@ -10,6 +10,7 @@ from unum.units import rad, m, s, kg, N
 center = "Habitat"
 control = "Habitat"
 reference = "Earth"
+target = "AYSE"
 
 class Camera:
     """Used to store the zoom level and position of the display's camera. Change this to change the viewpoint"""
@@ -21,9 +22,9 @@ class Camera:
         else:
             self.locked = True
 
-        self.displacement = m * scipy.array([0, 0])
-        self.velocity = m / s * scipy.array([0, 0])
-        self.acceleration = m / s / s * scipy.array([0, 0])
+        self.displacement = m * numpy.array([0, 0])
+        self.velocity = m / s * numpy.array([0, 0])
+        self.acceleration = m / s / s * numpy.array([0, 0])
 
         self.zoom_level = zoom_level
 
@@ -78,17 +79,17 @@ class Entity:
         assert displacement.__len__() == 2, displacement.__str__() + " is not 2D"
         assert isinstance(displacement[0], (int, float)), displacement.__str__() + "'s x is not a float"
         assert isinstance(displacement[1], (int, float)), displacement.__str__() + "'s y is not a float"
-        self.displacement = m * scipy.array(displacement)
+        self.displacement = m * numpy.array(displacement)
         assert isinstance(velocity, list), velocity.__str__() + " is not a vector"
         assert velocity.__len__() == 2, velocity.__str__() + " is not 2D"
         assert isinstance(velocity[0], (int, float)), velocity.__str__() + "'s x is not a float"
         assert isinstance(velocity[1], (int, float)), velocity.__str__() + "'s y is not a float"
-        self.velocity = m/s * scipy.array(velocity)
+        self.velocity = m/s * numpy.array(velocity)
         assert isinstance(acceleration, list), acceleration.__str__() + " is not a vector"
         assert acceleration.__len__() == 2, acceleration.__str__() + " is not 2D"
         assert isinstance(acceleration[0], (int, float)), acceleration.__str__() + "'s x is not a float"
         assert isinstance(acceleration[1], (int, float)), acceleration.__str__() + "'s y is not a float"
-        self.acceleration = m/s/s * scipy.array(acceleration)
+        self.acceleration = m/s/s * numpy.array(acceleration)
 
         assert isinstance(angular_position, (int, float)), angular_position.__str__() + " is not a float"
         self.angular_position = angular_position * rad
@@ -140,7 +141,7 @@ class Entity:
         # T is torque in J/rad
         # I is moment of inertia in kg*m^2
         # angle -= self.angular_position
-        T = N * scipy.linalg.norm(force.asNumber()) \
+        T = N * LA.norm(force.asNumber()) \
             * self.radius * math.sin(angle - F_theta)
         self.angular_acceleration += T / self.moment_of_inertia()
         #if T != N*m * 0:
@@ -152,7 +153,7 @@ class Entity:
         """
 
         self.velocity += self.acceleration * time
-        self.acceleration = m / s / s * scipy.array((0, 0))
+        self.acceleration = m / s / s * numpy.array((0, 0))
         self.displacement += self.velocity * time
 
         self.angular_speed += self.angular_acceleration * time
@@ -193,7 +194,7 @@ class EngineSystem:
         self.engine_placements = engine_placements
         # where 'angle' is where on the entity's surface the engine is placed and
         # 'vector' is in which the engine has its thrust vector
-        # for example, [(3.1415, scipy.array((1, 0))] is a single engine, on the bottom, that fires away
+        # for example, [(3.1415, numpy.array((1, 0))] is a single engine, on the bottom, that fires away
         #           __
         #         /    \
         #    <<<<|      |     pchooo the rocket is going off to the right -> -> -> ->
@@ -262,7 +263,7 @@ class Habitat(Entity):
 
         #         thrust = self.main_engines.thrust(time)
         #         thrust_vector = \
-        #             N * scipy.array((math.cos(self.angular_position) * thrust.asNumber(N),
+        #             N * numpy.array((math.cos(self.angular_position) * thrust.asNumber(N),
         #                              math.sin(self.angular_position) * thrust.asNumber(N)))
         #         for angle in self.main_engines.engine_positions:
         #             self.accelerate(
@@ -285,10 +286,10 @@ def oneshot_vernier_thrusters(entity, amount, time):
     :param time: time over which to thrust
     """
     for angle in entity.rcs.engine_positions:
-        print(amount * entity.rcs.thrust(time) * scipy.array(
+        print(amount * entity.rcs.thrust(time) * numpy.array(
             (-math.sin(entity.angular_position + angle), math.cos(entity.angular_position + angle)))
               / len(entity.rcs.engine_positions), angle + entity.angular_position)
-        entity.accelerate(amount * entity.rcs.thrust(time) * scipy.array(
+        entity.accelerate(amount * entity.rcs.thrust(time) * numpy.array(
             (-math.sin(entity.angular_position + angle), math.cos(entity.angular_position + angle)))
                           / len(entity.rcs.engine_positions), angle + entity.angular_position)
 
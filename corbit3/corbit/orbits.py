@@ -0,0 +1,116 @@
+import numpy
+
+from corbit.batch import G
+
+# The orbital functions from corbit.physics, on plain arrays instead of pairs of Entity objects, so a whole table of
+# them takes one pass instead of one call (and a pile of unit conversions) per pair. Same names, same maths, and A and
+# B mean the same thing: A is the body, B is what it's orbiting.
+#
+# Every argument just has to broadcast against the others, so the same functions do:
+#  - one reference against every body: altitude(world.positions, world.positions[i], world.radii, world.radii[i])
+#  - every pair of bodies: use pairs() on each argument first, [a, b] of the results is body a around body b
+#  - recorded frames: the (samples, N, 2) arrays from corbit.batch.propagate, with positions[:, i, numpy.newaxis]
+#    for the reference
+# Vectors are (..., 2) arrays, everything else is (...). Positions are in m, velocities in m/s, masses in kg.
+# A body against itself (the diagonal of pairs()) comes out as nan or inf, and numpy isn't allowed to warn about it.
+
+
+def pairs(array):
+    """:return: (array for A, array for B), shaped so anything worked out from them has [a, b] as body a around body b
+    :param array: (N,) or (N, 2) array, one row per body, e.g. world.masses or world.positions
+    """
+    array = numpy.asarray(array, dtype=float)
+    if array.ndim == 1:
+        return array[:, numpy.newaxis], array[numpy.newaxis, :]
+    return array[:, numpy.newaxis, :], array[numpy.newaxis, :, :]
+
+
+def magnitude(vect):
+    # the same as numpy.linalg.norm(vect, axis=-1), without the overhead
+    return numpy.sqrt((vect * vect).sum(axis=-1))
+
+
+def distance(positions_A, positions_B):
+    return magnitude(positions_A - positions_B)
+
+
+def speed(velocities_A, velocities_B):
+    return magnitude(velocities_A - velocities_B)
+
+
+def altitude(positions_A, positions_B, radii_A, radii_B):
+    return distance(positions_A, positions_B) - radii_A - radii_B
+
+
+def gravity_from(positions_A, positions_B, masses_B):
+    """The acceleration of A from B's gravity, which is corbit.physics.gravitational_force(A, B) / A's mass
+    :return: (..., 2) array, in m/s/s
+    """
+    dist = positions_B - positions_A
+    distance_sq = (dist * dist).sum(axis=-1)
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        strength = G * masses_B / (distance_sq * numpy.sqrt(distance_sq))
+    return dist * strength[..., numpy.newaxis]
+
+
+def Vcen(positions_A, positions_B, velocities_A, velocities_B):
+    dist = positions_A - positions_B
+    # the math here: (unit normal vector) * (velocity)
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        return (dist * (velocities_A - velocities_B)).sum(axis=-1) / magnitude(dist)
+
+
+def Vtan(positions_A, positions_B, velocities_A, velocities_B):
+    dist = positions_A - positions_B
+    velocity = velocities_A - velocities_B
+    # same as Vcen, with the normal turned 90 degrees anticlockwise
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        return (dist[..., 0] * velocity[..., 1] - dist[..., 1] * velocity[..., 0]) / magnitude(dist)
+
+
+def Vorbit(positions_A, positions_B, masses_A, masses_B):
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        return numpy.sqrt(masses_B ** 2 * G / ((masses_A + masses_B) * distance(positions_A, positions_B)))
+
+
+def semimajor_axis(positions_A, positions_B, velocities_A, velocities_B, masses_A, masses_B):
+    mu = G * (masses_A + masses_B)    # G(m + M)
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        E = speed(velocities_A, velocities_B) ** 2 / 2 - mu / distance(positions_A, positions_B)
+        return -mu / 2 / E  # -mu/2E
+
+
+def ecc(positions_A, positions_B, velocities_A, velocities_B, masses_A, masses_B):
+    return _ecc(positions_A, positions_B, velocities_A, velocities_B, masses_A, masses_B,
+                semimajor_axis(positions_A, positions_B, velocities_A, velocities_B, masses_A, masses_B))
+
+
+def _ecc(positions_A, positions_B, velocities_A, velocities_B, masses_A, masses_B, a):
+    # ecc() once the semimajor axis is known, so periapsis() and apoapsis() don't work it out twice
+    mu = G * (masses_A + masses_B)    # G(m + M)
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        E = -mu / 2 / a  # -mu/2a
+        h = distance(positions_A, positions_B) * Vtan(positions_A, positions_B, velocities_A, velocities_B)
+        # rounding can take a circular orbit's 1 + ... a hair below 0
+        return numpy.sqrt(numpy.maximum(1 + (2 * E * h ** 2) / mu ** 2, 0))
+
+
+def apsides(positions_A, positions_B, velocities_A, velocities_B, masses_A, masses_B, radii_A, radii_B):
+    """Periapsis and apoapsis together, which is cheaper than one after the other
+    :return: (periapsis, apoapsis), in m. Either one is 0 if it's inside the bodies, like in corbit.physics
+    """
+    a = semimajor_axis(positions_A, positions_B, velocities_A, velocities_B, masses_A, masses_B)
+    e = _ecc(positions_A, positions_B, velocities_A, velocities_B, masses_A, masses_B, a)
+    touching = radii_A + radii_B
+    with numpy.errstate(invalid="ignore"):
+        peri = (1 - e) * a
+        apo = (1 + e) * a
+        return numpy.where(peri <= touching, 0.0, peri), numpy.where(apo <= touching, 0.0, apo)
+
+
+def periapsis(positions_A, positions_B, velocities_A, velocities_B, masses_A, masses_B, radii_A, radii_B):
+    return apsides(positions_A, positions_B, velocities_A, velocities_B, masses_A, masses_B, radii_A, radii_B)[0]
+
+
+def apoapsis(positions_A, positions_B, velocities_A, velocities_B, masses_A, masses_B, radii_A, radii_B):
+    return apsides(positions_A, positions_B, velocities_A, velocities_B, masses_A, masses_B, radii_A, radii_B)[1]
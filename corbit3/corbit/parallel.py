@@ -0,0 +1,139 @@
+import multiprocessing
+import os
+from multiprocessing import shared_memory
+
+import numpy
+from unum.units import m, kg
+
+import corbit.batch
+
+# Gravity for worlds with thousands of bodies, spread over several processes. The positions, masses and accelerations
+# live in shared memory that every worker has mapped, so each tick the only thing sent to a worker is which rows to
+# work on, and the only thing sent back is that it's done. Each worker works out the whole acceleration of its own
+# rows (every body's pull on them), so the partial results just sit side by side in the shared accelerations array,
+# and putting them together is free.
+# This only pays off past a couple thousand bodies: below that, waking the workers up takes longer than the sum.
+# The server uses it when PARALLEL_GRAVITY is set, see entity_gravity().
+
+
+def worker(names, capacity, connection):
+    """What every worker process runs: waits for (count, start, end) jobs, and fills in rows start to end of the
+    accelerations of the first count bodies. None means stop
+    """
+    blocks = [shared_memory.SharedMemory(name=name) for name in names]
+    positions = numpy.ndarray((capacity, 2), buffer=blocks[0].buf)
+    masses = numpy.ndarray((capacity,), buffer=blocks[1].buf)
+    accelerations = numpy.ndarray((capacity, 2), buffer=blocks[2].buf)
+    try:
+        while True:
+            job = connection.recv()
+            if job is None:
+                break
+            count, start, end = job
+            accelerations[start:end] = corbit.batch.gravity_on(positions[start:end], positions[:count],
+                                                               masses[:count], offset=start)
+            connection.send(True)
+    finally:
+        del positions, masses, accelerations  # the blocks can't be closed while anything still points into them
+        for block in blocks:
+            block.close()
+
+
+class ParallelGravity:
+    """A pool of worker processes that work out gravity together.
+    Either call gravity() like corbit.batch.gravity(), or, to skip copying the world into shared memory every time,
+    write straight into positions and masses and call compute(). Call close() when done, or use it in a with block
+    """
+
+    def __init__(self, capacity, workers=None):
+        """
+        :param capacity: the most bodies it will ever be asked about
+        :param workers: how many worker processes to use, None for one per CPU
+        """
+        self.capacity = capacity
+        self.workers = workers or os.cpu_count() or 1
+        self.blocks = []
+        self.connections = []
+        self.processes = []
+        try:
+            for size in (capacity * 2, capacity, capacity * 2):
+                self.blocks.append(shared_memory.SharedMemory(create=True, size=max(1, size * 8)))
+            self.positions = numpy.ndarray((capacity, 2), buffer=self.blocks[0].buf)
+            self.masses = numpy.ndarray((capacity,), buffer=self.blocks[1].buf)
+            self.accelerations = numpy.ndarray((capacity, 2), buffer=self.blocks[2].buf)
+
+            for _ in range(self.workers):
+                ours, theirs = multiprocessing.Pipe()
+                process = multiprocessing.Process(target=worker,
+                                                  args=([block.name for block in self.blocks], capacity, theirs))
+                process.daemon = True
+                process.start()
+                self.connections.append(ours)
+                self.processes.append(process)
+        except:
+            # don't leave shared memory or workers lying around
+            self.close()
+            raise
+
+    def compute(self, count):
+        """Works out the accelerations of the first count bodies in positions and masses
+        :return: a view of the first count rows of accelerations, which gets overwritten by the next call
+        """
+        bounds = numpy.linspace(0, count, self.workers + 1).astype(int)
+        for connection, start, end in zip(self.connections, bounds[:-1], bounds[1:]):
+            connection.send((count, int(start), int(end)))
+        for connection in self.connections:
+            connection.recv()
+        return self.accelerations[:count]
+
+    def gravity(self, positions, masses):
+        """The same as corbit.batch.gravity(), for a single (N, 2) world, but spread over the workers"""
+        count = len(positions)
+        if count > self.capacity:
+            raise ValueError("%d bodies is more than this was made for (%d)" % (count, self.capacity))
+        self.positions[:count] = positions
+        self.masses[:count] = masses
+        return self.compute(count).copy()
+
+    def close(self):
+        """Stops the workers and frees the shared memory. Safe to call more than once"""
+        for connection in self.connections:
+            try:
+                connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass  # that worker's already gone
+        for process in self.processes:
+            process.join(5)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        for connection in self.connections:
+            connection.close()
+        self.connections = []
+        self.processes = []
+        # the blocks can't be closed while anything still points into them
+        self.positions = self.masses = self.accelerations = None
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def entity_gravity(pool, entities):
+    """Every entity's gravitational acceleration from every other entity, worked out by a ParallelGravity. The same
+    as what the server adds up pair by pair with corbit.physics.gravitational_force()
+    :return: (N, 2) array of accelerations in m/s/s, in the same order as entities
+    """
+    count = len(entities)
+    if count > pool.capacity:
+        raise ValueError("%d entities is more than this was made for (%d)" % (count, pool.capacity))
+    for i, entity in enumerate(entities):
+        pool.positions[i] = entity.displacement.asNumber(m)
+        pool.masses[i] = entity.mass_fun().asNumber(kg)
+    return pool.compute(count).copy()
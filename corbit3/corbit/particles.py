@@ -0,0 +1,134 @@
+import math
+
+import numpy
+
+import corbit.batch
+from unum.units import m, s, kg
+
+# Massless test particles: debris, ring particles, engine exhaust. They feel gravity from the massive bodies, but
+# don't pull on anything themselves, so they never go through the O(N^2) entity loop. Instead they live in their own
+# arrays and are all moved at once, which only costs O(particles * massive bodies). That means there can be tens of
+# thousands of them without the server slowing down.
+# Positions are in m, velocities in m/s, times in s, just like corbit.batch.
+
+
+class Particles:
+    """Every particle in the world, as one row each of some contiguous arrays.
+    The arrays are bigger than they need to be so adding particles usually doesn't copy anything; only the first
+    count rows are particles
+    """
+
+    def __init__(self, capacity=1024):
+        self.count = 0
+        self.positions = numpy.zeros((capacity, 2))
+        self.velocities = numpy.zeros((capacity, 2))
+        self.colors = numpy.zeros((capacity, 3), dtype=numpy.uint8)
+        self.lifetimes = numpy.zeros(capacity)  # s left until the particle disappears, inf for particles that stay
+
+    def __len__(self):
+        return self.count
+
+    def reserve(self, capacity):
+        """Makes the arrays big enough for at least capacity particles"""
+        if capacity <= len(self.positions):
+            return
+        capacity = max(capacity, 2 * len(self.positions))
+        for name in ("positions", "velocities", "colors", "lifetimes"):
+            old = getattr(self, name)
+            new = numpy.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def add(self, positions, velocities, color, lifetime=math.inf):
+        """Adds a bunch of particles
+        :param positions: (P, 2) array of positions
+        :param velocities: (P, 2) array of velocities
+        :param color: (r, g, b) for all of them, or a (P, 3) array of colors
+        :param lifetime: s until they disappear, for all of them or as a (P,) array
+        """
+        positions = numpy.asarray(positions, dtype=float).reshape(-1, 2)
+        start = self.count
+        end = start + len(positions)
+        self.reserve(end)
+        self.positions[start:end] = positions
+        self.velocities[start:end] = velocities
+        self.colors[start:end] = color
+        self.lifetimes[start:end] = lifetime
+        self.count = end
+
+    def keep(self, mask):
+        """Throws away every particle that mask is False for, keeping the rest packed at the start of the arrays"""
+        kept = numpy.flatnonzero(mask)
+        for array in (self.positions, self.velocities, self.colors, self.lifetimes):
+            array[:len(kept)] = array[kept]
+        self.count = len(kept)
+
+    def step(self, positions, masses, radii, time):
+        """Moves every particle forwards one tick, the same way the server moves entities (velocity first, then
+        position), using where the massive bodies are at the start of the tick.
+        Particles that end up inside a massive body or run out of lifetime are removed
+        :param positions: (N, 2) array of positions of the massive bodies, see corbit.batch.World
+        :param masses: (N,) array of their masses
+        :param radii: (N,) array of their radii
+        :param time: length of the tick, in s
+        """
+        if not self.count:
+            return
+        points = self.positions[:self.count]
+        velocities = self.velocities[:self.count]
+        velocities += corbit.batch.gravity_on(points, positions, masses) * time
+        points += velocities * time
+        self.lifetimes[:self.count] -= time
+
+        alive = self.lifetimes[:self.count] > 0
+        for position, radius in zip(positions, radii):
+            dx = points[:, 0] - position[0]
+            dy = points[:, 1] - position[1]
+            alive &= dx * dx + dy * dy > radius * radius
+        if not alive.all():
+            self.keep(alive)
+
+    def step_with(self, entities, time):
+        """step(), but taking the massive bodies straight from a list of entities and a time with units"""
+        world = corbit.batch.World.from_entities(entities)
+        self.step(world.positions, world.masses, world.radii, time.asNumber(s))
+
+
+def ring(parent, inner, outer, count, color, seed=None):
+    """Makes particles in circular orbits around a body, spread evenly over the area between two radii
+    :param parent: the entity the ring goes around
+    :param inner: inner radius of the ring, in m
+    :param outer: outer radius of the ring, in m
+    :param count: how many particles
+    :param color: (r, g, b)
+    :return: (positions, velocities, color), ready to be passed to Particles.add()
+    """
+    random = numpy.random.RandomState(seed)
+    radius = numpy.sqrt(random.uniform(inner ** 2, outer ** 2, count))
+    theta = random.uniform(0, 2 * math.pi, count)
+    speed = numpy.sqrt(corbit.batch.G * parent.mass_fun().asNumber(kg) / radius)
+    direction = numpy.column_stack((numpy.cos(theta), numpy.sin(theta)))
+    positions = parent.displacement.asNumber(m) + radius[:, numpy.newaxis] * direction
+    # counterclockwise, perpendicular to the direction from the parent
+    velocities = parent.velocity.asNumber(m/s) + \
+        speed[:, numpy.newaxis] * numpy.column_stack((-direction[:, 1], direction[:, 0]))
+    return positions, velocities, color
+
+
+def spray(source, direction, speed, spread, count, color, seed=None):
+    """Makes particles shooting out of an entity, like exhaust or debris
+    :param source: the entity they come out of
+    :param direction: angle they're mostly going in, in rad
+    :param speed: how fast they're going relative to the source, in m/s
+    :param spread: how far off direction they can go, in rad either way
+    :param count: how many particles
+    :param color: (r, g, b)
+    :return: (positions, velocities, color), ready to be passed to Particles.add()
+    """
+    random = numpy.random.RandomState(seed)
+    theta = direction + random.uniform(-spread, spread, count)
+    heading = numpy.column_stack((numpy.cos(theta), numpy.sin(theta)))
+    # start them at the source's surface, or they'd get removed for being inside it right away
+    positions = source.displacement.asNumber(m) + source.radius.asNumber(m) * heading
+    velocities = source.velocity.asNumber(m/s) + speed * heading
+    return positions, velocities, color
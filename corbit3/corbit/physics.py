@@ -1,13 +1,14 @@
-from unum.units import m, s, N, kg
-import copy
-import scipy
-import scipy.linalg
+from unum.units import m, s, N, kg, rad
+import heapq
+import itertools
+import numpy
+import numpy.linalg
 import math
 G = 6.673*10**-11 * N * (m/kg)**2
 
 def magnitude(vect, unit):
-    # shorthand to work around scipy not working with units
-    return unit * scipy.linalg.norm(vect.asNumber(unit))
+    # shorthand to work around numpy not working with units
+    return unit * numpy.linalg.norm(vect.asNumber(unit))
 
 def distance(A, B):
     return magnitude(A.displacement - B.displacement, m)
@@ -23,20 +24,20 @@ def angle(A, B):
                  (B.displacement[0] - A.displacement[0]).asNumber())
 
 def gravitational_force(A, B):
-    unit_distance = scipy.array([math.cos(angle(A, B)), math.sin(angle(A, B))])
+    unit_distance = numpy.array([math.cos(angle(A, B)), math.sin(angle(A, B))])
     return G * A.mass_fun() * B.mass_fun() / distance(A, B)**2 * unit_distance
 
 def Vcen(A, B):
     dist = A.displacement - B.displacement
     # the math here: (unit normal vector) * (velocity)
-    return scipy.dot(dist/magnitude(dist, m), A.velocity - B.velocity)
+    return numpy.dot(dist/magnitude(dist, m), A.velocity - B.velocity)
 
 def Vtan(A, B):
     dist = A.displacement - B.displacement
     # the math here is similar to Vcen
     dist = dist.asNumber(m)
-    dist_tan = scipy.array((-dist[1], dist[0]))
-    return m/s * scipy.dot(dist_tan/scipy.linalg.norm(dist_tan), (A.velocity - B.velocity).asNumber(m/s))
+    dist_tan = numpy.array((-dist[1], dist[0]))
+    return m/s * numpy.dot(dist_tan/numpy.linalg.norm(dist_tan), (A.velocity - B.velocity).asNumber(m/s))
 
 def Vorbit(A, B):
     return m/s * math.sqrt(((B.mass_fun()**2 * G) / ((A.mass_fun() + B.mass_fun()) * distance(A, B))).asNumber(m**2/s/s))
@@ -70,102 +71,128 @@ def apoapsis(A, B):
 def stopping_acc(A, B):
     return 200 #TODO
 
-def resolve_collision(A, B, time):
-    """Detects and acts upon any collisions in the specified time interval between two entities
-    :param A: First entity
-    :param B: Second entity
-    :param time: time interval over which to check if any collisions occur
-    :return: None if no collision will occur in the timeframe, the two collided entities if there is a collision
+def time_to_impact(displacement, velocity, radius_sum):
+    """Finds when two bodies moving in straight lines will touch
+    :param displacement: A's position minus B's, as a plain array in m
+    :param velocity: A's velocity minus B's, as a plain array in m/s
+    :param radius_sum: A's radius plus B's, in m
+    :return: time until impact in s, or None if they never will (or they're moving apart)
     """
-    # general overview of this function:
-    # 1. find if the objects will collide in the given time
-    # 2. if yes, calculate collision:
-    # 2.1 represent velocities as normal velocity and tangential velocity
-    # 2.2 do a 1D collision using the normal veloctiy
-    # 2.3 add the normal and tangential velocities to get the new velocity
-
-    scipy.seterr(divide="raise", invalid="raise")
-
-    # for this function I make one of the objects the frame of reference
-    # which means my calculations are much simplified
-    displacement = A.displacement - B.displacement
-    velocity = A.velocity - B.velocity
-    acceleration = A.acceleration - B.acceleration
-    radius_sum = A.radius + B.radius
-
     # this code finds when the the two entities will collide. See
     # http://www.gvu.gatech.edu/people/official/jarek/graphics/material/collisionsDeshpandeKharsikarPrabhu.pdf
     # for how I got the algorithm
-    a = magnitude(velocity, m/s)**2
-    b = m**2/s * 2*scipy.dot(displacement.asNumber(m), velocity.asNumber(m/s))
-    c = magnitude(displacement, m)**2 - radius_sum**2
-
-    try:
-        t_to_impact = \
-            (-b - m**2/s * math.sqrt((b**2 - 4*a*c).asNumber(m**4/s**2))) / (2 * a)
-    except:
-        return
-
-    if not scipy.isfinite(t_to_impact.asNumber(s)):
-        return
+    a = numpy.dot(velocity, velocity)
+    b = 2 * numpy.dot(displacement, velocity)
+    c = numpy.dot(displacement, displacement) - radius_sum ** 2
+    discriminant = b ** 2 - 4 * a * c
 
-    if t_to_impact > time or t_to_impact < 0 * s:
-        return
+    if a == 0 or discriminant < 0 or b >= 0:
+        # not moving relative to each other, never get close enough, or moving apart
+        return None
+    return (-b - math.sqrt(discriminant)) / (2 * a)
 
-    # at this point, we know there is a collision
-    print("Collision:", A.name, "and", B.name, "in", t_to_impact)
 
-    # for this section, basically turn the vectors into normal velocity and tangential velocity,
+def bounce(A, B):
+    """Changes the velocities of two touching entities as if they'd just hit each other"""
+    # basically turn the velocities into normal velocity and tangential velocity,
     # then do a 1D collision calculation, using the normal velocities
     # since a ' (prime symbol) wouldn't work, I've replaced it with a _ in variable names
+    n = (A.displacement - B.displacement).asNumber(m)  # normal vector
+    un = n / numpy.linalg.norm(n)  # normal unit vector
+    unt = numpy.array((-un[1], un[0]))  # ofc the tangent is orthogonal to the normal
 
-    n = displacement  # normal vector
-    un = n / magnitude(n, m)  # normal unit vector
-    unt = copy.deepcopy(un)  # normal tangent vector
-    unt[0], unt[1] = -unt[1], unt[0]    # ofc the tangent is orthogonal to the normal
+    vA = A.velocity.asNumber(m/s)
+    vB = B.velocity.asNumber(m/s)
+    mA = A.mass_fun().asNumber(kg)
+    mB = B.mass_fun().asNumber(kg)
 
-    # A's centripetal velocity
-    vAn = m / s * scipy.dot(un.asNumber(), A.velocity.asNumber(m / s))
-    # A's tangential velocity
-    vAt = m / s * scipy.dot(unt.asNumber(), A.velocity.asNumber(m / s))
+    # centripetal and tangential velocities
+    vAn, vAt = numpy.dot(un, vA), numpy.dot(unt, vA)
+    vBn, vBt = numpy.dot(un, vB), numpy.dot(unt, vB)
 
-    # B's centripetal velocity
-    vBn = m / s * scipy.dot(un.asNumber(), B.velocity.asNumber(m / s))
-    # B's tangential velocity
-    vBt = m / s * scipy.dot(unt.asNumber(), B.velocity.asNumber(m / s))
-
-    # tangent velocities are unchanged, nothing happens to them
-    vAt_ = vAt
-    vBt_ = vBt
-
-    # centripetal velocities are calculated with a simple 1D collision formula
+    # tangent velocities are unchanged, nothing happens to them.
+    # centripetal velocities are calculated with a simple 1D collision formula, R is the coefficient of restitution
     R = 0.1
-
-    vAn_ = \
-        (A.mass_fun() * vAn + B.mass_fun() * vBn + R * B.mass_fun() * (B.velocity - A.velocity)) / \
-        (A.mass_fun() + B.mass_fun())
-
-    vBn_ = \
-        (A.mass_fun() * vAn + B.mass_fun() * vBn + R * A.mass_fun() * (A.velocity - B.velocity)) / \
-        (A.mass_fun() + B.mass_fun())
-
-    # convert scalar normal and tangent velocities to vector quantities
-    VAn = vAn_ * un
-    VAt = vAt_ * unt
-
-    VBn = vBn_ * un
-    VBt = vBt_ * unt
-
-    # move until the point of impact
-    A.move(t_to_impact)
-    B.move(t_to_impact)
+    vAn_ = (mA * vAn + mB * vBn + R * mB * (vBn - vAn)) / (mA + mB)
+    vBn_ = (mA * vAn + mB * vBn + R * mA * (vAn - vBn)) / (mA + mB)
 
     # add em up to get v'
-    A.velocity = VAn + VAt
-    B.velocity = VBn + VBt
+    A.velocity = m/s * (vAn_ * un + vAt * unt)
+    B.velocity = m/s * (vBn_ * un + vBt * unt)
+
+
+def resolve_collisions(entities, time):
+    """Moves every entity through a tick, bouncing them off each other on the way
+    Collisions are handled one at a time, soonest first, with every entity moved up to the exact moment of each
+    collision. After a collision only the predictions involving the two entities that bounced are redone, so a
+    body can be in several collisions in the same tick, in the right order, without ever being moved twice
+    :param entities: list of entities, their accelerations for this tick already worked out
+    :param time: the dt of the tick
+    :return: list of names of the entities that collided
+    """
+    dt = time.asNumber(s)
+
+    # apply this tick's acceleration up front, so that bodies move in straight lines for the rest of the tick,
+    # which is what makes the predicted times of impact exact. This is what move() would have done anyways.
+    # The angular acceleration too, or a body that collides would only get it up to the moment of impact, since
+    # move() uses it up the first time it's called
+    for entity in entities:
+        entity.velocity += entity.acceleration * time
+        entity.acceleration = m / s / s * numpy.array((0, 0))
+        entity.angular_speed += entity.angular_acceleration * time
+        entity.angular_acceleration = 0 * rad / s / s
+
+    clock = [0.0] * len(entities)       # how far into the tick each entity has been moved
+    version = [0] * len(entities)       # bumped on every bounce, so old predictions can be told apart
+    queue = []                          # (time of impact, i, j, version of i, version of j)
+
+    def state(i, at):
+        # position and velocity of entity i at a given moment in the tick, as plain arrays
+        velocity = entities[i].velocity.asNumber(m/s)
+        return entities[i].displacement.asNumber(m) + velocity * (at - clock[i]), velocity
+
+    def predict(i, j, now):
+        displacement_i, velocity_i = state(i, now)
+        displacement_j, velocity_j = state(j, now)
+        impact = time_to_impact(displacement_i - displacement_j, velocity_i - velocity_j,
+                                (entities[i].radius + entities[j].radius).asNumber(m))
+        if impact is None:
+            return
+        # bodies that already overlap and are still closing in get a negative root, and rounding does the same to
+        # bodies that only just touched something else. Bounce those right away, never back in time
+        impact = now + max(impact, 0.0)
+        if impact <= dt:
+            heapq.heappush(queue, (impact, i, j, version[i], version[j]))
+
+    for i, j in itertools.combinations(range(len(entities)), 2):
+        predict(i, j, 0.0)
+
+    collided = []
+    while queue:
+        impact, i, j, version_i, version_j = heapq.heappop(queue)
+        if version_i != version[i] or version_j != version[j]:
+            continue  # one of them already bounced off something else, this prediction is no good anymore
+
+        A, B = entities[i], entities[j]
+        print("Collision:", A.name, "and", B.name, "in", impact * s)
+
+        # move until the point of impact
+        for k in (i, j):
+            entities[k].move((impact - clock[k]) * s)
+            clock[k] = impact
+        bounce(A, B)
+        version[i] += 1
+        version[j] += 1
+        collided += [A.name, B.name]
+
+        # only predictions involving these two have changed
+        for k in range(len(entities)):
+            if k != i and k != j:
+                predict(min(i, k), max(i, k), impact)
+                predict(min(j, k), max(j, k), impact)
 
     # move for the rest of the frame
-    A.move(time - t_to_impact)
-    B.move(time - t_to_impact)
+    for k, entity in enumerate(entities):
+        entity.move((dt - clock[k]) * s)
 
-    return [A.name, B.name]
+    return collided
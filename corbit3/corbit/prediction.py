@@ -0,0 +1,202 @@
+import math
+import threading
+
+import numpy
+
+import corbit.batch
+import corbit.encounters
+from corbit.objects import Habitat
+from unum.units import kg
+
+# Predicting where the control craft is going, in a background thread so the pilot's frame rate doesn't suffer.
+# Predictions are made relative to the reference body, since that's what a pilot cares about, and because a path
+# relative to the Sun would just look like a smear at any useful zoom level.
+
+CONIC_POINTS = 256          # points in a predicted conic
+NUMERIC_STEPS = 2000        # steps taken when the path has to be integrated
+NUMERIC_POINTS = 250        # points kept from those steps
+PERTURBATION_LIMIT = 0.01   # if everything but the reference pulls on the craft less than this much compared to the
+                            # reference, the path is a conic
+DRIFT_LIMIT = 0.01          # recompute if the craft strays further than this fraction of its distance to the
+                            # reference from the predicted path
+USED_UP = 0.9               # recompute an open path once the craft is this far along it
+MAX_HORIZON = 365 * 24 * 3600.0  # s, never look further ahead than this
+ENCOUNTER_HORIZON = 24 * 3600.0  # s, how far ahead to look for encounters with targets
+
+
+def perturbation_ratio(world, craft, reference):
+    """How strongly everything other than the reference pulls the craft away from a two-body path around the
+    reference, compared to the reference's own pull. The Sun pulls on a habitat near Earth a lot harder than that,
+    but it pulls on Earth almost the same way, so it barely matters to the path relative to Earth
+    """
+    acceleration = corbit.batch.gravity(world.positions, world.masses)
+    delta = world.positions[reference] - world.positions[craft]
+    reference_pull = corbit.batch.G * world.masses[reference] * delta / numpy.linalg.norm(delta) ** 3
+    perturbation = (acceleration[craft] - reference_pull) - acceleration[reference]
+    return numpy.linalg.norm(perturbation) / numpy.linalg.norm(reference_pull)
+
+
+def conic(position, velocity, mu, points=CONIC_POINTS):
+    """Samples the two-body path of a craft around a reference body
+    :param position: position of the craft relative to the reference, in m
+    :param velocity: velocity of the craft relative to the reference, in m/s
+    :param mu: G * (M + m), in m^3/s^2
+    :return: (points, 2) array of positions relative to the reference. A whole ellipse for closed orbits, the part of
+    the hyperbola out to a few times the current distance for open ones
+    """
+    r = numpy.linalg.norm(position)
+    h = position[0] * velocity[1] - position[1] * velocity[0]  # specific angular momentum
+    eccentricity_vector = ((numpy.dot(velocity, velocity) - mu / r) * position
+                           - numpy.dot(position, velocity) * velocity) / mu
+    e = numpy.linalg.norm(eccentricity_vector)
+    p = h ** 2 / mu  # semi-latus rectum
+    argument_of_periapsis = math.atan2(eccentricity_vector[1], eccentricity_vector[0])
+
+    if e < 1:
+        nu = numpy.linspace(-math.pi, math.pi, points)
+    else:
+        # stop where the hyperbola gets far away, a few times further than we are now
+        max_r = 4 * r
+        nu_max = math.acos(max(-1.0, min(1.0, (p / max_r - 1) / e)))
+        nu = numpy.linspace(-nu_max, nu_max, points)
+
+    radius = p / (1 + e * numpy.cos(nu))
+    theta = argument_of_periapsis + math.copysign(1, h) * nu
+    return numpy.column_stack((radius * numpy.cos(theta), radius * numpy.sin(theta)))
+
+
+def numeric(world, craft, reference):
+    """Integrates the path of a craft through the whole world
+    :return: (points, 2) array of positions relative to the reference, at the same moments
+    """
+    position = world.positions[craft] - world.positions[reference]
+    velocity = world.velocities[craft] - world.velocities[reference]
+    mu = corbit.batch.G * (world.masses[craft] + world.masses[reference])
+    energy = numpy.dot(velocity, velocity) / 2 - mu / numpy.linalg.norm(position)
+    if energy < 0:
+        # look ahead one orbit of the osculating ellipse
+        horizon = 2 * math.pi * math.sqrt((-mu / 2 / energy) ** 3 / mu)
+    else:
+        horizon = 20 * numpy.linalg.norm(position) / numpy.linalg.norm(velocity)
+    horizon = min(horizon, MAX_HORIZON)
+
+    times, positions, velocities = corbit.batch.propagate(world.copy(), horizon, NUMERIC_STEPS,
+                                                          record_every=NUMERIC_STEPS // NUMERIC_POINTS)
+    return positions[:, craft] - positions[:, reference]
+
+
+def predict(world, craft, reference):
+    """Predicts the path of the craft relative to the reference, as a conic if the reference dominates, or by
+    integrating otherwise
+    :return: (path, closed). path is a (points, 2) array of positions relative to the reference, in m. closed is
+    True if the path is a whole orbit, and so can't run out
+    """
+    position = world.positions[craft] - world.positions[reference]
+    velocity = world.velocities[craft] - world.velocities[reference]
+    if perturbation_ratio(world, craft, reference) < PERTURBATION_LIMIT:
+        mu = corbit.batch.G * (world.masses[craft] + world.masses[reference])
+        closed = numpy.dot(velocity, velocity) / 2 - mu / numpy.linalg.norm(position) < 0
+        return conic(position, velocity, mu), closed
+    return numeric(world, craft, reference), False
+
+
+def distance_to_path(point, path):
+    """How far a point is from the closest segment of a polyline
+    :return: (distance, index of the closest segment)
+    """
+    start = path[:-1]
+    segment = path[1:] - start
+    length_sq = (segment ** 2).sum(axis=1)
+    length_sq[length_sq == 0] = 1
+    along = numpy.clip(((point - start) * segment).sum(axis=1) / length_sq, 0, 1)
+    closest = start + segment * along[:, numpy.newaxis]
+    distances = numpy.sqrt(((closest - point) ** 2).sum(axis=1))
+    closest_segment = int(distances.argmin())
+    return distances[closest_segment], closest_segment
+
+
+class OrbitPredictor(threading.Thread):
+    """Keeps a prediction of the control craft's path up to date in the background.
+    Call submit() with the newest entities whenever they come in, and read path and encounters whenever you draw.
+    Predictions are only recomputed when they stop being any good: when the craft, reference, targets, or fuel left
+    changes (so, thrust), or when the craft has drifted away from the predicted path
+    """
+
+    def __init__(self):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.snapshot = None        # the newest (World, fuel, craft name, reference name, target names) submitted
+        self.wakeup = threading.Event()
+        # the published prediction, replaced all at once so readers never see half of one:
+        # (craft name, reference name, (points, 2) array relative to the reference, closed) or None
+        self.path = None
+        # (craft name, target names, list of corbit.encounters.Encounter) or None, published the same way
+        self.encounters = None
+        self.fuel = None
+        # (craft name, reference name, target names, names in the world) the last time one of them wasn't there, so
+        # the same hopeless snapshot isn't tried again every time the pilot submits one
+        self.missing = None
+
+    def submit(self, entities, craft, reference, targets=(), world=None):
+        """Hands the newest entities to the predictor. Doesn't wait for anything.
+        Everything needed is copied out of the entities right away, so they can be changed afterwards, like the
+        pilot's corbit.entitycache.EntityCache does
+        :param targets: names of bodies to look for encounters with, see corbit.encounters
+        :param world: the entities as a corbit.batch.World, if you've already got one, to save making another
+        """
+        if world is None:
+            world = corbit.batch.World.from_entities(entities)
+        fuel = None
+        for entity in entities:
+            if entity.name == craft and type(entity) is Habitat:
+                fuel = (entity.engine_system.fuel.asNumber(kg), entity.rcs_system.fuel.asNumber(kg))
+        self.snapshot = (world, fuel, craft, reference, tuple(targets))
+        self.wakeup.set()
+
+    def run(self):
+        while True:
+            self.wakeup.wait()
+            self.wakeup.clear()
+            self.refresh()
+
+    def refresh(self):
+        """Brings the prediction up to date with the newest snapshot, which is what the thread does every time
+        submit() wakes it up"""
+        world, fuel, craft, reference, targets = self.snapshot
+        inputs = (craft, reference, targets, tuple(world.names))
+        if inputs == self.missing:
+            return  # still no prediction to be had
+        try:
+            self.update(world, fuel, craft, reference, targets)
+        except ValueError:
+            # the craft, reference or a target isn't in this snapshot, and won't be until the names change
+            self.path = None
+            self.encounters = None
+            self.missing = inputs
+        except (ZeroDivisionError, FloatingPointError):
+            # sitting right on top of another body, which can change with the next snapshot
+            self.path = None
+            self.encounters = None
+        else:
+            self.missing = None
+
+    def update(self, world, fuel, craft, reference, targets):
+        """:param fuel: (main, rcs) fuel the craft has left in kg, or None if it isn't a Habitat"""
+        craft_index = world.index(craft)
+        reference_index = world.index(reference)
+
+        if self.path is not None and self.path[:2] == (craft, reference) and self.fuel == fuel and \
+                self.encounters is not None and self.encounters[:2] == (craft, targets):
+            relative_position = world.positions[craft_index] - world.positions[reference_index]
+            drift, segment = distance_to_path(relative_position, self.path[2])
+            used_up = not self.path[3] and segment >= USED_UP * (len(self.path[2]) - 1)
+            if drift <= DRIFT_LIMIT * numpy.linalg.norm(relative_position) and not used_up:
+                return  # still good
+
+        self.fuel = fuel
+        self.path = (craft, reference) + predict(world, craft_index, reference_index)
+        # thrust is what makes encounters change, and this is only reached after thrust (or drifting), so this is
+        # as often as encounters need looking for
+        self.encounters = (craft, targets,
+                           corbit.encounters.find_encounters(world, craft, targets, ENCOUNTER_HORIZON)
+                           if targets else [])
@@ -0,0 +1,153 @@
+import math
+
+import numpy
+import pygame
+
+HORIZON_RATIO = 4       # bodies this many times bigger than the screen only get their horizon drawn
+HORIZON_POINTS = 64     # how many points are used to draw the visible part of a horizon
+PATH_LIMIT = 1e5        # pixels, paths are clamped to this far off screen so pygame doesn't overflow
+
+
+def draw_body(display, color, screen_position, screen_radius):
+    """Draws a body at a level of detail that suits how big it is on screen.
+    Bodies smaller than a pixel are a single pixel, bodies way bigger than the screen only get the part of them
+    that's on screen drawn, and everything in between is a circle
+    :param display: the surface to draw on
+    :param screen_position: (x, y) of the body's center, in pixels. Can be way off screen for big bodies
+    :param screen_radius: the body's radius, in pixels, not rounded
+    """
+    width, height = display.get_size()
+    half_diagonal = math.hypot(width, height) / 2
+
+    if screen_radius < 1:
+        display.set_at((int(screen_position[0]), int(screen_position[1])), color)
+    elif screen_radius > HORIZON_RATIO * half_diagonal:
+        draw_horizon(display, color, screen_position, screen_radius)
+    else:
+        pygame.draw.circle(display, color, (int(screen_position[0]), int(screen_position[1])), int(screen_radius))
+
+
+def draw_path(display, color, screen_positions, closed=False):
+    """Draws a polyline, like a predicted orbit
+    :param screen_positions: (N, 2) array of pixel positions, from corbit.view.world_to_screen
+    :param closed: True to join the last point back up with the first
+    """
+    if len(screen_positions) < 2:
+        return
+    clamped = numpy.clip(screen_positions, -PATH_LIMIT, PATH_LIMIT).astype(int)
+    pygame.draw.aalines(display, color, closed, clamped.tolist())
+
+
+def draw_points(display, screen_positions, colors):
+    """Draws lots of single pixels at once, like particles, by writing straight into the surface's pixels instead
+    of calling set_at tens of thousands of times
+    :param screen_positions: (N, 2) array of pixel positions, from corbit.view.world_to_screen
+    :param colors: (N, 3) array of colors
+    """
+    width, height = display.get_size()
+    x = screen_positions[:, 0]
+    y = screen_positions[:, 1]
+    on_screen = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+    if not on_screen.any():
+        return
+    pixels = pygame.surfarray.pixels3d(display)  # locks the surface until it's deleted
+    pixels[x[on_screen].astype(int), y[on_screen].astype(int)] = colors[on_screen]
+    del pixels
+
+
+def draw_horizon(display, color, screen_position, screen_radius):
+    """Draws only the part of a huge circle that's on screen, since asking pygame for a circle that's millions of
+    pixels across is slow, and past a point, overflows"""
+    width, height = display.get_size()
+    half_diagonal = math.hypot(width, height) / 2
+    # anything on screen and under the horizon is within 2 * half_diagonal of the horizon, so drawing the arc that's
+    # within reach of the middle of the screen, and going that deep below it, covers the whole screen
+    reach = 3 * half_diagonal
+
+    # do everything relative to the circle's center
+    to_screen_x = width / 2 - screen_position[0]
+    to_screen_y = height / 2 - screen_position[1]
+    distance = math.hypot(to_screen_x, to_screen_y)
+
+    if distance + half_diagonal <= screen_radius:
+        display.fill(color)  # we're under the horizon, the whole screen is covered
+        return
+    if distance - half_diagonal >= screen_radius:
+        return  # the whole body is off screen
+
+    # the arc of the circle that's within reach of the middle of the screen. This comes from the law of cosines,
+    # with the triangle made of the circle's center, the middle of the screen, and a point on the horizon
+    cos_span = (distance ** 2 + screen_radius ** 2 - reach ** 2) / (2 * distance * screen_radius)
+    span = math.acos(max(-1.0, min(1.0, cos_span)))
+    facing = math.atan2(to_screen_y, to_screen_x)
+
+    horizon = []
+    for i in range(HORIZON_POINTS + 1):
+        theta = facing - span + 2 * span * i / HORIZON_POINTS
+        horizon.append((screen_position[0] + screen_radius * math.cos(theta),
+                        screen_position[1] + screen_radius * math.sin(theta)))
+
+    # close the polygon off below the horizon, deep enough that it covers the whole screen
+    depth = reach
+    for theta in (facing + span, facing - span):
+        horizon.append((screen_position[0] + (screen_radius - depth) * math.cos(theta),
+                        screen_position[1] + (screen_radius - depth) * math.sin(theta)))
+
+    pygame.draw.polygon(display, color, [(int(x), int(y)) for x, y in horizon])
+
+
+class Hud:
+    """The heads-up display: lines of "field name    field value" in the top left of the screen.
+
+    Making a font and rendering text are both slow, so the font is only made once, field names are rendered once and
+    kept, field values are only re-rendered when they change, and everything is kept on an overlay surface that is
+    blitted onto the screen in one go.
+    """
+
+    name_color = (100, 100, 100)
+    value_color = (200, 200, 200)
+    gap = (10, 10)
+
+    def __init__(self, font_name="monospace", font_size=15):
+        self.font = pygame.font.SysFont(font_name, font_size)
+        self.labels = {}        # field name -> rendered surface, these never change so they're kept forever
+        self.overlay = None
+        self.lines = []         # the (name, value) lines currently drawn on the overlay
+        self.padding = 0
+
+    def label(self, text):
+        """Returns the rendered surface for a field name, only rendering it the first time"""
+        try:
+            return self.labels[text]
+        except KeyError:
+            self.labels[text] = self.font.render(text, 1, self.name_color)
+            return self.labels[text]
+
+    def draw(self, display, lines):
+        """Draws the HUD onto display
+        :param lines: a list of (field name, field value) string pairs, one per line
+        """
+        if self.overlay is None or self.overlay.get_size() != display.get_size():
+            self.overlay = pygame.Surface(display.get_size(), pygame.SRCALPHA)
+            self.lines = []
+
+        padding = 2 + max([len(name) for name, value in lines])
+        if padding != self.padding or len(lines) != len(self.lines):
+            # the layout changed, so everything has to be redrawn
+            self.overlay.fill((0, 0, 0, 0))
+            self.padding = padding
+            self.lines = [None] * len(lines)
+
+        line_height = self.gap[1] * 2
+        value_x = self.gap[0] + self.padding * 10  # padding*10 ensures a constant distance
+                                                   # between the field name and the field value
+        for line_number, line in enumerate(lines):
+            if line == self.lines[line_number]:
+                continue
+            y = line_height * line_number
+            self.overlay.fill((0, 0, 0, 0), (0, y, self.overlay.get_width(), line_height))
+            self.overlay.blit(self.label(line[0]), (self.gap[0], y))
+            self.overlay.blit(self.font.render(line[1], 1, self.value_color), (value_x, y))
+            self.lines[line_number] = line
+
+        display.blit(self.overlay, (0, 0))
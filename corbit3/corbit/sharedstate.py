@@ -0,0 +1,158 @@
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy
+
+# Handing the world from the server to pilots on the same machine through shared memory, instead of through a
+# database. The server writes the flight table rows (see corbit.mysqlio.entity_row) into one of two buffers, and
+# pilots copy them straight out, no SQL, no sockets and no system calls.
+#
+# Every buffer has a sequence number that the server makes odd before writing to it and even again after (a seqlock).
+# A pilot reads the number, copies the buffer, and reads the number again: if it changed, or was odd, the server was
+# writing while it read, so it tries again. With two buffers the server always writes the one pilots aren't being
+# pointed at, so that hardly ever happens. The generation counter goes up with every write, so pilots can tell if
+# there's anything new without copying anything.
+#
+# This relies on 8 byte aligned writes being atomic and not being reordered with each other, which holds on x86-64.
+#
+# A block can't be made bigger once it's there, so a world that doesn't fit gets a new, bigger block under the same
+# name, see corbit.storage.SharedMemoryStorage. Pilots still have the old one open, so once the new one has the world
+# in it the old one is marked retired, and pilots open the name again the next time they read.
+
+NAME = "corbit-world"   # name of the shared memory block
+CAPACITY = 1024         # how many entities a new block has room for, bigger worlds get a bigger one
+MAGIC = 0xC0B17         # so a pilot can tell the block really is a corbit world
+RETIRED = 0xDEAD        # what MAGIC gets changed to in a block the server's replaced with a bigger one
+FIELDS = 16             # numeric columns of a flight row, everything but TYPE and NAME
+
+# slots in the header
+HEADER_MAGIC, HEADER_CAPACITY, HEADER_GENERATION, HEADER_ACTIVE = 0, 1, 2, 3
+HEADER_SEQUENCE = 4     # 4 and 5, one for each buffer
+HEADER_COUNT = 6        # 6 and 7
+HEADER_SIZE = 8
+
+
+def block_size(capacity):
+    return 8 * HEADER_SIZE + 2 * capacity * (8 * FIELDS + 64 + 8)
+
+
+def attach(name):
+    """Opens someone else's shared memory block without taking it over. Before Python 3.13, every process that opened
+    a block would delete it when it exited, which would pull the world out from under the server and every other pilot
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        block = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(block._name, "shared_memory")
+        return block
+
+
+class SharedWorld:
+    """The shared memory block, from the server's side (create=True) or a pilot's"""
+
+    def __init__(self, name=NAME, capacity=CAPACITY, create=False):
+        """
+        :param create: True to make a new block (the server), False to open the server's. Opening raises
+        FileNotFoundError if there isn't a server on this machine
+        """
+        if create:
+            try:
+                # left over from a server that didn't shut down properly, or one the server's replacing
+                old = shared_memory.SharedMemory(name=name)
+                old.close()
+                old.unlink()
+            except FileNotFoundError:
+                pass
+            self.block = shared_memory.SharedMemory(name=name, create=True, size=block_size(capacity))
+        else:
+            self.block = attach(name)
+        self.created = create
+
+        self.header = numpy.ndarray((HEADER_SIZE,), dtype=numpy.uint64, buffer=self.block.buf)
+        if create:
+            self.header[:] = 0
+            self.header[HEADER_CAPACITY] = capacity
+            self.header[HEADER_MAGIC] = MAGIC
+        elif self.header[HEADER_MAGIC] != MAGIC:
+            self.block.close()
+            raise FileNotFoundError("shared memory block " + name + " isn't a corbit world")
+        capacity = int(self.header[HEADER_CAPACITY])
+        self.capacity = capacity
+
+        # the two buffers, one after the other, each split into its numbers, names and types
+        offset = 8 * HEADER_SIZE
+        self.numbers = numpy.ndarray((2, capacity, FIELDS), dtype=numpy.float64, buffer=self.block.buf, offset=offset)
+        offset += self.numbers.nbytes
+        self.names = numpy.ndarray((2, capacity), dtype="S64", buffer=self.block.buf, offset=offset)
+        offset += self.names.nbytes
+        self.types = numpy.ndarray((2, capacity), dtype="S8", buffer=self.block.buf, offset=offset)
+        if not create:
+            # pilots only ever read. Python can't map shared memory read only, but this at least stops numpy writing
+            for array in (self.header, self.numbers, self.names, self.types):
+                array.flags.writeable = False
+
+    def write(self, rows):
+        """Publishes flight table rows, see corbit.mysqlio.entity_row(). Only the server does this"""
+        if len(rows) > self.capacity:
+            raise ValueError("%d entities don't fit in shared memory, it only has room for %d" %
+                             (len(rows), self.capacity))
+        target = 1 - int(self.header[HEADER_ACTIVE])
+        self.header[HEADER_SEQUENCE + target] += 1  # odd, we're writing
+        for i, row in enumerate(rows):
+            self.types[target, i] = row[0].encode("UTF-8")
+            self.names[target, i] = row[1].encode("UTF-8")
+            self.numbers[target, i] = row[2:]
+        self.header[HEADER_COUNT + target] = len(rows)
+        self.header[HEADER_SEQUENCE + target] += 1  # even, done
+        self.header[HEADER_ACTIVE] = target
+        self.header[HEADER_GENERATION] += 1
+
+    def retire(self):
+        """Tells pilots the world has moved to a new block under the same name. Only the server does this, after
+        making the new block, which took the name over, so closing this one doesn't delete anything
+        """
+        self.header[HEADER_MAGIC] = RETIRED
+        self.created = False
+
+    def retired(self):
+        """True once the server has moved the world to a new block, open the name again to get it"""
+        return int(self.header[HEADER_MAGIC]) == RETIRED
+
+    def generation(self):
+        """Goes up by one every time the server writes, 0 if it hasn't yet"""
+        return int(self.header[HEADER_GENERATION])
+
+    def read(self, names=None):
+        """Copies out the newest rows the server wrote, all from the same write
+        :param names: only the rows of the entities with these names, None for all of them
+        :return: (generation, list of flight table rows)
+        """
+        wanted = None if names is None else numpy.array([name.encode("UTF-8") for name in names], dtype="S64")
+        while True:
+            generation = int(self.header[HEADER_GENERATION])
+            active = int(self.header[HEADER_ACTIVE])
+            sequence = int(self.header[HEADER_SEQUENCE + active])
+            if sequence % 2:
+                continue  # the server has already come back around to this buffer and is writing it
+            count = int(self.header[HEADER_COUNT + active])
+            numbers = self.numbers[active, :count].copy()
+            names = self.names[active, :count].copy()
+            types = self.types[active, :count].copy()
+            if int(self.header[HEADER_SEQUENCE + active]) == sequence:
+                break
+        if wanted is not None:
+            # copying is cheap, it's making the rows that's slow, so only the wanted ones get made
+            wanted = numpy.isin(names, wanted)
+            numbers, names, types = numbers[wanted], names[wanted], types[wanted]
+        rows = []
+        for kind, name, fields in zip(types, names, numbers.tolist()):
+            # colors have to be ints again
+            rows.append((kind.decode("UTF-8"), name.decode("UTF-8"), fields[0], fields[1],
+                         int(fields[2]), int(fields[3]), int(fields[4])) + tuple(fields[5:]))
+        return generation, rows
+
+    def close(self):
+        del self.header, self.numbers, self.names, self.types  # the block can't be closed while these point into it
+        self.block.close()
+        if self.created:
+            self.block.unlink()
@@ -0,0 +1,316 @@
+import itertools
+import struct
+import zlib
+
+import numpy
+
+# Squeezing the world down for sending to pilots over a network. A flight table row (see corbit.mysqlio.entity_row)
+# is 18 columns per body, but most of them never change, and the ones that do mostly change the way they were already
+# going. So, every message ("snapshot") is encoded against the last one the pilot said it got (acknowledged):
+#  - the columns that never change for a body (TYPE, NAME, MASS, RADIUS, color) are only sent when the pilot hasn't
+#    seen that body before
+#  - position, velocity, angular position and angular speed are guessed by carrying on from the acknowledged snapshot
+#    at the same velocity, and only how far off that guess is gets sent, rounded to a whole number of steps. The steps
+#    are small enough that everything is within position_error of where it should be, which the pilot picks to suit
+#    how far out it's zoomed
+#  - bodies where the guess is already close enough, and nothing else changed, aren't sent at all. Nor are most of the
+#    bodies the pilot isn't interested in right now (see corbit.interest), which only get caught up a few at a time
+#  - the rest (accelerations, angular acceleration, fuel) are sent as float32
+# then the whole thing goes through zlib. Every body gets a number (an id) the first time it's sent, so names don't
+# have to be sent again either.
+#
+# The pilot decodes with the same arithmetic the server used to work out what the pilot would end up with, so errors
+# never build up from one snapshot to the next. See benchmarks/snapshot_codec.py for how small this gets things.
+#
+# This is only the codec, for a transport that sends the world to pilots over a network. Pilots don't use it yet: they
+# read the flight table from corbit.storage (or shared memory, see corbit.sharedstate) through corbit.ingest, which
+# only reads the bodies they care about most of the time.
+
+PIXEL_ERROR = 0.5           # pixels, how far off a body can be on the pilot's screen
+MIN_POSITION_ERROR = 1e-3   # m, never bother being more precise than this
+MAX_POSITION_ERROR = 1.0    # m, never less precise than this however far out the pilot zooms, or the HUD suffers
+VELOCITY_SECONDS = 10.0     # velocities are good enough to keep within the position error for this long
+ANGLE_ERROR = 1e-4          # rad
+HISTORY = 64                # snapshots kept around to be acknowledged, past this the oldest ones are forgotten
+LOW_RATE_BODIES = 64        # most bodies the pilot isn't interested in that get sent in a message, see encode()
+COMPRESSION = 1             # zlib level, past this it's a lot slower for hardly any smaller
+
+# columns of a row after the first 7 (TYPE, NAME, MASS, RADIUS, COLORR, COLORG, COLORB):
+# POSX, POSY, VX, VY, ACCX, ACCY, ANGPOS, ANGV, ANGACC, FUEL, RCSFUEL
+COLUMNS = 11
+QUANTIZED = [0, 1, 2, 3, 6, 7]  # the ones that are sent as rounded differences from a guess
+OTHER = [4, 5, 8, 9, 10]        # the ones that are sent as float32
+
+TYPES = ("entity", "habitat")
+HEADER = struct.Struct("<IIddIIII")  # seq, seq of the snapshot it's against (0 for none), time, position error,
+                                     # number of new bodies, removed bodies, bodies sent in full, bodies sent as deltas
+STATIC = struct.Struct("<IBdd3BB")   # id, type, mass, radius, color, length of name (then the name itself)
+
+
+def position_error(zoom_level):
+    """How far off positions can be for a pilot zoomed in this far
+    :param zoom_level: pixels per m
+    """
+    return min(max(PIXEL_ERROR / zoom_level, MIN_POSITION_ERROR), MAX_POSITION_ERROR)
+
+
+def quanta(position_error):
+    """The size of a step for each of the QUANTIZED columns. Rounding to the nearest step is off by half a step at
+    most, so a step is twice the error
+    """
+    return 2 * numpy.array([position_error, position_error,
+                            position_error / VELOCITY_SECONDS, position_error / VELOCITY_SECONDS,
+                            ANGLE_ERROR, ANGLE_ERROR / VELOCITY_SECONDS])
+
+
+def extrapolate(numbers, time):
+    """The guess: carries positions and angular positions on at the same speed for time seconds"""
+    guess = numbers.copy()
+    guess[:, 0:2] += numbers[:, 2:4] * time
+    guess[:, 6] += numbers[:, 7] * time
+    return guess
+
+
+class Snapshot:
+    """The world as a pilot has it after decoding a message"""
+
+    def __init__(self, time, ids, numbers, statics):
+        """
+        :param ids: sorted (N,) array of body ids
+        :param numbers: (N, COLUMNS) array, the non-static columns of each body's row
+        :param statics: {id: (TYPE, NAME, MASS, RADIUS, COLORR, COLORG, COLORB)}
+        """
+        self.time = time
+        self.ids = ids
+        self.numbers = numbers
+        self.statics = statics
+
+    def rows(self):
+        """:return: the bodies as flight table rows, for a corbit.entitycache.EntityCache"""
+        return [self.statics[i] + tuple(numbers) for i, numbers in zip(self.ids.tolist(), self.numbers.tolist())]
+
+
+class Table:
+    """One tick's flight table rows, turned into arrays once, for every pilot's Encoder to share"""
+
+    def __init__(self, rows, previous=None):
+        """
+        :param rows: flight table rows of the whole world
+        :param previous: the Table from the tick before. If the bodies haven't changed since, its static columns are
+        kept, so encoders can tell they're the same without looking through them again
+        """
+        # the whole table in one go as an array of objects, which is a lot quicker than going through it row by row
+        table = numpy.fromiter(itertools.chain.from_iterable(rows), dtype=object,
+                               count=(7 + COLUMNS) * len(rows)).reshape(-1, 7 + COLUMNS)
+        self.statics = table[:, :7]  # (N, 7) array of the original TYPE, NAME, MASS, RADIUS, COLORR, COLORG, COLORB
+        if previous is not None and numpy.array_equal(previous.statics, self.statics):
+            self.statics = previous.statics
+        self.numbers = table[:, 7:].astype(float)  # (N, COLUMNS) array, with OTHER already rounded to float32
+        self.numbers[:, OTHER] = self.numbers[:, OTHER].astype(numpy.float32)
+
+
+def apply(base, time, error, statics, removed, full_ids, full_numbers, delta_ids, deltas, delta_other):
+    """Works out a new Snapshot from the one a message is against and what's in the message. Both ends use this, so
+    they come up with exactly the same numbers
+    :param base: the Snapshot the message is against, or None
+    :param statics: {id: static columns} of new bodies
+    :param full_numbers: (F, COLUMNS) array, with OTHER already rounded to float32
+    :param deltas: (D, len(QUANTIZED)) array of steps away from the guess
+    :param delta_other: (D, len(OTHER)) array
+    """
+    if base is not None and not removed and not statics:
+        # the same bodies as last time, which is most of the time
+        everything = base.statics
+        ids = base.ids
+    else:
+        everything = dict(base.statics) if base is not None else {}
+        for i in removed:
+            del everything[i]
+        everything.update(statics)
+        ids = numpy.array(sorted(everything), dtype=numpy.uint32)
+    numbers = numpy.empty((len(ids), COLUMNS))
+
+    if base is not None:
+        kept = numpy.isin(base.ids, ids)
+        numbers[numpy.searchsorted(ids, base.ids[kept])] = extrapolate(base.numbers[kept], time - base.time)
+    rows = numpy.searchsorted(ids, delta_ids)
+    numbers[numpy.ix_(rows, QUANTIZED)] += deltas * quanta(error)
+    numbers[numpy.ix_(rows, OTHER)] = delta_other
+    numbers[numpy.searchsorted(ids, full_ids)] = full_numbers
+    return Snapshot(time, ids, numbers, everything)
+
+
+class Encoder:
+    """The server's end, one for every pilot"""
+
+    def __init__(self):
+        self.ids = {}           # name -> id
+        self.sent = {}          # seq -> the Snapshot the pilot has once it's decoded that message
+        self.seq = 0
+        self.acknowledged = None
+        self.error = MAX_POSITION_ERROR
+        self.last_sent = numpy.zeros(1, dtype=int)  # id -> seq of the message it was last sent in
+        self.table = None       # the last Table encoded
+        # what was worked out from its static columns: (sorted ids, the order that sorts the rows by id, {id: static
+        # columns}). Kept because most of the time the bodies are the same as last time, and working this out again
+        # body by body is most of what encoding would cost
+        self.layout = None
+
+    def acknowledge(self, seq, zoom_level=None):
+        """Called when the pilot says it's decoded a message, so the next ones can be encoded against that one
+        :param zoom_level: the pilot's zoom level in pixels per m, to pick how precise positions have to be
+        """
+        if seq in self.sent and (self.acknowledged is None or seq > self.acknowledged):
+            self.acknowledged = seq
+            for old in [old for old in self.sent if old < seq]:
+                del self.sent[old]
+        if zoom_level is not None:
+            self.error = position_error(zoom_level)
+
+    def reset(self):
+        """For when the pilot's lost track, e.g. it reconnected. The next message will have everything in it"""
+        self.acknowledged = None
+        self.sent = {}
+
+    def id(self, name):
+        if name not in self.ids:
+            self.ids[name] = len(self.ids) + 1
+        return self.ids[name]
+
+    def encode(self, rows, time, relevant=None):
+        """
+        :param rows: flight table rows of the whole world, or a Table of them. With more than one pilot, make a Table
+        every tick and hand it to all of their encoders, rather than having each of them go through the rows
+        :param time: simulation time, in s
+        :param relevant: (N,) bool array, True for the rows the pilot is interested in, see corbit.interest. The rest
+        only get sent LOW_RATE_BODIES at a time, the ones that have gone longest without first, and the pilot carries
+        them on at the same velocity in the meantime. None for everything
+        :return: the message, as bytes
+        """
+        base = self.sent.get(self.acknowledged)
+        table = rows if isinstance(rows, Table) else Table(rows, self.table)
+        if self.table is None or table.statics is not self.table.statics:
+            # bodies came or went, moved around in the table, or changed
+            ids = numpy.array([self.id(name) for name in table.statics[:, 1].tolist()], dtype=numpy.uint32)
+            order = numpy.argsort(ids)
+            ids = ids[order]
+            statics = {i: tuple(static) for i, static in zip(ids.tolist(), table.statics[order].tolist())}
+            self.layout = (ids, order, statics)
+        self.table = table
+        ids, order, statics = self.layout
+        numbers = table.numbers[order]
+
+        full = numpy.ones(len(ids), dtype=bool)
+        delta = numpy.zeros(len(ids), dtype=bool)
+        steps = numpy.zeros((0, len(QUANTIZED)))
+        if base is None:
+            new = statics
+            removed = []
+        else:
+            if base.statics == statics:
+                # the same bodies as last time, which is most of the time. The static columns in base are the very
+                # same tuples as in statics, so that's quick to check
+                new = {}
+                removed = []
+            else:
+                new = {i: static for i, static in statics.items() if base.statics.get(i) != static}
+                removed = [i for i in base.statics if i not in statics]
+            # everything that was in base, and hasn't been replaced by something else with the same name
+            old = numpy.isin(ids, base.ids) & ~numpy.isin(ids, numpy.array(list(new), dtype=numpy.uint32))
+            base_rows = numpy.searchsorted(base.ids, ids[old])
+            guess = extrapolate(base.numbers[base_rows], time - base.time)
+            with numpy.errstate(invalid="ignore"):
+                steps = numpy.round((numbers[old][:, QUANTIZED] - guess[:, QUANTIZED]) / quanta(self.error))
+            fits = (numpy.abs(steps) < 2 ** 31).all(axis=1)  # anything further off than this goes in full
+            changed = ((steps != 0).any(axis=1) |
+                       (numbers[old][:, OTHER] != base.numbers[base_rows][:, OTHER]).any(axis=1))
+            full[old] = ~fits
+            delta[old] = fits & changed
+            if relevant is not None:
+                late = numpy.flatnonzero(delta & ~numpy.asarray(relevant, dtype=bool)[order])
+                if len(late) > LOW_RATE_BODIES:
+                    oldest = numpy.argsort(self.last_sent[ids[late]], kind="stable")[:LOW_RATE_BODIES]
+                    delta[late] = False
+                    delta[late[oldest]] = True
+            steps = steps[delta[old]]
+
+        parts = (time, self.error, new, removed, ids[full], numbers[full], ids[delta], steps, numbers[delta][:, OTHER])
+        self.seq += 1
+        if len(self.last_sent) <= len(self.ids):
+            self.last_sent = numpy.concatenate((self.last_sent, numpy.zeros(len(self.ids) + 1 - len(self.last_sent),
+                                                                            dtype=int)))
+        self.last_sent[ids[full | delta]] = self.seq
+        self.sent[self.seq] = apply(base, *parts)
+        while len(self.sent) > HISTORY:
+            del self.sent[min(seq for seq in self.sent if seq != self.acknowledged)]
+        return pack(self.seq, self.acknowledged or 0, *parts)
+
+
+def pack(seq, base_seq, time, error, statics, removed, full_ids, full_numbers, delta_ids, deltas, delta_other):
+    chunks = [HEADER.pack(seq, base_seq, time, error, len(statics), len(removed), len(full_ids), len(delta_ids))]
+    for i, static in statics.items():
+        name = static[1].encode("UTF-8")
+        chunks.append(STATIC.pack(i, TYPES.index(static[0]), static[2], static[3], static[4], static[5], static[6],
+                                  len(name)) + name)
+    chunks.append(numpy.array(removed, dtype="<u4").tobytes())
+    chunks.append(full_ids.astype("<u4").tobytes())
+    chunks.append(full_numbers[:, QUANTIZED].astype("<f8").tobytes())
+    chunks.append(full_numbers[:, OTHER].astype("<f4").tobytes())
+    chunks.append(delta_ids.astype("<u4").tobytes())
+    chunks.append(deltas.astype("<i4").tobytes())
+    chunks.append(delta_other.astype("<f4").tobytes())
+    return zlib.compress(b"".join(chunks), COMPRESSION)
+
+
+class Decoder:
+    """The pilot's end"""
+
+    def __init__(self):
+        self.received = {}  # seq -> Snapshot, for the server to encode against
+        self.latest = None  # seq of the newest message decoded, which is what to acknowledge
+
+    def decode(self, message):
+        """
+        :return: the Snapshot the message brings the world up to
+        :raise ValueError: if the message is against a snapshot this never got, in which case the server should
+        reset() its Encoder
+        """
+        data = zlib.decompress(message)
+        seq, base_seq, time, error, new_count, removed_count, full_count, delta_count = HEADER.unpack_from(data)
+        offset = HEADER.size
+
+        statics = {}
+        for _ in range(new_count):
+            i, kind, mass, radius, red, green, blue, length = STATIC.unpack_from(data, offset)
+            offset += STATIC.size
+            name = data[offset:offset + length].decode("UTF-8")
+            offset += length
+            statics[i] = (TYPES[kind], name, mass, radius, red, green, blue)
+
+        def take(dtype, count, width=None):
+            nonlocal offset
+            array = numpy.frombuffer(data, dtype=dtype, count=count * (width or 1), offset=offset)
+            offset += array.nbytes
+            return array.reshape(count, width) if width else array
+
+        removed = take("<u4", removed_count).tolist()
+        full_ids = take("<u4", full_count)
+        full_numbers = numpy.empty((full_count, COLUMNS))
+        full_numbers[:, QUANTIZED] = take("<f8", full_count, len(QUANTIZED))
+        full_numbers[:, OTHER] = take("<f4", full_count, len(OTHER))
+        delta_ids = take("<u4", delta_count)
+        deltas = take("<i4", delta_count, len(QUANTIZED)).astype(float)
+        delta_other = take("<f4", delta_count, len(OTHER)).astype(float)
+
+        if base_seq and base_seq not in self.received:
+            raise ValueError("snapshot %d is against snapshot %d, which never came" % (seq, base_seq))
+        snapshot = apply(self.received.get(base_seq), time, error, statics, removed, full_ids, full_numbers,
+                         delta_ids, deltas, delta_other)
+        # the server never goes back to something older than what it's encoding against
+        for old in [old for old in self.received if old < base_seq]:
+            del self.received[old]
+        self.received[seq] = snapshot
+        while len(self.received) > HISTORY:
+            del self.received[min(old for old in self.received if old != base_seq)]
+        self.latest = seq
+        return snapshot
@@ -0,0 +1,568 @@
+import abc
+import contextlib
+import sqlite3
+
+import numpy
+
+import corbit.mysqlio
+import corbit.sharedstate
+from corbit.mysqlio import entity_row, row_entity
+
+# Where the server publishes the world and the pilots leave their commands. Everything that talks to the database
+# goes through one of these, so the same server and pilot can run on MySQL, on a SQLite file (no database server
+# needed), or, for tests and benchmarks, entirely in memory. See tests/test_storage.py for what a backend has to do,
+# and benchmarks/storage.py for how fast each one is. Pilots on the same machine as the server can get the world
+# through shared memory instead, see SharedMemoryStorage.
+#
+# Commands are (COMMAND, TARGET, AMOUNT) tuples, TARGET and AMOUNT may be missing or None.
+
+
+class Storage(abc.ABC):
+    """What every backend has to do. Entities come back as new objects, never the ones that were pushed"""
+
+    @abc.abstractmethod
+    def flush(self):
+        """Empties everything out, for when the server starts"""
+
+    @abc.abstractmethod
+    def push_entities(self, entities):
+        """Replaces the published entities"""
+
+    @abc.abstractmethod
+    def get_entity_rows(self, names=None):
+        """:return: a list of the published entities as flight table rows, see corbit.mysqlio.entity_row(). Turning
+        rows into entities is slow, so pilots keep theirs in a corbit.entitycache.EntityCache instead
+        :param names: only the rows of the entities with these names, in no particular order, for pilots that only
+        want the bodies they care about (see corbit.ingest). None for all of them
+        """
+
+    def get_entities(self):
+        """:return: a list of the published entities"""
+        return [row_entity(row) for row in self.get_entity_rows()]
+
+    @abc.abstractmethod
+    def push_commands(self, commands):
+        """Leaves commands for the server"""
+
+    @abc.abstractmethod
+    def pop_commands(self):
+        """:return: a list of the commands left since the last pop, in the order they were pushed, and forgets them"""
+
+    def end_tick(self):
+        """Called by the server after every tick, for backends that save up writes and commit them together"""
+        pass
+
+    def commit(self):
+        """Commits any writes saved up so far, so they can be read"""
+        pass
+
+    # the rest are for lockstep mode (see corbit.lockstep), particles (see corbit.particles), pilots predicting
+    # their own commands (see corbit.commands) and telemetry (see corbit.telemetry)
+
+    @abc.abstractmethod
+    def push_command_log(self, tick, commands):
+        """Records the commands the server applied on a tick, in the order it applied them"""
+
+    @abc.abstractmethod
+    def get_command_log(self, since_tick):
+        """:return: a {tick: [commands]} dict of every command applied on or after since_tick"""
+
+    @abc.abstractmethod
+    def push_state_hash(self, tick, state_hash):
+        """Publishes the hash of the state at the start of a tick, see corbit.lockstep.state_hash()"""
+
+    @abc.abstractmethod
+    def get_latest_state_hash(self):
+        """:return: the most recent (TICK, HASH) pair the server published, or None"""
+
+    @abc.abstractmethod
+    def push_particles(self, particles):
+        """Replaces the published particles with the current ones, see corbit.particles.Particles"""
+
+    @abc.abstractmethod
+    def push_acknowledgement(self, pilot, seq, tick_time):
+        """Records that the server has applied, and simulated, a pilot's commands up to its acknowledge command
+        number seq, with ticks tick_time s long
+        """
+
+    @abc.abstractmethod
+    def get_acknowledgement(self, pilot):
+        """:return: the newest (seq, tick_time) pushed for the pilot, or None"""
+
+    @abc.abstractmethod
+    def get_particles(self):
+        """:return: (positions, colors), a (P, 2) float array in m and a (P, 3) uint8 array"""
+
+    @abc.abstractmethod
+    def get_particles_generation(self):
+        """:return: a number that changes every time particles are pushed, or None if they never have been. Much
+        cheaper than get_particles(), so pilots only read those again when this changes
+        """
+
+    @abc.abstractmethod
+    def push_telemetry(self, rows):
+        """Replaces the published telemetry with a list of (CRAFT, REFERENCE, CHANNEL, VALUE) rows"""
+
+    @abc.abstractmethod
+    def get_telemetry(self):
+        """:return: the published (CRAFT, REFERENCE, CHANNEL, VALUE) rows, in the order they were pushed"""
+
+
+def full_command(command):
+    """Pads a command out to (COMMAND, TARGET, AMOUNT)"""
+    return (tuple(command) + (None,) * 3)[:3]
+
+
+def no_particles():
+    return numpy.zeros((0, 2)), numpy.zeros((0, 3), dtype=numpy.uint8)
+
+
+class MySQLStorage(Storage):
+    """A MySQL database, through corbit.mysqlio. Reads get a connection of their own out of a small pool, so the
+    server picking up commands doesn't have to wait for it publishing the world, or the other way around.
+    Writes can be batched: they all go out on one connection, and get committed together every few ticks
+    """
+
+    def __init__(self, db_info, pool_size=corbit.mysqlio.POOL_SIZE, commit_interval=None):
+        """
+        :param db_info: (host, user, password, database)
+        :param pool_size: how many connections to keep open
+        :param commit_interval: commit writes every this many calls to end_tick(). None commits every write right
+        away, which is what pilots want for their commands
+        """
+        if commit_interval is not None and pool_size < 2:
+            raise ValueError("batching writes keeps a connection busy, so reads need a pool of at least 2")
+        self.pool = corbit.mysqlio.ConnectionPool(db_info, pool_size)
+        self.commit_interval = commit_interval
+        self.writer = None  # the connection writes go out on until they're committed, when batching
+        self.ticks = 0
+
+    @contextlib.contextmanager
+    def writing(self):
+        """A connection to write with, which is committed right after unless writes are being batched"""
+        if self.commit_interval is None:
+            with self.pool.connection() as db:
+                try:
+                    yield db
+                    db.commit()
+                except:
+                    db.rollback()
+                    raise
+            return
+        if self.writer is None:
+            self.writer = self.pool.acquire()
+        try:
+            yield self.writer
+        except:
+            self.writer.rollback()
+            self.pool.release(self.writer)
+            self.writer = None
+            raise
+
+    def reading(self, function, *args):
+        """Calls function with a pooled connection and args, then commits, which also means the next read sees
+        whatever has been committed since
+        """
+        with self.pool.connection() as db:
+            try:
+                result = function(db, *args)
+                db.commit()
+                return result
+            except:
+                db.rollback()
+                raise
+
+    def end_tick(self):
+        self.ticks += 1
+        if self.commit_interval is not None and self.ticks % self.commit_interval == 0:
+            self.commit()
+
+    def commit(self):
+        if self.writer is not None:
+            self.writer.commit()
+            self.pool.release(self.writer)
+            self.writer = None
+
+    def flush(self):
+        with self.pool.connection() as db:
+            corbit.mysqlio.flush_db(db)
+
+    def push_entities(self, entities):
+        with self.writing() as db:
+            corbit.mysqlio.push_entities(db, entities)
+
+    def get_entity_rows(self, names=None):
+        return self.reading(corbit.mysqlio.get_entity_rows, names)
+
+    def push_commands(self, commands):
+        with self.writing() as db:
+            corbit.mysqlio.push_commands(db, commands)
+
+    def pop_commands(self):
+        return self.reading(corbit.mysqlio.pop_commands)
+
+    def push_command_log(self, tick, commands):
+        with self.writing() as db:
+            corbit.mysqlio.push_command_log(db, tick, commands)
+
+    def get_command_log(self, since_tick):
+        return self.reading(corbit.mysqlio.get_command_log, since_tick)
+
+    def push_state_hash(self, tick, state_hash):
+        with self.writing() as db:
+            corbit.mysqlio.push_state_hash(db, tick, state_hash)
+
+    def get_latest_state_hash(self):
+        return self.reading(corbit.mysqlio.get_latest_state_hash)
+
+    def push_particles(self, particles):
+        with self.writing() as db:
+            corbit.mysqlio.push_particles(db, particles)
+
+    def get_particles(self):
+        return self.reading(corbit.mysqlio.get_particles)
+
+    def get_particles_generation(self):
+        return self.reading(corbit.mysqlio.get_particles_generation)
+
+    def push_acknowledgement(self, pilot, seq, tick_time):
+        with self.writing() as db:
+            corbit.mysqlio.push_acknowledgement(db, pilot, seq, tick_time)
+
+    def get_acknowledgement(self, pilot):
+        return self.reading(corbit.mysqlio.get_acknowledgement, pilot)
+
+    def push_telemetry(self, rows):
+        with self.writing() as db:
+            corbit.mysqlio.push_telemetry(db, rows)
+
+    def get_telemetry(self):
+        return self.reading(corbit.mysqlio.get_telemetry)
+
+
+class SQLiteStorage(Storage):
+    """A SQLite file, which the server and pilots on the same machine can share without a database server.
+    It's in WAL mode, so pilots reading don't hold up the server writing
+    """
+
+    def __init__(self, path="corbit.sqlite3"):
+        self.path = path
+        # the pilot reads in a thread of its own (see corbit.ingest), only ever one at a time though
+        self.db = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")  # in WAL mode, this is still safe against crashes
+        self.create_tables()
+
+    def create_tables(self):
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS flight (
+                TYPE CHAR(64) NOT NULL, NAME CHAR(64) NOT NULL, MASS DOUBLE NOT NULL, RADIUS DOUBLE NOT NULL,
+                COLORR INT NOT NULL, COLORG INT NOT NULL, COLORB INT NOT NULL,
+                POSX DOUBLE NOT NULL, POSY DOUBLE NOT NULL, VX DOUBLE NOT NULL, VY DOUBLE NOT NULL,
+                ACCX DOUBLE NOT NULL, ACCY DOUBLE NOT NULL,
+                ANGPOS DOUBLE NOT NULL, ANGV DOUBLE NOT NULL, ANGACC DOUBLE NOT NULL,
+                FUEL DOUBLE, RCSFUEL DOUBLE);
+            CREATE TABLE IF NOT EXISTS flightcommands (
+                SEQ INTEGER PRIMARY KEY AUTOINCREMENT, COMMAND CHAR(64) NOT NULL, TARGET CHAR(64), AMOUNT DOUBLE);
+            CREATE TABLE IF NOT EXISTS commandlog (
+                TICK BIGINT NOT NULL, SEQ INT NOT NULL, COMMAND CHAR(64) NOT NULL, TARGET CHAR(64), AMOUNT DOUBLE);
+            CREATE TABLE IF NOT EXISTS statehashes ( TICK BIGINT NOT NULL, HASH CHAR(40) NOT NULL);
+            CREATE TABLE IF NOT EXISTS particles (
+                GENERATION BIGINT NOT NULL, COUNT INT NOT NULL, POSITIONS BLOB NOT NULL, COLORS BLOB NOT NULL);
+            CREATE TABLE IF NOT EXISTS acknowledgements (
+                PILOT CHAR(64) NOT NULL PRIMARY KEY, SEQ BIGINT NOT NULL, TICKTIME DOUBLE NOT NULL);
+            CREATE TABLE IF NOT EXISTS telemetry (
+                SEQ INTEGER PRIMARY KEY, CRAFT CHAR(64) NOT NULL, REFERENCE CHAR(64) NOT NULL,
+                CHANNEL CHAR(64) NOT NULL, VALUE DOUBLE);
+            """)
+
+    def flush(self):
+        self.db.executescript("""
+            DROP TABLE IF EXISTS flight;
+            DROP TABLE IF EXISTS flightcommands;
+            DROP TABLE IF EXISTS commandlog;
+            DROP TABLE IF EXISTS statehashes;
+            DROP TABLE IF EXISTS particles;
+            DROP TABLE IF EXISTS acknowledgements;
+            DROP TABLE IF EXISTS telemetry;
+            """)
+        self.create_tables()
+
+    def push_entities(self, entities):
+        with self.db:
+            self.db.execute("DELETE FROM flight")
+            self.db.executemany("INSERT INTO flight VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                [entity_row(entity) for entity in entities])
+
+    def get_entity_rows(self, names=None):
+        if names is None:
+            return self.db.execute("SELECT * FROM flight").fetchall()
+        names = list(names)
+        rows = []
+        for start in range(0, len(names), corbit.mysqlio.NAMES_PER_QUERY):
+            chunk = names[start:start + corbit.mysqlio.NAMES_PER_QUERY]
+            rows += self.db.execute("SELECT * FROM flight WHERE NAME IN (" + ", ".join("?" * len(chunk)) + ")",
+                                    chunk).fetchall()
+        return rows
+
+    def push_commands(self, commands):
+        with self.db:
+            self.db.executemany("INSERT INTO flightcommands(COMMAND, TARGET, AMOUNT) VALUES(?, ?, ?)",
+                                [full_command(command) for command in commands])
+
+    def pop_commands(self):
+        with self.db:
+            rows = self.db.execute("SELECT SEQ, COMMAND, TARGET, AMOUNT FROM flightcommands ORDER BY SEQ").fetchall()
+            if rows:
+                self.db.execute("DELETE FROM flightcommands WHERE SEQ <= ?", (rows[-1][0],))
+        return [row[1:] for row in rows]
+
+    def push_command_log(self, tick, commands):
+        with self.db:
+            self.db.executemany("INSERT INTO commandlog(TICK, SEQ, COMMAND, TARGET, AMOUNT) VALUES(?, ?, ?, ?, ?)",
+                                [(tick, seq) + full_command(command) for seq, command in enumerate(commands)])
+
+    def get_command_log(self, since_tick):
+        log = {}
+        for tick, command, target, amount in self.db.execute(
+                "SELECT TICK, COMMAND, TARGET, AMOUNT FROM commandlog WHERE TICK >= ? ORDER BY TICK, SEQ",
+                (since_tick,)):
+            log.setdefault(tick, []).append((command, target, amount))
+        return log
+
+    def push_state_hash(self, tick, state_hash):
+        with self.db:
+            self.db.execute("INSERT INTO statehashes(TICK, HASH) VALUES(?, ?)", (tick, state_hash))
+
+    def get_latest_state_hash(self):
+        return self.db.execute("SELECT TICK, HASH FROM statehashes ORDER BY TICK DESC LIMIT 1").fetchone()
+
+    def push_particles(self, particles):
+        count = len(particles)
+        blobs = (count, particles.positions[:count].tobytes(), particles.colors[:count].tobytes())
+        with self.db:
+            if not self.db.execute("UPDATE particles SET GENERATION = GENERATION + 1, COUNT = ?, POSITIONS = ?, "
+                                   "COLORS = ?", blobs).rowcount:
+                self.db.execute("INSERT INTO particles(GENERATION, COUNT, POSITIONS, COLORS) VALUES(1, ?, ?, ?)",
+                                blobs)
+
+    def get_particles(self):
+        row = self.db.execute("SELECT COUNT, POSITIONS, COLORS FROM particles").fetchone()
+        if row is None:
+            return no_particles()
+        count, positions, colors = row
+        return (numpy.frombuffer(positions, dtype=float).reshape(count, 2),
+                numpy.frombuffer(colors, dtype=numpy.uint8).reshape(count, 3))
+
+    def get_particles_generation(self):
+        row = self.db.execute("SELECT GENERATION FROM particles").fetchone()
+        return None if row is None else row[0]
+
+    def push_acknowledgement(self, pilot, seq, tick_time):
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO acknowledgements(PILOT, SEQ, TICKTIME) VALUES(?, ?, ?)",
+                            (pilot, seq, tick_time))
+
+    def get_acknowledgement(self, pilot):
+        return self.db.execute("SELECT SEQ, TICKTIME FROM acknowledgements WHERE PILOT = ?", (pilot,)).fetchone()
+
+    def push_telemetry(self, rows):
+        with self.db:
+            self.db.execute("DELETE FROM telemetry")
+            self.db.executemany("INSERT INTO telemetry(SEQ, CRAFT, REFERENCE, CHANNEL, VALUE) VALUES(?, ?, ?, ?, ?)",
+                                [(seq,) + tuple(row) for seq, row in enumerate(rows)])
+
+    def get_telemetry(self):
+        return self.db.execute("SELECT CRAFT, REFERENCE, CHANNEL, VALUE FROM telemetry ORDER BY SEQ").fetchall()
+
+
+class MemoryStorage(Storage):
+    """Keeps everything in this process, for benchmarks and trying things out without any database at all.
+    Entities are kept as flight table rows, so they come back as new objects just like from a real database
+    """
+
+    def __init__(self):
+        self.flush()
+
+    def flush(self):
+        self.rows = []
+        self.commands = []
+        self.command_log = []
+        self.state_hashes = []
+        self.particles = no_particles()
+        self.particles_generation = None
+        self.acknowledgements = {}
+        self.telemetry = []
+
+    def push_entities(self, entities):
+        self.rows = [entity_row(entity) for entity in entities]
+
+    def get_entity_rows(self, names=None):
+        if names is None:
+            return self.rows
+        names = set(names)
+        return [row for row in self.rows if row[1] in names]
+
+    def push_commands(self, commands):
+        self.commands += [full_command(command) for command in commands]
+
+    def pop_commands(self):
+        commands, self.commands = self.commands, []
+        return commands
+
+    def push_command_log(self, tick, commands):
+        self.command_log += [(tick, full_command(command)) for command in commands]
+
+    def get_command_log(self, since_tick):
+        log = {}
+        for tick, command in self.command_log:
+            if tick >= since_tick:
+                log.setdefault(tick, []).append(command)
+        return log
+
+    def push_state_hash(self, tick, state_hash):
+        self.state_hashes.append((tick, state_hash))
+
+    def get_latest_state_hash(self):
+        return max(self.state_hashes) if self.state_hashes else None
+
+    def push_particles(self, particles):
+        count = len(particles)
+        self.particles = (particles.positions[:count].copy(), particles.colors[:count].copy())
+        self.particles_generation = (self.particles_generation or 0) + 1
+
+    def get_particles(self):
+        return self.particles
+
+    def get_particles_generation(self):
+        return self.particles_generation
+
+    def push_acknowledgement(self, pilot, seq, tick_time):
+        self.acknowledgements[pilot] = (seq, tick_time)
+
+    def get_acknowledgement(self, pilot):
+        return self.acknowledgements.get(pilot)
+
+    def push_telemetry(self, rows):
+        self.telemetry = [tuple(row) for row in rows]
+
+    def get_telemetry(self):
+        return self.telemetry
+
+
+class SharedMemoryStorage(Storage):
+    """Wraps another backend, but hands entities to pilots on the same machine as the server through shared memory
+    (see corbit.sharedstate) instead. Everything else, and entities for pilots on other machines, still goes through
+    the wrapped backend. A pilot that can't find the server's shared memory just uses the wrapped backend
+    """
+
+    def __init__(self, storage, server=False, name=corbit.sharedstate.NAME, capacity=corbit.sharedstate.CAPACITY):
+        """
+        :param storage: the backend to wrap, e.g. a MySQLStorage
+        :param server: True for the server, which makes the shared memory, False for a pilot
+        :param capacity: how many entities the server's shared memory has room for to start with. Bigger worlds get
+        a bigger block when they're pushed
+        """
+        self.storage = storage
+        self.server = server
+        self.name = name
+        try:
+            self.world = corbit.sharedstate.SharedWorld(name, capacity, create=server)
+        except FileNotFoundError:
+            self.world = None  # the server is somewhere else
+        self.generation = None
+        self.rows = []
+
+    def flush(self):
+        self.storage.flush()
+        if self.server:
+            self.world.write([])
+
+    def push_entities(self, entities):
+        rows = [entity_row(entity) for entity in entities]
+        if self.server:
+            if len(rows) > self.world.capacity:
+                self.grow(rows)
+            else:
+                self.world.write(rows)
+        self.storage.push_entities(entities)
+
+    def grow(self, rows):
+        """Moves the world to a new block with room for rows and plenty more, under the same name. It's written
+        before the old block is retired, so pilots never find the new one empty
+        """
+        old = self.world
+        self.world = corbit.sharedstate.SharedWorld(self.name, max(len(rows), 2 * old.capacity), create=True)
+        self.world.write(rows)
+        old.retire()
+        old.close()
+
+    def get_entity_rows(self, names=None):
+        """The same list comes back until the server writes again, so an EntityCache can skip it altogether. Not
+        when only some names are asked for though
+        """
+        if self.world is not None and self.world.retired():
+            # the server's moved the world to a bigger block
+            self.world.close()
+            try:
+                self.world = corbit.sharedstate.SharedWorld(self.name)
+            except FileNotFoundError:
+                self.world = None
+            self.generation = None
+        if self.world is None:
+            return self.storage.get_entity_rows(names)
+        if names is not None:
+            return self.world.read(names)[1]
+        if self.world.generation() != self.generation:
+            self.generation, self.rows = self.world.read()
+        return self.rows
+
+    def push_commands(self, commands):
+        self.storage.push_commands(commands)
+
+    def pop_commands(self):
+        return self.storage.pop_commands()
+
+    def end_tick(self):
+        self.storage.end_tick()
+
+    def commit(self):
+        self.storage.commit()
+
+    def push_command_log(self, tick, commands):
+        self.storage.push_command_log(tick, commands)
+
+    def get_command_log(self, since_tick):
+        return self.storage.get_command_log(since_tick)
+
+    def push_state_hash(self, tick, state_hash):
+        self.storage.push_state_hash(tick, state_hash)
+
+    def get_latest_state_hash(self):
+        return self.storage.get_latest_state_hash()
+
+    def push_particles(self, particles):
+        self.storage.push_particles(particles)
+
+    def get_particles(self):
+        return self.storage.get_particles()
+
+    def get_particles_generation(self):
+        return self.storage.get_particles_generation()
+
+    def push_acknowledgement(self, pilot, seq, tick_time):
+        self.storage.push_acknowledgement(pilot, seq, tick_time)
+
+    def get_acknowledgement(self, pilot):
+        return self.storage.get_acknowledgement(pilot)
+
+    def push_telemetry(self, rows):
+        self.storage.push_telemetry(rows)
+
+    def get_telemetry(self):
+        return self.storage.get_telemetry()
+
+    def close(self):
+        if self.world is not None:
+            self.world.close()
+            self.world = None
@@ -0,0 +1,187 @@
+import math
+import sys
+import time
+
+import numpy
+from unum.units import m, s, kg
+
+import corbit.orbits
+
+# The numbers on a pilot's HUD (altitude, speed, periapsis...), worked out by the server instead of by every pilot
+# every frame. Pilots register the (craft, reference) pairs they want with a "watch_telemetry" command, and every so
+# often the server works out every channel for every registered pair in one go with corbit.orbits, and publishes them
+# (see Storage.push_telemetry). Something that only shows numbers, like a HUD-only station, then needs no physics or
+# entities at all, see the bottom of this file.
+#
+# It's published as rows of (CRAFT, REFERENCE, CHANNEL, VALUE), VALUE is None where the channel doesn't make sense,
+# e.g. the orbit of something sitting right on top of its reference.
+
+WATCH = "watch_telemetry"       # (WATCH, pair_target(craft, reference), None) to start getting a pair's telemetry
+FORGET = "forget_telemetry"     # and the same with FORGET to stop
+SEPARATOR = "/"                 # between the craft and reference in a WATCH or FORGET command's TARGET
+
+
+def altitude(A, B):
+    return corbit.orbits.altitude(A.positions, B.positions, A.radii, B.radii)
+
+
+def speed(A, B):
+    return corbit.orbits.speed(A.velocities, B.velocities)
+
+
+def acceleration(A, B):
+    # what the craft's doing to itself, so without the reference's pull
+    return corbit.orbits.magnitude(A.accelerations - corbit.orbits.gravity_from(A.positions, B.positions, B.masses))
+
+
+def orbital_speed(A, B):
+    return corbit.orbits.Vorbit(A.positions, B.positions, A.masses, B.masses)
+
+
+def radial_speed(A, B):
+    return corbit.orbits.Vcen(A.positions, B.positions, A.velocities, B.velocities)
+
+
+def tangential_speed(A, B):
+    return corbit.orbits.Vtan(A.positions, B.positions, A.velocities, B.velocities)
+
+
+def semimajor_axis(A, B):
+    return corbit.orbits.semimajor_axis(A.positions, B.positions, A.velocities, B.velocities, A.masses, B.masses)
+
+
+def eccentricity(A, B):
+    return corbit.orbits.ecc(A.positions, B.positions, A.velocities, B.velocities, A.masses, B.masses)
+
+
+def periapsis(A, B):
+    return corbit.orbits.periapsis(A.positions, B.positions, A.velocities, B.velocities, A.masses, B.masses,
+                                   A.radii, B.radii)
+
+
+def apoapsis(A, B):
+    return corbit.orbits.apoapsis(A.positions, B.positions, A.velocities, B.velocities, A.masses, B.masses,
+                                  A.radii, B.radii)
+
+
+# every channel there is, with its unit. Each one takes the crafts and the references as Bodies, and returns a (P,)
+# array, one for each pair
+CHANNELS = {"altitude": (altitude, m), "speed": (speed, m/s), "acceleration": (acceleration, m/s/s),
+            "orbital_speed": (orbital_speed, m/s), "radial_speed": (radial_speed, m/s),
+            "tangential_speed": (tangential_speed, m/s), "semimajor_axis": (semimajor_axis, m),
+            "eccentricity": (eccentricity, None), "periapsis": (periapsis, m), "apoapsis": (apoapsis, m)}
+# the ones the pilot's HUD shows
+DEFAULT_CHANNELS = ("altitude", "speed", "acceleration", "orbital_speed", "periapsis", "apoapsis")
+
+
+def pair_target(craft, reference):
+    """:return: the TARGET of a WATCH or FORGET command for a pair"""
+    return craft + SEPARATOR + reference
+
+
+class Bodies:
+    """The state of some entities as plain arrays, one row per entity, which is what the channels work on"""
+
+    def __init__(self, entities):
+        self.positions = numpy.array([entity.displacement.asNumber(m) for entity in entities], dtype=float)
+        self.velocities = numpy.array([entity.velocity.asNumber(m/s) for entity in entities], dtype=float)
+        self.accelerations = numpy.array([entity.acceleration.asNumber(m/s/s) for entity in entities], dtype=float)
+        self.masses = numpy.array([entity.mass_fun().asNumber(kg) for entity in entities], dtype=float)
+        self.radii = numpy.array([entity.radius.asNumber(m) for entity in entities], dtype=float)
+
+    def take(self, rows):
+        """:return: a new Bodies with just the given rows, in that order (rows can repeat)"""
+        bodies = Bodies.__new__(Bodies)
+        for name, array in vars(self).items():
+            setattr(bodies, name, array[rows])
+        return bodies
+
+
+class Telemetry:
+    """The server's end. Keeps track of the registered pairs and works out their telemetry"""
+
+    def __init__(self, channels=DEFAULT_CHANNELS):
+        """:param channels: which of CHANNELS to work out, in the order they get published"""
+        for channel in channels:
+            if channel not in CHANNELS:
+                raise ValueError("no telemetry channel called %r, there's %s" % (channel, ", ".join(CHANNELS)))
+        self.channels = list(channels)
+        self.pairs = []  # (craft, reference), in the order they were registered
+
+    def watch(self, craft, reference):
+        if (craft, reference) not in self.pairs:
+            self.pairs.append((craft, reference))
+
+    def forget(self, craft, reference):
+        if (craft, reference) in self.pairs:
+            self.pairs.remove((craft, reference))
+
+    def act_on_command(self, command):
+        """Registers or forgets a pair if command is a WATCH or FORGET command
+        :return: True if it was, False if it's something else
+        """
+        function, target, amount = command
+        if function not in (WATCH, FORGET):
+            return False
+        craft, separator, reference = str(target).partition(SEPARATOR)
+        if separator:
+            (self.watch if function == WATCH else self.forget)(craft, reference)
+        return True
+
+    def compute(self, entities):
+        """Works out every channel for every registered pair whose craft and reference are both in entities
+        :return: a list of (CRAFT, REFERENCE, CHANNEL, VALUE) rows, for Storage.push_telemetry()
+        """
+        by_name = {entity.name: entity for entity in entities}
+        pairs = [(craft, reference) for craft, reference in self.pairs
+                 if craft in by_name and reference in by_name and craft != reference]
+        if not pairs:
+            return []
+        # only the bodies in a pair need turning into arrays, not the whole world
+        names = sorted(set(name for pair in pairs for name in pair))
+        row = {name: i for i, name in enumerate(names)}
+        bodies = Bodies([by_name[name] for name in names])
+        A = bodies.take([row[craft] for craft, reference in pairs])
+        B = bodies.take([row[reference] for craft, reference in pairs])
+
+        rows = []
+        for channel in self.channels:
+            values = CHANNELS[channel][0](A, B)
+            # not every database takes nan
+            for (craft, reference), value in zip(pairs, values.tolist()):
+                rows.append((craft, reference, channel, value if math.isfinite(value) else None))
+        return rows
+
+
+def readings(rows):
+    """Sorts published telemetry out by pair
+    :param rows: what Storage.get_telemetry() returned
+    :return: {(craft, reference): {channel: value}}, each value with its unit on, or None
+    """
+    telemetry = {}
+    for craft, reference, channel, value in rows:
+        unit = CHANNELS[channel][1] if channel in CHANNELS else None
+        if value is not None and unit is not None:
+            value = value * unit
+        telemetry.setdefault((craft, reference), {})[channel] = value
+    return telemetry
+
+
+if __name__ == "__main__":
+    # a HUD-only station: registers a pair with the server, then prints its telemetry whenever it changes. It never
+    # touches an entity. Run it from corbit3/, next to a server using SQLite storage
+    import corbit.storage
+    path = sys.argv[1] if len(sys.argv) > 1 else "corbit.sqlite3"
+    craft = sys.argv[2] if len(sys.argv) > 2 else "Habitat"
+    reference = sys.argv[3] if len(sys.argv) > 3 else "Earth"
+    storage = corbit.storage.SQLiteStorage(path)
+    storage.push_commands([(WATCH, pair_target(craft, reference), None)])
+    previous = None
+    while True:
+        rows = storage.get_telemetry()
+        if rows != previous:
+            for channel, value in readings(rows).get((craft, reference), {}).items():
+                print("%-18s %s" % (channel + ":", value))
+            print()
+            previous = rows
+        time.sleep(0.1)
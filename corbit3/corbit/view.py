@@ -0,0 +1,81 @@
+import bisect
+
+import numpy
+from unum.units import m
+
+# What the camera can see, and where on screen that ends up. Kept apart from corbit.render so none of it needs pygame
+
+BIG_RADIUS = 1e7        # m, bodies bigger than this are always checked by the spatial index, see SpatialIndex
+
+
+def pack_rows(rows):
+    """Copies the positions and radii out of flight table rows (see corbit.mysqlio.entity_row()) into arrays, so they
+    can be worked on all at once. Straight from the rows, since going through entities and their units is slow
+    :return: (positions, radii), an (N, 2) array in m and an (N,) array in m
+    """
+    numbers = numpy.array([row[3:4] + row[7:9] for row in rows], dtype=float).reshape(-1, 3)
+    return numbers[:, 1:3].copy(), numbers[:, 0].copy()
+
+
+class SpatialIndex:
+    """Finds the bodies that overlap a rectangle of the world without looking at every body.
+
+    Bodies are sorted by x, so a query only has to look at the slice of bodies whose x is in range. That only works
+    if you know how far past the edge of the rectangle a body can stick out, so the few bodies bigger than
+    BIG_RADIUS (the Sun, the gas giants) are kept in a separate list that's checked every time.
+    Building one sorts every body, so keep it for as long as the positions don't change.
+    """
+
+    def __init__(self, positions, radii, big_radius=BIG_RADIUS):
+        self.positions = positions
+        self.radii = radii
+
+        big = radii > big_radius
+        self.big = numpy.flatnonzero(big)
+        small = numpy.flatnonzero(~big)
+        order = numpy.argsort(positions[small, 0], kind="stable")
+        self.small = small[order]
+        self.small_x = positions[self.small, 0].tolist()  # a plain list, since bisect is faster on those
+        self.margin = radii[self.small].max() if len(self.small) else 0
+
+    def query(self, left, bottom, right, top):
+        """Returns the indices of all bodies that overlap the rectangle, in ascending order"""
+        start = bisect.bisect_left(self.small_x, left - self.margin)
+        end = bisect.bisect_right(self.small_x, right + self.margin)
+        candidates = numpy.concatenate((self.small[start:end], self.big))
+
+        x = self.positions[candidates, 0]
+        y = self.positions[candidates, 1]
+        r = self.radii[candidates]
+        # closest point of the rectangle to the circle's center, then see if that's inside the circle
+        dx = x - numpy.clip(x, left, right)
+        dy = y - numpy.clip(y, bottom, top)
+        visible = dx * dx + dy * dy <= r * r
+        return numpy.sort(candidates[visible])
+
+
+def world_to_screen(positions, camera_position, zoom_level, screen_size):
+    """Turns world positions into pixel positions, all in one go.
+    y is flipped here, so that y increases upwards on screen like on a cartesian plane, even though pygame's y
+    increases downwards
+    :param positions: (N, 2) array of positions, in m
+    :param camera_position: (x, y) of the camera, in m
+    :param zoom_level: pixels per m
+    :param screen_size: (width, height) of the screen, in pixels
+    :return: (N, 2) array of pixel positions, not rounded
+    """
+    screen_positions = numpy.empty_like(positions)
+    screen_positions[:, 0] = zoom_level * (positions[:, 0] - camera_position[0]) + screen_size[0] / 2
+    screen_positions[:, 1] = screen_size[1] / 2 - zoom_level * (positions[:, 1] - camera_position[1])
+    return screen_positions
+
+
+def view_rectangle(camera, screen_size, origin=(0, 0)):
+    """Returns the (left, bottom, right, top) rectangle of the world that the camera can see, in m
+    :param origin: (x, y) to measure the rectangle from, in m, if positions are relative to something, see
+    corbit.frames
+    """
+    center = camera.displacement.asNumber(m) - origin
+    half_width = screen_size[0] / 2 / camera.zoom_level
+    half_height = screen_size[1] / 2 / camera.zoom_level
+    return center[0] - half_width, center[1] - half_height, center[0] + half_width, center[1] + half_height
@@ -119,6 +119,38 @@ class MissingModule:
             print (message)
 
 
+#lazy import mode. with PYGAME_LAZY_IMPORT set in the environment, the
+#"standard" and "optional" modules below are only imported the first time
+#they are used, e.g. on the first pygame.mixer.init(). PYGAME_EAGER_MODULES
+#is a comma separated list of those modules that still get imported now.
+#remember pygame.init() only initializes modules that are already imported
+_lazy = 'PYGAME_LAZY_IMPORT' in os.environ
+_eager_modules = [name.strip() for name in
+                  os.environ.get('PYGAME_EAGER_MODULES', '').split(',')]
+
+def _eager(name):
+    return not _lazy or name in _eager_modules
+
+#attribute name: (module name, name in module or None for the module, urgent)
+_lazy_attributes = {
+    'math': ('math', None, 1), 'cdrom': ('cdrom', None, 1),
+    'cursors': ('cursors', None, 1), 'display': ('display', None, 1),
+    'draw': ('draw', None, 1), 'event': ('event', None, 1),
+    'image': ('image', None, 1), 'joystick': ('joystick', None, 1),
+    'key': ('key', None, 1), 'mouse': ('mouse', None, 1),
+    'sprite': ('sprite', None, 1), 'threads': ('threads', None, 1),
+    'pixelcopy': ('pixelcopy', None, 1), 'time': ('time', None, 1),
+    'transform': ('transform', None, 1),
+    'mask': ('mask', None, 0), 'Mask': ('mask', 'Mask', 0),
+    'pixelarray': ('pixelarray', None, 0),
+    'PixelArray': ('pixelarray', 'PixelArray', 0),
+    'overlay': ('overlay', None, 0), 'Overlay': ('overlay', 'Overlay', 0),
+    'font': ('font', None, 0), 'mixer': ('mixer', None, 0),
+    'movie': ('movie', None, 0), 'scrap': ('scrap', None, 0),
+    'surfarray': ('surfarray', None, 0), 'sndarray': ('sndarray', None, 0),
+    'fastevent': ('fastevent', None, 0),
+    }
+
 
 #we need to import like this, each at a time. the cleanest way to import
 #our modules is with the import command (not the __import__ function)
@@ -140,45 +172,58 @@ __version__ = ver
 
 #next, the "standard" modules
 #we still allow them to be missing for stripped down pygame distributions
-try: import pygame.math
-except (ImportError,IOError):math=MissingModule("math", geterror(), 1)
+if _eager("math"):
+    try: import pygame.math
+    except (ImportError,IOError):math=MissingModule("math", geterror(), 1)
 
-try: import pygame.cdrom
-except (ImportError,IOError):cdrom=MissingModule("cdrom", geterror(), 1)
+if _eager("cdrom"):
+    try: import pygame.cdrom
+    except (ImportError,IOError):cdrom=MissingModule("cdrom", geterror(), 1)
 
-try: import pygame.cursors
-except (ImportError,IOError):cursors=MissingModule("cursors", geterror(), 1)
+if _eager("cursors"):
+    try: import pygame.cursors
+    except (ImportError,IOError):cursors=MissingModule("cursors", geterror(), 1)
 
-try: import pygame.display
-except (ImportError,IOError):display=MissingModule("display", geterror(), 1)
+if _eager("display"):
+    try: import pygame.display
+    except (ImportError,IOError):display=MissingModule("display", geterror(), 1)
 
-try: import pygame.draw
-except (ImportError,IOError):draw=MissingModule("draw", geterror(), 1)
+if _eager("draw"):
+    try: import pygame.draw
+    except (ImportError,IOError):draw=MissingModule("draw", geterror(), 1)
 
-try: import pygame.event
-except (ImportError,IOError):event=MissingModule("event", geterror(), 1)
+if _eager("event"):
+    try: import pygame.event
+    except (ImportError,IOError):event=MissingModule("event", geterror(), 1)
 
-try: import pygame.image
-except (ImportError,IOError):image=MissingModule("image", geterror(), 1)
+if _eager("image"):
+    try: import pygame.image
+    except (ImportError,IOError):image=MissingModule("image", geterror(), 1)
 
-try: import pygame.joystick
-except (ImportError,IOError):joystick=MissingModule("joystick", geterror(), 1)
+if _eager("joystick"):
+    try: import pygame.joystick
+    except (ImportError,IOError):joystick=MissingModule("joystick", geterror(), 1)
 
-try: import pygame.key
-except (ImportError,IOError):key=MissingModule("key", geterror(), 1)
+if _eager("key"):
+    try: import pygame.key
+    except (ImportError,IOError):key=MissingModule("key", geterror(), 1)
 
-try: import pygame.mouse
-except (ImportError,IOError):mouse=MissingModule("mouse", geterror(), 1)
+if _eager("mouse"):
+    try: import pygame.mouse
+    except (ImportError,IOError):mouse=MissingModule("mouse", geterror(), 1)
 
-try: import pygame.sprite
-except (ImportError,IOError):sprite=MissingModule("sprite", geterror(), 1)
+if _eager("sprite"):
+    try: import pygame.sprite
+    except (ImportError,IOError):sprite=MissingModule("sprite", geterror(), 1)
 
 
-try: import pygame.threads
-except (ImportError,IOError):threads=MissingModule("threads", geterror(), 1)
+if _eager("threads"):
+    try: import pygame.threads
+    except (ImportError,IOError):threads=MissingModule("threads", geterror(), 1)
 
-try: import pygame.pixelcopy
-except (ImportError,IOError):pixelcopy=MissingModule("pixelcopy", geterror(), 1)
+if _eager("pixelcopy"):
+    try: import pygame.pixelcopy
+    except (ImportError,IOError):pixelcopy=MissingModule("pixelcopy", geterror(), 1)
 
 def warn_unwanted_files():
     """ Used to warn about unneeded old files.
@@ -242,71 +287,88 @@ try: from pygame.surface import *
 except (ImportError,IOError):Surface = lambda:Missing_Function
 
 
-try:
-    import pygame.mask
-    from pygame.mask import Mask
-except (ImportError,IOError):Mask = lambda:Missing_Function
+if _eager("mask"):
+    try:
+        import pygame.mask
+        from pygame.mask import Mask
+    except (ImportError,IOError):Mask = lambda:Missing_Function
 
-try: from pygame.pixelarray import *
-except (ImportError,IOError): PixelArray = lambda:Missing_Function
+if _eager("pixelarray"):
+    try: from pygame.pixelarray import *
+    except (ImportError,IOError): PixelArray = lambda:Missing_Function
 
-try: from pygame.overlay import *
-except (ImportError,IOError):Overlay = lambda:Missing_Function
+if _eager("overlay"):
+    try: from pygame.overlay import *
+    except (ImportError,IOError):Overlay = lambda:Missing_Function
 
-try: import pygame.time
-except (ImportError,IOError):time=MissingModule("time", geterror(), 1)
+if _eager("time"):
+    try: import pygame.time
+    except (ImportError,IOError):time=MissingModule("time", geterror(), 1)
 
-try: import pygame.transform
-except (ImportError,IOError):transform=MissingModule("transform", geterror(), 1)
+if _eager("transform"):
+    try: import pygame.transform
+    except (ImportError,IOError):transform=MissingModule("transform", geterror(), 1)
 
 #lastly, the "optional" pygame modules
-if 'PYGAME_FREETYPE' in os.environ:
-    try:
-        import pygame.ftfont as font
-        sys.modules['pygame.font'] = font
-    except (ImportError,IOError): pass
-try:
+def _import_font():
+    import os, sys, pygame
+    if 'PYGAME_FREETYPE' in os.environ:
+        try:
+            import pygame.ftfont as font
+            sys.modules['pygame.font'] = font
+        except (ImportError,IOError): pass
     import pygame.font
     import pygame.sysfont
     pygame.font.SysFont = pygame.sysfont.SysFont
     pygame.font.get_fonts = pygame.sysfont.get_fonts
     pygame.font.match_font = pygame.sysfont.match_font
-except (ImportError,IOError):font=MissingModule("font", geterror(), 0)
+    return pygame.font
 
-# try and load pygame.mixer_music before mixer, for py2app...
-try:
-    import pygame.mixer_music
-    #del pygame.mixer_music
-    #print ("NOTE2: failed importing pygame.mixer_music in lib/__init__.py")
-except (ImportError,IOError):
-    pass
+if _eager("font"):
+    try: font = _import_font()
+    except (ImportError,IOError):font=MissingModule("font", geterror(), 0)
 
-try: import pygame.mixer
-except (ImportError,IOError):mixer=MissingModule("mixer", geterror(), 0)
+if _eager("mixer"):
+    # try and load pygame.mixer_music before mixer, for py2app...
+    try:
+        import pygame.mixer_music
+        #del pygame.mixer_music
+        #print ("NOTE2: failed importing pygame.mixer_music in lib/__init__.py")
+    except (ImportError,IOError):
+        pass
+
+    try: import pygame.mixer
+    except (ImportError,IOError):mixer=MissingModule("mixer", geterror(), 0)
 
-try: import pygame.movie
-except (ImportError,IOError):movie=MissingModule("movie", geterror(), 0)
+if _eager("movie"):
+    try: import pygame.movie
+    except (ImportError,IOError):movie=MissingModule("movie", geterror(), 0)
 
 #try: import pygame.movieext
 #except (ImportError,IOError):movieext=MissingModule("movieext", geterror(), 0)
 
-try: import pygame.scrap
-except (ImportError,IOError):scrap=MissingModule("scrap", geterror(), 0)
+if _eager("scrap"):
+    try: import pygame.scrap
+    except (ImportError,IOError):scrap=MissingModule("scrap", geterror(), 0)
 
-try: import pygame.surfarray
-except (ImportError,IOError):surfarray=MissingModule("surfarray", geterror(), 0)
+if _eager("surfarray"):
+    try: import pygame.surfarray
+    except (ImportError,IOError):surfarray=MissingModule("surfarray", geterror(), 0)
 
-try: import pygame.sndarray
-except (ImportError,IOError):sndarray=MissingModule("sndarray", geterror(), 0)
+if _eager("sndarray"):
+    try: import pygame.sndarray
+    except (ImportError,IOError):sndarray=MissingModule("sndarray", geterror(), 0)
 
-try: import pygame.fastevent
-except (ImportError,IOError):fastevent=MissingModule("fastevent", geterror(), 0)
+if _eager("fastevent"):
+    try: import pygame.fastevent
+    except (ImportError,IOError):fastevent=MissingModule("fastevent", geterror(), 0)
 
 #there's also a couple "internal" modules not needed
 #by users, but putting them here helps "dependency finder"
 #programs get everything they need (like py2exe)
-try: import pygame.imageext; del pygame.imageext
-except (ImportError,IOError):pass
+if _eager("imageext"):
+    try: import pygame.imageext; del pygame.imageext
+    except (ImportError,IOError):pass
 
 def packager_imports():
     """
@@ -345,5 +407,49 @@ copy_reg.pickle(Color, __color_reduce, __color_constructor)
 
 
 
+#in lazy import mode, pygame's module object is swapped for one that
+#imports the modules that weren't imported above when they are first used
+class _LazyModule(type(sys)):
+    def __getattr__(self, name):
+        try:
+            modulename, attribute, urgent = _lazy_attributes[name]
+        except KeyError:
+            raise AttributeError("module 'pygame' has no attribute '%s'" % name)
+        value = _import_lazily(modulename, attribute, urgent)
+        setattr(self, name, value)
+        return value
+
+def _import_lazily(modulename, attribute, urgent):
+    import importlib
+    from pygame.compat import geterror
+    try:
+        if modulename == 'font':
+            module = _import_font()
+        else:
+            if modulename == 'mixer':
+                try: importlib.import_module('pygame.mixer_music')
+                except (ImportError,IOError): pass
+            module = importlib.import_module('pygame.' + modulename)
+    except (ImportError,IOError):
+        if attribute is not None:
+            return lambda:Missing_Function
+        return _MissingModule(modulename, geterror(), urgent)
+    if attribute is not None:
+        return getattr(module, attribute)
+    return module
+
+_MissingModule = MissingModule
+
+if _lazy:
+    try:
+        sys.modules[__name__].__class__ = _LazyModule
+    except TypeError:
+        #module classes can't be swapped before python 3.5, so just
+        #import everything now
+        for _name, (_modulename, _attribute, _urgent) in _lazy_attributes.items():
+            if _name not in globals():
+                globals()[_name] = _import_lazily(_modulename, _attribute, _urgent)
+        del _name, _modulename, _attribute, _urgent
+
 #cleanup namespace
 del pygame, os, sys, surflock, MissingModule, copy_reg, geterror
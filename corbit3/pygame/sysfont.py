@@ -485,8 +485,107 @@ def initsysfonts_unix(path = "fc-list"):
 
 
 
-#create alias entries
-def create_aliases():
+#on-disk cache of what fc-list found, so startup doesn't have to wait for it.
+#the cache is keyed by the modification times of all the font directories,
+#the same thing fontconfig itself uses to decide if its own cache is stale.
+_unix_font_roots = ['/usr/share/fonts', '/usr/local/share/fonts',
+                    '/usr/X11R6/lib/X11/fonts', '~/.fonts',
+                    os.path.join(os.environ.get('XDG_DATA_HOME', '~/.local/share'),
+                                 'fonts')]
+_unix_cache_version = 1
+
+def _unix_cache_path():
+    cachedir = os.environ.get('XDG_CACHE_HOME', '~/.cache')
+    return os.path.join(os.path.expanduser(cachedir), 'pygame',
+                        'sysfont-cache.json')
+
+def _unix_font_dirs_key():
+    key = []
+    for root in _unix_font_roots:
+        root = os.path.expanduser(root)
+        for dirpath, dirnames, filenames in os.walk(root):
+            try:
+                key.append([dirpath, os.stat(dirpath).st_mtime])
+            except OSError:
+                pass
+    return key
+
+def _read_unix_cache():
+    import json
+    try:
+        with open(_unix_cache_path(), 'r') as cachefile:
+            cache = json.load(cachefile)
+        if cache['version'] != _unix_cache_version:
+            return None, None
+        fonts = {}
+        for name, styles in cache['fonts'].items():
+            for bold, italic, filename in styles:
+                _addfont(name, bold, italic, filename, fonts)
+        return cache['key'], fonts
+    except Exception:
+        return None, None
+
+def _write_unix_cache(key, fonts):
+    import json
+    cache = {'version': _unix_cache_version, 'key': key, 'fonts': {}}
+    for name, styles in fonts.items():
+        cache['fonts'][name] = [[bold, italic, filename]
+                                for (bold, italic), filename in styles.items()]
+    path = _unix_cache_path()
+    try:
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        #write then rename, so another process never reads half a file
+        with open(path + '.tmp', 'w') as cachefile:
+            json.dump(cache, cachefile)
+        os.rename(path + '.tmp', path)
+    except Exception:
+        pass
+
+def _refresh_unix_cache(cached_key):
+    global Sysfonts, Sysalias
+
+    key = _unix_font_dirs_key()
+    if key == cached_key:
+        return
+    fonts = initsysfonts_unix()
+    if fonts:
+        #SysFont() and match_font() can be looking fonts up in the main
+        #thread right now, so the new tables are built on the side and
+        #swapped in whole, never changed in place
+        aliases = {}
+        create_aliases(fonts, aliases)
+        Sysfonts, Sysalias = fonts, aliases
+    _write_unix_cache(key, fonts)
+
+_unix_cached_key = None
+
+#read the fonts on unix, from the cache if there is one
+def initsysfonts_unix_cached():
+    global _unix_cached_key
+
+    key, fonts = _read_unix_cache()
+    if fonts is None:
+        #no cache yet, nothing for it but to run fc-list now
+        key = _unix_font_dirs_key()
+        fonts = initsysfonts_unix()
+        _write_unix_cache(key, fonts)
+        return fonts
+
+    #the cache gets used right away, and initsysfonts() checks it is
+    #still good in the background
+    _unix_cached_key = key
+    return fonts
+
+
+
+#create alias entries, in Sysalias for the fonts in Sysfonts unless
+#other tables are given
+def create_aliases(fonts=None, into=None):
+    if fonts is None:
+        fonts = Sysfonts
+    if into is None:
+        into = Sysalias
     aliases = (
         ('monospace', 'misc-fixed', 'courier', 'couriernew', 'console',
          'fixed', 'mono', 'freemono', 'bitstreamverasansmono',
@@ -502,15 +601,15 @@ def create_aliases():
         found = None
         fname = None
         for name in set:
-            if name in Sysfonts:
-                found = Sysfonts[name]
+            if name in fonts:
+                found = fonts[name]
                 fname = name
                 break
         if not found:
             continue
         for name in set:
-            if name not in Sysfonts:
-                Sysalias[name] = found
+            if name not in fonts:
+                into[name] = found
 
 
 Sysfonts = {}
@@ -523,11 +622,19 @@ def initsysfonts():
     elif sys.platform == 'darwin':
         fonts = initsysfonts_darwin()
     else:
-        fonts = initsysfonts_unix()
+        fonts = initsysfonts_unix_cached()
     Sysfonts.update(fonts)
     create_aliases()
     if not Sysfonts: #dummy so we don't try to reinit
         Sysfonts[None] = None
+    if _unix_cached_key is not None:
+        #if the cache turns out to be stale, fc-list gets run in the
+        #background and Sysfonts is replaced when it's done
+        import threading
+        refresh = threading.Thread(target=_refresh_unix_cache,
+                                   args=(_unix_cached_key,))
+        refresh.daemon = True
+        refresh.start()
 
 
 # pygame.font specific declarations
@@ -1,18 +1,26 @@
 #! /usr/bin/env python3
 
 __version__ = "3.0.0"
+import time
+launch_time = time.time()  # for measuring how long it takes to get to the first tick
+import os
 import corbit.network
 import corbit.physics
 import corbit.objects
 import corbit.mysqlio
-import scipy
+import corbit.storage
+import corbit.commands
+import corbit.lockstep
+import corbit.particles
+import corbit.ephemeris
+import corbit.telemetry
+import corbit.parallel
+import corbit.frames
+import corbit.batch
 import unum.units as un
-import time
 import itertools
-import math
-import socket
 import threading
-import copy
+import atexit
 
 print("Corbit SERVER " + __version__)
 
@@ -22,10 +30,74 @@ ADDRESS = "localhost"
 time_acc_index = 0
 ticks_per_second = 60 * un.Hz # also see: time_per_tick()
 time_acceleration = [1, 5, 10, 50, 100, 1000, 10000, 100000] # used in time_per_tick()
+LOCKSTEP = False  # deterministic mode, pilots replay the command log instead of reading every tick. Set it in client.py too
+EPHEMERIS = False  # move planets and moons along a precomputed ephemeris instead of integrating them, if there is one
+PARALLEL_GRAVITY = 0  # worker processes to work out gravity in with corbit.parallel, 0 to do it here pair by pair.
+                      # Only worth it with thousands of entities
+simulation_time = 0.0  # s simulated since the save was loaded, which is where the ephemeris is looked up
+tick = 0  # how many ticks have been simulated since the server started
+# massless particles that get added when a save is loaded, as (parent, inner radius, outer radius, count, color)
+PARTICLE_RINGS = [("Saturn", 7.4e7, 1.4e8, 10000, (210, 190, 150))]
+PARTICLE_PUBLISH_INTERVAL = 6  # ticks between publishing the particles, they're only for looking at
+PUBLISH_PARTICLES = True  # False if no pilot draws particles (see DRAW_PARTICLES in client.py), then they're not
+                          # moved or published at all
+SOI_CHECK_INTERVAL = 60  # ticks between checking which sphere of influence everything is in, see corbit.frames
+# benchmarks/startup.py runs the server with these set, so it's timing the real thing: CORBIT_SQLITE is a file to use
+# SQLiteStorage in instead of MySQL, and CORBIT_STARTUP_ONLY stops the server after its first tick. Set them in the
+# pilot's environment too
+SQLITE_FILE = os.environ.get("CORBIT_SQLITE")
+STARTUP_ONLY = "CORBIT_STARTUP_ONLY" in os.environ
+# the numbers worked out for every pilot's HUD, see corbit.telemetry. Pilots register the pairs they want, the usual
+# control craft and reference are always there
+TELEMETRY_CHANNELS = corbit.telemetry.DEFAULT_CHANNELS
+TELEMETRY_PUBLISH_INTERVAL = 6  # ticks between publishing telemetry, nobody reads numbers faster than that
+telemetry = corbit.telemetry.Telemetry(TELEMETRY_CHANNELS)
+telemetry.watch(corbit.objects.control, corbit.objects.reference)
 
 with open("saves/OCESS.json", "r") as loadfile:
     entities = corbit.mysqlio.load_json(loadfile)
-corbit.mysqlio.flush_db(entities, (ADDRESS, "root", "3.1415pi", "corbit"))
+# where the world gets published and commands get picked up, see corbit.storage.
+# The pilots have to use the same kind of storage
+# everything published in a tick goes out in one commit, raise commit_interval to commit even less often
+if SQLITE_FILE:
+    storage = corbit.storage.SQLiteStorage(SQLITE_FILE)
+else:
+    storage = corbit.storage.MySQLStorage((ADDRESS, "root", "3.1415pi", "corbit"), commit_interval=1)
+#storage = corbit.storage.SQLiteStorage("corbit.sqlite3")  # no MySQL server needed, but pilots have to be on this machine
+# pilots on this machine get the world straight out of shared memory, pilots anywhere else still get it from storage
+storage = corbit.storage.SharedMemoryStorage(storage, server=True)
+storage.flush()
+
+
+def make_particles(entities):
+    "Makes the PARTICLE_RINGS around whichever of their parents are in entities"
+    particles = corbit.particles.Particles()
+    for parent, inner, outer, count, color in PARTICLE_RINGS:
+        parent = corbit.objects.find_entity(parent, entities)
+        if parent is not None:
+            particles.add(*corbit.particles.ring(parent, inner, outer, count, color))
+    return particles
+
+particles = make_particles(entities)
+
+
+def load_ephemeris(save_file, entities):
+    "Loads the ephemeris built for a save file with corbit.ephemeris, or returns None if there isn't a usable one"
+    if not EPHEMERIS:
+        return None
+    try:
+        ephemeris = corbit.ephemeris.Ephemeris.load(corbit.ephemeris.ephemeris_file(save_file))
+    except IOError:
+        print("no ephemeris for", save_file + ", integrating everything. Build one with: python -m corbit.ephemeris",
+              save_file)
+        return None
+    names = set(entity.name for entity in entities)
+    if not names.issuperset(ephemeris.names):
+        print("the ephemeris for", save_file, "doesn't match it, integrating everything")
+        return None
+    return ephemeris
+
+ephemeris = load_ephemeris("saves/OCESS.json", entities)
 
 
 def time_per_tick():
@@ -35,7 +107,6 @@ def time_per_tick():
 def accelerate_time(amount):
     "Increases how much time is simulated per tick of the server program"
     global time_acc_index
-    global time_acceleration
 
     if time_acc_index + amount < 0:
         return
@@ -49,68 +120,194 @@ def accelerate_time(amount):
 
 def act_on_piloting_commands(commands):
     global entities
+    global particles
+    global ephemeris
+    global simulation_time
 
     for command in commands:
         function, target, amount = command
-        if function == "fire verniers":
-            corbit.objects.oneshot_vernier_thrusters(
-                corbit.objects.find_entity(name, entities), amount, time_per_tick())
-        elif function == "change_engines":
-            corbit.objects.find_entity(name, entities).main_engines.usage += amount
-        elif function == "fire_rcs":
-            direction = amount
-            target_entity = corbit.objects.find_entity(target, entities)
-            rcs_thrust = target.rcs.thrust(time_per_tick())
-            theta = direction + target.angular_position
-            rcs_thrust_vector = un.N * scipy.array((math.cos(theta) * rcs_thrust.asNumber(),
-                                                    math.sin(theta) * rcs_thrust.asNumber()))
-            for angle in target.rcs.engine_positions:
-                target.accelerate(rcs_thrust_vector / len(target.rcs.engine_positions), angle)
+        if corbit.commands.apply(entities, command, time_per_tick()):
+            pass  # it flew something
+        elif function == corbit.commands.ACKNOWLEDGE:
+            applied[target] = int(amount)
+        elif telemetry.act_on_command(command):
+            pass  # someone wants telemetry for another pair, or doesn't anymore
         elif function == "accelerate_time":
                 accelerate_time(int(amount))
         elif function == "open":
                 filename = target
                 with open(filename, "r") as loadfile:
                     entities = corbit.mysqlio.load_json(loadfile)
+                particles = make_particles(entities)
+                ephemeris = load_ephemeris(filename, entities)
+                simulation_time = 0.0
+
+# pilot -> number of its last acknowledge command, see corbit.commands. Once the commands before it have been applied
+# they go in applied, once they've been simulated for a tick they go in simulated, and once they've been published
+# along with the entities they go in published
+applied = {}
+simulated = {}
+published = {}
+
+
+def publish_acknowledgements():
+    """Publishes how far through their commands every pilot is, called right after publishing the entities"""
+    for pilot, seq in simulated.items():
+        if published.get(pilot) != seq:
+            storage.push_acknowledgement(pilot, seq, time_per_tick().asNumber(un.s))
+            published[pilot] = seq
+
+
+def publish_telemetry():
+    """Publishes every registered pair's telemetry in one go, every TELEMETRY_PUBLISH_INTERVAL ticks. Has to be called
+    once gravity's been added to the accelerations, and before resolve_collisions() uses them up, or the acceleration
+    channel would always be 0 minus the reference's pull. Positions and velocities are still the ones published as
+    the entities this tick
+    """
+    if tick % TELEMETRY_PUBLISH_INTERVAL == 0:
+        storage.push_telemetry(telemetry.compute(entities))
+
+gravity_pool = None  # the corbit.parallel.ParallelGravity, once there is one
+
+
+def parallel_gravity(entities):
+    "Every entity's acceleration from every other one, in m/s/s, worked out by the PARALLEL_GRAVITY workers"
+    global gravity_pool
+    if gravity_pool is None or gravity_pool.capacity < len(entities):
+        # opening a bigger world needs a bigger pool
+        close_gravity_pool()
+        gravity_pool = corbit.parallel.ParallelGravity(2 * len(entities), PARALLEL_GRAVITY)
+    return corbit.parallel.entity_gravity(gravity_pool, entities)
+
+
+def close_gravity_pool():
+    "Stops the workers and frees their shared memory, which would otherwise outlive the server"
+    global gravity_pool
+    if gravity_pool is not None:
+        gravity_pool.close()
+        gravity_pool = None
+
+atexit.register(close_gravity_pool)
 
 ticks_to_simulate = 1
 def ticker():
     global ticks_to_simulate
     ticks_to_simulate += 1
-    threading.Timer(time_per_tick().asNumber(un.s), ticker).start()
+    timer = threading.Timer(time_per_tick().asNumber(un.s), ticker)
+    timer.daemon = True  # so it doesn't keep the server running once the main loop's stopped
+    timer.start()
 
 ticker()
 
+command_schedule = corbit.lockstep.CommandSchedule()  # only used in LOCKSTEP mode
+published_particles = None  # how many particles were published last time, None before the first time
+frames = None  # the entities' reference frame tree, which keeps track of who's in whose sphere of influence
+
 while True:
     if ticks_to_simulate <= 0:
-        act_on_piloting_commands(corbit.mysqlio.pop_commands())
+        if LOCKSTEP:
+            # commands don't get applied right away, that would depend on when exactly they arrived.
+            # Instead they're pinned to a tick, and that tick is published along with them
+            command_schedule.schedule(tick + corbit.lockstep.COMMAND_DELAY, storage.pop_commands())
+        else:
+            act_on_piloting_commands(storage.pop_commands())
     else:
         start_time = time.time()
 
-        corbit.mysqlio.push_entities(entities)
+        # particles don't pull on anything, so they're moved the same way in both modes, from where the entities are
+        # at the start of the tick. They aren't part of the lockstep state either, they're just for looking at
+        if PUBLISH_PARTICLES:
+            particles.step_with(entities, time_per_tick())
+            # a world without any only needs that publishing once
+            if tick % PARTICLE_PUBLISH_INTERVAL == 0 and (len(particles) or published_particles != 0):
+                storage.push_particles(particles)
+                published_particles = len(particles)
+        if ephemeris is not None and not ephemeris.covers(simulation_time + time_per_tick().asNumber(un.s)):
+            print("ran off the end of the ephemeris, integrating everything from now on")
+            ephemeris = None
 
-        for A, B in itertools.combinations(entities, 2):
-            gravity = corbit.physics.gravitational_force(A, B)
-            theta = corbit.physics.angle(A, B)
-            A.accelerate(gravity, theta)
-            B.accelerate(-gravity, theta)
+        if LOCKSTEP:
+            entities = corbit.lockstep.canonical_order(entities)
+            if tick % corbit.lockstep.HASH_INTERVAL == 0:
+                # the full state only goes out every so often, so new clients have something to start from.
+                # It's the state at the start of the tick, before this tick's commands
+                storage.push_entities(entities)
+                publish_acknowledgements()
+                storage.push_state_hash(tick, corbit.lockstep.state_hash(entities))
+            commands = command_schedule.due(tick)
+            # the server's own commands go first, since they can change how long this tick is or load a new world.
+            # Then the crafts get flown for exactly as long as every replica will fly them, see corbit.lockstep
+            act_on_piloting_commands([command for command in commands
+                                      if command[0] not in corbit.commands.CRAFT_COMMANDS])
+            entities = corbit.lockstep.canonical_order(entities)
+            corbit.lockstep.act_on_commands(entities, commands, time_per_tick())
+            storage.push_command_log(tick, commands + [(corbit.lockstep.TICK_TIME, None,
+                                                        time_per_tick().asNumber(un.s))])
+            corbit.lockstep.step(entities, time_per_tick(), after_gravity=publish_telemetry)
+        elif ephemeris is not None:
+            storage.push_entities(entities)
+            publish_acknowledgements()
 
-        collisions = []
-        for A, B in itertools.combinations(entities, 2):
-            affected_objects = corbit.physics.resolve_collision(A, B, time_per_tick())
-            if affected_objects is not None:
-                collisions += affected_objects
+            # only the habitats (and anything else not on the ephemeris) need integrating. Bodies on the ephemeris
+            # pull on them but don't get pulled, they're put straight where the ephemeris says at the end of the tick
+            free = [entity for entity in entities if entity.name not in ephemeris.index]
+            fixed = [entity for entity in entities if entity.name in ephemeris.index]
+            if PARALLEL_GRAVITY:
+                for entity, acceleration in zip(entities, parallel_gravity(entities)):
+                    if entity.name not in ephemeris.index:
+                        entity.acceleration += un.m / un.s / un.s * acceleration
+            else:
+                for A, B in itertools.combinations(free, 2):
+                    gravity = corbit.physics.gravitational_force(A, B)
+                    theta = corbit.physics.angle(A, B)
+                    A.accelerate(gravity, theta)
+                    B.accelerate(-gravity, theta)
+                for A, B in itertools.product(free, fixed):
+                    A.accelerate(corbit.physics.gravitational_force(A, B), corbit.physics.angle(A, B))
 
-        for entity in entities:
-            already_moved = False
-            for name in collisions:
-                if entity.name == name:
-                    already_moved = True
+            publish_telemetry()
+            corbit.physics.resolve_collisions(entities, time_per_tick())
+            ephemeris.apply(entities, simulation_time + time_per_tick().asNumber(un.s))
+        else:
+            storage.push_entities(entities)
+            publish_acknowledgements()
 
-            if not already_moved:
-                entity.move(time_per_tick())
+            if PARALLEL_GRAVITY:
+                # gravity always pulls straight through the middle, so it never spins anything, and just adds up
+                for entity, acceleration in zip(entities, parallel_gravity(entities)):
+                    entity.acceleration += un.m / un.s / un.s * acceleration
+            else:
+                for A, B in itertools.combinations(entities, 2):
+                    gravity = corbit.physics.gravitational_force(A, B)
+                    theta = corbit.physics.angle(A, B)
+                    A.accelerate(gravity, theta)
+                    B.accelerate(-gravity, theta)
 
+            publish_telemetry()
+            corbit.physics.resolve_collisions(entities, time_per_tick())
+
+        if tick % SOI_CHECK_INTERVAL == 0:
+            world = corbit.batch.World.from_entities(entities)
+            if frames is None or frames.names != world.names:
+                frames = corbit.frames.Frames(world)  # a new world, or a new order
+            else:
+                for i in frames.update(world):
+                    print(frames.names[i], "is now in the sphere of influence of", frames.parent(frames.names[i]))
+
+        # whatever was applied before or during this tick has been simulated now
+        simulated.update(applied)
+        applied.clear()
+        storage.end_tick()
+        simulation_time += time_per_tick().asNumber(un.s)
+        if tick == 0:
+            print("First tick done in", time.time() - launch_time, "s")
+            if STARTUP_ONLY:
+                break
+        tick += 1
         ticks_to_simulate -= 1  # ticks_to_simulate is incremented in the ticker() function every tick
         if ticks_to_simulate <= 0:
             time.sleep(max(time_per_tick().asNumber(un.s) - (time.time() - start_time),
                            0))
+
+# only reached with STARTUP_ONLY. Takes the shared memory down, so pilots started afterwards use SQLITE_FILE
+storage.close()
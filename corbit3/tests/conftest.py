@@ -0,0 +1,69 @@
+import os
+import sys
+
+import pytest
+
+# the tests run from corbit3/, like server.py and client.py, so that saves/ and corbit are where they expect
+CORBIT3 = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, CORBIT3)
+
+import corbit.mysqlio
+import corbit.objects
+import corbit.storage
+
+# MySQL is only checked if CORBIT_MYSQL is set to host,user,password,database, and that database gets emptied out!
+MYSQL = os.environ.get("CORBIT_MYSQL")
+
+
+@pytest.fixture(autouse=True)
+def in_corbit3(monkeypatch):
+    monkeypatch.chdir(CORBIT3)
+
+
+@pytest.fixture
+def ocess():
+    """:return: the entities of OCESS.json"""
+    with open(os.path.join(CORBIT3, "saves", "OCESS.json"), "r") as loadfile:
+        return corbit.mysqlio.load_json(loadfile)
+
+
+@pytest.fixture
+def small_world(ocess):
+    """:return: a few entities of OCESS.json, for tests that simulate with the server's slow unit-checked physics"""
+    return [corbit.objects.find_entity(name, ocess) for name in ("Earth", "Moon", "Habitat", "AYSE")]
+
+
+def copy(entities):
+    """:return: new entities, the same as entities, like the ones that come back from storage"""
+    return [corbit.mysqlio.row_entity(corbit.mysqlio.entity_row(entity)) for entity in entities]
+
+
+def empty_storage(kind, directory):
+    """Yields an empty corbit.storage backend, and closes it afterwards. For storage fixtures
+    :param kind: "memory", "sqlite", "shared memory", "mysql" or "mysql, batched"
+    :param directory: where to put a SQLite file
+    """
+    if kind.startswith("mysql") and not MYSQL:
+        pytest.skip("set CORBIT_MYSQL=host,user,password,database to check MySQL")
+    if kind == "memory":
+        storage = corbit.storage.MemoryStorage()
+    elif kind == "sqlite":
+        storage = corbit.storage.SQLiteStorage(os.path.join(str(directory), "corbit.sqlite3"))
+    elif kind == "shared memory":
+        storage = corbit.storage.SharedMemoryStorage(corbit.storage.MemoryStorage(), server=True,
+                                                     name="corbit-test-%d" % os.getpid())
+    else:
+        storage = corbit.storage.MySQLStorage(tuple(MYSQL.split(",")),
+                                              commit_interval=10 if kind.endswith("batched") else None)
+    try:
+        storage.flush()
+        yield storage
+    finally:
+        if hasattr(storage, "close"):
+            storage.close()
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def storage(request, tmp_path):
+    """:return: an empty backend of each kind that doesn't need a database server, see empty_storage()"""
+    yield from empty_storage(request.param, tmp_path)
@@ -0,0 +1,18 @@
+import numpy
+
+import corbit.batch
+import corbit.mysqlio
+
+
+def test_world_from_rows_matches_from_entities(ocess):
+    rows = [corbit.mysqlio.entity_row(entity) for entity in ocess]
+    from_rows = corbit.batch.World.from_rows(rows)
+    from_entities = corbit.batch.World.from_entities(ocess)
+    assert from_rows.names == from_entities.names
+    for name in ("masses", "radii", "positions", "velocities"):
+        assert numpy.array_equal(getattr(from_rows, name), getattr(from_entities, name)), name
+
+
+def test_world_from_no_rows():
+    world = corbit.batch.World.from_rows([])
+    assert world.positions.shape == (0, 2) and len(world.masses) == 0
@@ -0,0 +1,75 @@
+import math
+
+import pytest
+from unum.units import m, s
+
+import corbit.commands
+import corbit.mysqlio
+import corbit.objects
+from conftest import copy
+
+
+def server_tick(entity, command, time):
+    """What the server does to a craft on a tick with one command in it, without gravity"""
+    entity, = copy([entity])
+    entity.acceleration = 0 * entity.acceleration
+    entity.angular_acceleration = 0 * entity.angular_acceleration
+    corbit.commands.apply([entity], command, time)
+    entity.velocity += entity.acceleration * time
+    entity.angular_speed += entity.angular_acceleration * time
+    return entity
+
+
+def test_sends_end_with_an_acknowledgement():
+    own = corbit.commands.OwnCommands("pilot")
+    assert own.send([("fire_rcs", "Habitat", 0)]) == [("fire_rcs", "Habitat", 0), ("acknowledge", "pilot", 1)]
+    assert own.send([]) == [("acknowledge", "pilot", 2)]
+
+
+def test_only_craft_commands_are_applied(small_world):
+    assert not corbit.commands.apply(small_world, ("accelerate_time", None, 1), 1 / 60 * s)
+    moon = corbit.objects.find_entity("Moon", small_world)
+    velocity = moon.velocity
+    # the Moon's not a craft, so there's nothing to fly
+    assert corbit.commands.apply(small_world, ("fire_rcs", "Moon", 0), 1 / 60 * s)
+    assert (moon.velocity == velocity).all()
+
+
+def test_own_commands_show_straight_away(small_world):
+    own = corbit.commands.OwnCommands("pilot")
+    command = ("fire_rcs", "Habitat", math.pi / 2)
+    own.send([command])
+    habitat = corbit.objects.find_entity("Habitat", small_world)
+    velocity = habitat.velocity
+    predicted = own.predict(small_world, None)
+    shown = corbit.objects.find_entity("Habitat", predicted)
+    # a copy of the habitat, moving the way it will once the server gets to the command. The rest are left alone
+    assert shown is not habitat
+    assert all(a is b for a, b in zip(small_world, predicted) if a.name != "Habitat")
+    expected = server_tick(habitat, command, corbit.commands.TICK_TIME * s)
+    assert (shown.velocity - expected.velocity).asNumber(m / s) == pytest.approx([0, 0], abs=1e-9)
+    assert (shown.velocity != velocity).any()
+    # the server's habitat is left as it was
+    assert (habitat.velocity == velocity).all()
+
+
+def test_acknowledged_commands_stop_being_shown(small_world):
+    own = corbit.commands.OwnCommands("pilot")
+    own.send([("fire_rcs", "Habitat", 0)])
+    own.send([("fire_verniers", "Habitat", 1)])
+    # the server's done the first batch, and says its ticks are 10 times as long
+    predicted = own.predict(small_world, (1, 10 / 60))
+    assert own.tick_time == 10 / 60
+    assert [seq for seq, commands in own.pending] == [2]
+    shown = corbit.objects.find_entity("Habitat", predicted)
+    assert shown.angular_speed != corbit.objects.find_entity("Habitat", small_world).angular_speed
+
+    # and once it's done the second one, the server's entities are shown as they are
+    assert own.predict(small_world, (2, 10 / 60)) is small_world
+    assert own.pending == []
+
+
+def test_server_commands_arent_shown(small_world):
+    own = corbit.commands.OwnCommands("pilot")
+    own.send([("accelerate_time", None, 1), ("open", "saves/OCESS.json", None)])
+    assert own.predict(small_world, None) is small_world
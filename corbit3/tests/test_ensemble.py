@@ -0,0 +1,63 @@
+import math
+
+import numpy
+import pytest
+
+import corbit.batch
+import corbit.ensemble
+
+EARTH_MU = corbit.batch.G * 6e24
+R = 7e6  # m, the craft's circular orbit
+
+
+def low_orbit():
+    """Earth, and a craft on a circular orbit just above it"""
+    return corbit.batch.World(["Earth", "Craft"], [6e24, 1e3], [6.4e6, 10.0], [[0, 0], [R, 0]],
+                              [[0, 0], [0, math.sqrt(EARTH_MU / R)]])
+
+
+def test_every_member_moves_like_the_world(ocess):
+    world = corbit.batch.World.from_entities(ocess)
+    ensemble = corbit.ensemble.Ensemble(world, 3)
+    times, positions, _ = corbit.batch.propagate(ensemble, 600.0, 60)
+    _, expected, _ = corbit.batch.propagate(world.copy(), 600.0, 60)
+    assert positions.shape == (61, 3, len(world.names), 2)
+    for member in range(3):
+        assert numpy.allclose(positions[:, member], expected, rtol=1e-12)
+
+
+def test_nothing_scattered_means_nothing_hit():
+    ensemble = corbit.ensemble.Ensemble(low_orbit(), 4)
+    summary = corbit.ensemble.run(ensemble, "Craft", "Earth", 6000.0, steps=3000)
+    assert summary.collision_probability() == 0
+    assert summary.collided_with == [None] * 4
+    assert numpy.isnan(summary.collision_time).all()
+    assert summary.periapsis == pytest.approx(R, rel=1e-3)
+
+
+def test_deorbit_burn_with_errors():
+    # about 170 m/s slower brings periapsis down to the surface, so roughly the members that burn too hard hit
+    ensemble = corbit.ensemble.Ensemble(low_orbit(), 64)
+    ensemble.burn("Craft", (0, -170.0), magnitude_sigma=0.3, seed=0)
+    summary = corbit.ensemble.run(ensemble, "Craft", "Earth", 6000.0, steps=6000)
+    assert 0 < summary.collision_probability("Earth") < 1
+    assert summary.collision_probability() == summary.collision_probability("Earth")
+    hit = numpy.array([name is not None for name in summary.collided_with])
+    touching = 6.4e6 + 10.0
+    # periapsis only counts up to the collision, so the ones that hit only just got inside
+    assert (summary.periapsis[hit] <= touching).all() and (summary.periapsis[hit] > 0.99 * touching).all()
+    assert (summary.periapsis[~hit] > touching).all()
+    assert (summary.collision_time[hit] > 0).all() and (summary.collision_time[hit] < 6000).all()
+    low, middle, high = summary.periapsis_percentiles()
+    assert low <= middle <= high
+
+
+def test_scatter_is_repeatable():
+    first = corbit.ensemble.Ensemble(low_orbit(), 8)
+    second = corbit.ensemble.Ensemble(low_orbit(), 8)
+    first.scatter("Craft", position_sigma=10.0, velocity_sigma=1.0, seed=3)
+    second.scatter("Craft", position_sigma=10.0, velocity_sigma=1.0, seed=3)
+    assert numpy.array_equal(first.velocities, second.velocities)
+    # only the craft moves, and differently in every member
+    assert (first.positions[:, 0] == 0).all()
+    assert len(set(map(tuple, first.velocities[:, 1]))) == 8
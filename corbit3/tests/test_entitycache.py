@@ -0,0 +1,68 @@
+import corbit.entitycache
+import corbit.mysqlio
+
+
+def rows_of(entities):
+    return [corbit.mysqlio.entity_row(entity) for entity in entities]
+
+
+def moved(row, dx):
+    return row[:7] + (row[7] + dx,) + row[8:]
+
+
+def test_same_objects_with_new_state(ocess):
+    cache = corbit.entitycache.EntityCache()
+    rows = rows_of(ocess)
+    first = cache.update(rows)
+    assert rows_of(first) == rows
+
+    # everything moves a bit, and a habitat burns some fuel
+    habitat = [i for i, row in enumerate(rows) if row[0] == "habitat"][0]
+    newer = [moved(row, 1.0) for row in rows]
+    newer[habitat] = newer[habitat][:16] + (newer[habitat][16] / 2,) + newer[habitat][17:]
+    second = cache.update(newer)
+    assert all(a is b for a, b in zip(first, second))
+    assert cache.changed
+    # and they're exactly what making them from scratch would give
+    assert rows_of(second) == newer
+
+
+def test_same_rows_again_is_nothing_new(ocess):
+    cache = corbit.entitycache.EntityCache()
+    rows = rows_of(ocess)
+    entities = cache.update(rows)
+    assert cache.update(rows) is entities
+    assert not cache.changed
+
+
+def test_new_and_changed_bodies_are_made_again(ocess):
+    cache = corbit.entitycache.EntityCache()
+    rows = rows_of(ocess)
+    first = cache.update(rows)
+
+    # a new save, where the first body's a different size, and the last one's gone
+    newer = [rows[0][:3] + (rows[0][3] * 2,) + rows[0][4:]] + rows[1:-1]
+    second = cache.update(newer)
+    assert second[0] is not first[0]
+    assert all(a is b for a, b in zip(first[1:], second[1:]))
+    assert rows[-1][1] not in cache.by_name and len(cache.by_name) == len(newer)
+    assert rows_of(second) == newer
+
+    # and if it comes back, it's a new object
+    assert cache.update(rows)[-1] is not first[-1]
+
+
+def test_rows_kept_from_last_time_are_skipped(monkeypatch, ocess):
+    cache = corbit.entitycache.EntityCache()
+    rows = rows_of(ocess)
+    cache.update(rows)
+    updated = []
+    real_update = corbit.entitycache.update_entity
+    monkeypatch.setattr(corbit.entitycache, "update_entity", lambda entity, row: updated.append(row) or
+                        real_update(entity, row))
+    # only the first body was read again, like corbit.ingest does for the bodies the pilot's looking at
+    newer = [moved(rows[0], 1.0)] + rows[1:]
+    entities = cache.update(newer)
+    assert updated == [newer[0]]
+    assert cache.changed
+    assert rows_of(entities) == newer
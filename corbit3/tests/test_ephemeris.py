@@ -0,0 +1,94 @@
+import math
+
+import numpy
+import pytest
+
+import corbit.batch
+import corbit.ephemeris
+
+STAR_MU = corbit.batch.G * 2e30
+
+
+@pytest.fixture
+def short_chunks(monkeypatch):
+    # small enough that the comet below goes around in a few chunks, and the test stays quick
+    monkeypatch.setattr(corbit.ephemeris, "MAX_SEGMENT_STEPS", 1024)
+
+
+def comet_world():
+    """A star, a planet on a tight circular orbit that sets the time step, and a comet that starts out slow at
+    apoapsis and is moving ten times as fast at periapsis, half an orbit later
+    """
+    apoapsis, periapsis = 1e11, 1e10
+    semimajor_axis = (apoapsis + periapsis) / 2
+    comet_speed = math.sqrt(STAR_MU * (2 / apoapsis - 1 / semimajor_axis))
+    return corbit.batch.World(["Star", "Planet", "Comet"], [2e30, 1e20, 1e10], [7e8, 1e6, 1e3],
+                              [[0, 0], [1e10, 0], [-apoapsis, 0]],
+                              [[0, 0], [0, math.sqrt(STAR_MU / 1e10)], [0, -comet_speed]])
+
+
+def worst_miss(ephemeris, world):
+    """:return: the furthest the ephemeris is from any step of propagating world the way build() does, in m"""
+    dt = corbit.ephemeris.shortest_period(world) / corbit.ephemeris.STEPS_PER_ORBIT
+    steps = int(round((ephemeris.end_time - ephemeris.start_time) / dt))
+    times, positions, velocities = corbit.batch.propagate(world.copy(), steps * dt, steps)
+    worst = 0.0
+    for time, expected in zip(times, positions):
+        if ephemeris.covers(time):
+            worst = max(worst, numpy.sqrt(((ephemeris.evaluate(time)[0] - expected) ** 2).sum(axis=-1)).max())
+    return worst
+
+
+def test_every_segment_fits(short_chunks):
+    world = comet_world()
+    ephemeris = corbit.ephemeris.build(world, 7e6)
+    assert ephemeris.covers(7e6)
+    assert worst_miss(ephemeris, world) <= corbit.ephemeris.FIT_TOLERANCE
+
+
+def test_segments_are_split_where_the_path_tightens(short_chunks):
+    ephemeris = corbit.ephemeris.build(comet_world(), 7e6)
+    comet = ephemeris.index["Comet"]
+    lengths = ephemeris.segment_lengths[ephemeris.lookup[comet]]
+    # long segments out by apoapsis, and much shorter ones around periapsis, half an orbit later
+    assert lengths.max() >= 8 * lengths.min()
+    periapsis = ephemeris.evaluate(3.5e6)[0][comet]
+    assert ephemeris.segment_lengths[ephemeris.lookup[comet, int(3.5e6 // ephemeris.cell_length)]] == lengths.min()
+    assert numpy.linalg.norm(periapsis) < 2e10
+    # the planet's orbit is the same all the way round
+    planet = ephemeris.segment_lengths[ephemeris.lookup[ephemeris.index["Planet"]]]
+    assert planet.min() == planet.max()
+
+
+def test_raises_if_segments_cant_get_short_enough(short_chunks, monkeypatch):
+    monkeypatch.setattr(corbit.ephemeris, "FIT_TOLERANCE", 1e-9)
+    with pytest.raises(ValueError, match="can't fit"):
+        corbit.ephemeris.build(comet_world(), 1e6)
+
+
+def test_velocities_are_the_derivative(short_chunks):
+    ephemeris = corbit.ephemeris.build(comet_world(), 7e6)
+    h = 1.0
+    for time in numpy.linspace(10, 6.9e6, 17):
+        positions, velocities = ephemeris.evaluate(time)
+        after, _ = ephemeris.evaluate(time + h)
+        before, _ = ephemeris.evaluate(time - h)
+        assert numpy.allclose((after - before) / (2 * h), velocities, rtol=1e-4, atol=1e-3)
+
+
+def test_save_and_load(short_chunks, tmp_path):
+    ephemeris = corbit.ephemeris.build(comet_world(), 3e6)
+    filename = str(tmp_path / "comet.ephemeris.npz")
+    ephemeris.save(filename)
+    loaded = corbit.ephemeris.Ephemeris.load(filename)
+    assert loaded.names == ephemeris.names
+    assert loaded.end_time == ephemeris.end_time
+    for time in (0.0, 1.234e6, ephemeris.end_time):
+        assert numpy.array_equal(loaded.evaluate(time)[0], ephemeris.evaluate(time)[0])
+
+
+def test_outside_raises(short_chunks):
+    ephemeris = corbit.ephemeris.build(comet_world(), 1e6)
+    assert not ephemeris.covers(ephemeris.end_time + 1)
+    with pytest.raises(ValueError):
+        ephemeris.evaluate(-1.0)
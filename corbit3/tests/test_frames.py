@@ -0,0 +1,69 @@
+import numpy
+
+import corbit.batch
+import corbit.frames
+
+
+def test_parents(ocess):
+    world = corbit.batch.World.from_entities(ocess)
+    frames = corbit.frames.Frames(world)
+    assert frames.parent("Sun") is None
+    assert frames.parent("Earth") == "Sun"
+    # the Sun pulls on the Moon harder than Earth does, but the Moon's inside Earth's sphere of influence
+    assert frames.parent("Moon") == "Earth"
+    assert frames.parent("Habitat") == "Earth"
+
+
+def test_composes_back_to_the_world(ocess):
+    world = corbit.batch.World.from_entities(ocess)
+    frames = corbit.frames.Frames(world)
+    positions, velocities = frames.compose()
+    # local states are float32, which is good to about 1e-7 of the distance to the parent, at every level
+    assert frames.local_positions.dtype == numpy.float32
+    assert (numpy.linalg.norm(positions - world.positions, axis=1)
+            <= 1e-6 * numpy.linalg.norm(world.positions, axis=1) + 1e-3).all()
+    assert (numpy.linalg.norm(velocities - world.velocities, axis=1)
+            <= 1e-6 * numpy.linalg.norm(world.velocities, axis=1) + 1e-6).all()
+
+
+def test_floating_origin_is_precise_near_the_origin(ocess):
+    world = corbit.batch.World.from_entities(ocess)
+    frames = corbit.frames.Frames(world)
+    positions, _ = frames.relative_to("Habitat")
+    habitat, earth = world.index("Habitat"), world.index("Earth")
+    assert (positions[habitat] == 0).all()
+    expected = world.positions[earth] - world.positions[habitat]
+    assert numpy.linalg.norm(positions[earth] - expected) < 1.0
+
+
+def test_craft_crossing_into_another_sphere_of_influence(ocess):
+    world = corbit.batch.World.from_entities(ocess)
+    frames = corbit.frames.Frames(world)
+    habitat, moon, earth = world.index("Habitat"), world.index("Moon"), world.index("Earth")
+    assert frames.update(world).tolist() == []
+
+    # fly the habitat to just above the Moon, and make it go around the Moon
+    world.positions[habitat] = world.positions[moon] + [3e6, 0]
+    world.velocities[habitat] = world.velocities[moon] + [0, 1.3e3]
+    assert frames.update(world).tolist() == [habitat]
+    assert frames.parent("Habitat") == "Moon"
+    assert numpy.allclose(frames.local_positions[habitat], [3e6, 0])
+    assert numpy.allclose(frames.local_velocities[habitat], [0, 1.3e3])
+    positions, velocities = frames.relative_to("Moon")
+    assert numpy.linalg.norm(positions[habitat] - [3e6, 0]) < 1.0
+    assert numpy.linalg.norm(velocities[habitat] - [0, 1.3e3]) < 1e-3
+
+    # and back again
+    world.positions[habitat] = world.positions[earth] + [7e6, 0]
+    assert frames.update(world).tolist() == [habitat]
+    assert frames.parent("Habitat") == "Earth"
+
+
+def test_given_parents_are_kept(ocess):
+    world = corbit.batch.World.from_entities(ocess)
+    parents = numpy.full(len(world.names), world.index("Sun"))
+    parents[world.index("Sun")] = -1
+    frames = corbit.frames.Frames(world, parents)
+    world.positions[world.index("Habitat")] = world.positions[world.index("Moon")] + [3e6, 0]
+    assert frames.update(world).tolist() == []
+    assert frames.parent("Habitat") == "Sun"
@@ -0,0 +1,154 @@
+import time
+
+import numpy
+
+import corbit.ingest
+import corbit.interest
+import corbit.particles
+import corbit.storage
+from corbit.mysqlio import entity_row, row_entity
+
+
+class Counting:
+    """Wraps a backend, counting how many times each method gets called"""
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.calls = {}
+
+    def __getattr__(self, name):
+        method = getattr(self.storage, name)
+
+        def counted(*arguments):
+            self.calls[name] = self.calls.get(name, 0) + 1
+            return method(*arguments)
+        return counted
+
+
+def some_particles(count):
+    particles = corbit.particles.Particles()
+    particles.add(numpy.arange(2 * count, dtype=float).reshape(count, 2), numpy.zeros((count, 2)), (1, 2, 3))
+    return particles
+
+
+def test_particles_only_read_when_pushed(storage, small_world):
+    storage.push_entities(small_world)
+    counting = Counting(storage)
+    ingest = corbit.ingest.StateIngest(counting, "pilot")
+
+    # nothing published yet
+    assert len(ingest.read()[2][0]) == 0
+    storage.push_particles(some_particles(5))
+    positions, colors = ingest.read()[2]
+    assert positions.tolist() == some_particles(5).positions[:5].tolist()
+    assert colors.tolist() == [[1, 2, 3]] * 5
+    assert counting.calls["get_particles"] == 1
+
+    for _ in range(10):
+        assert len(ingest.read()[2][0]) == 5
+    assert counting.calls["get_particles"] == 1
+    assert counting.calls["get_particles_generation"] == 12
+
+    storage.push_particles(some_particles(7))
+    assert len(ingest.read()[2][0]) == 7
+    assert counting.calls["get_particles"] == 2
+
+
+def test_particles_never_read_when_not_drawn(storage, small_world):
+    storage.push_entities(small_world)
+    storage.push_particles(some_particles(5))
+    counting = Counting(storage)
+    ingest = corbit.ingest.StateIngest(counting, "pilot", particles=False)
+    acknowledgement, rows, (positions, colors), telemetry = ingest.read()
+    assert len(rows) == len(small_world)
+    assert len(positions) == 0 and len(colors) == 0
+    assert "get_particles" not in counting.calls and "get_particles_generation" not in counting.calls
+
+
+def test_mostly_reads_what_the_pilot_is_looking_at(monkeypatch, storage, ocess):
+    storage.push_entities(ocess)
+    ingest = corbit.ingest.StateIngest(storage, "pilot", particles=False)
+    first = ingest.read()[1]  # everything, it doesn't know what the pilot's looking at yet
+    names = [row[1] for row in first]
+    positions = numpy.array([row[7:9] for row in first])
+    view = ("Habitat", "Earth", "AYSE", positions[names.index("Habitat")], 1e-6, (600, 600))
+    ingest.look(*view)
+
+    # everything moves, but only the relevant bodies are read again
+    moved = [row[:7] + (row[7] + 1.0,) + row[8:] for row in (entity_row(entity) for entity in ocess)]
+    storage.push_entities([row_entity(row) for row in moved])
+    second = ingest.read()[1]
+    interest = corbit.interest.Interest(*view[:2], screen_size=view[5], target=view[2])
+    interest.update_view(*view[3:5])
+    relevant = interest.relevant(names, positions, numpy.array([row[3] for row in first]))
+    assert 3 <= relevant.sum() < len(names)
+    for i in range(len(names)):
+        if relevant[i]:
+            assert tuple(second[i]) == moved[i]
+        else:
+            assert second[i] is first[i]
+
+    # until it's time to read everything again
+    monkeypatch.setattr(corbit.ingest, "SWEEP_INTERVAL", 0.0)
+    assert [tuple(row) for row in ingest.read()[1]] == moved
+
+
+class Flaky:
+    """Wraps a backend, and fails every call while broken is set, like a database that's gone away"""
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.broken = False
+
+    def __getattr__(self, name):
+        method = getattr(self.storage, name)
+
+        def flaky(*arguments):
+            if self.broken:
+                raise ConnectionError("database's gone")
+            return method(*arguments)
+        return flaky
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def test_thread_reads_and_sends(small_world):
+    storage = corbit.storage.MemoryStorage()
+    storage.push_entities(small_world)
+    ingest = corbit.ingest.StateIngest(storage, "pilot", particles=False)
+    ingest.start()
+    wait_for(lambda: ingest.latest is not None)
+    assert [row[1] for row in ingest.latest[1]] == [entity.name for entity in small_world]
+
+    ingest.send([("fire_rcs", "Habitat", 0.0)])
+    ingest.send([("acknowledge", "pilot", 1)])
+    commands = []
+    wait_for(lambda: commands.extend(storage.pop_commands()) or len(commands) == 2)
+    assert commands == [("fire_rcs", "Habitat", 0.0), ("acknowledge", "pilot", 1)]
+
+    # a new world gets picked up without the pilot doing anything
+    storage.push_entities(small_world[:2])
+    wait_for(lambda: len(ingest.latest[1]) == 2)
+
+
+def test_nothing_is_lost_while_the_database_is_gone(small_world):
+    storage = corbit.storage.MemoryStorage()
+    storage.push_entities(small_world)
+    flaky = Flaky(storage)
+    ingest = corbit.ingest.StateIngest(flaky, "pilot", particles=False)
+    flaky.broken = True
+    ingest.start()
+    ingest.send([("fire_rcs", "Habitat", 0.0)])
+    ingest.send([("fire_rcs", "Habitat", 1.0)])
+    wait_for(lambda: ingest.error is not None and len(ingest.unsent) == 2)
+    assert ingest.latest is None
+
+    # once it's back, everything goes out in the order it was sent, and reading carries on
+    flaky.broken = False
+    wait_for(lambda: ingest.latest is not None and ingest.error is None)
+    assert storage.pop_commands() == [("fire_rcs", "Habitat", 0.0), ("fire_rcs", "Habitat", 1.0)]
@@ -0,0 +1,50 @@
+import numpy
+
+import corbit.interest
+
+NAMES = ["Sun", "Earth", "Habitat", "Rock", "Far rock"]
+RADII = numpy.array([7e8, 6.4e6, 10.0, 0.5, 0.5])
+
+
+def positions():
+    return numpy.array([[0, 0], [1.5e11, 0], [1.5e11 + 7e6, 0], [1.5e11 + 7e6 + 100, 0], [-1.5e11, 0]], dtype=float)
+
+
+def test_everything_until_the_view_is_known():
+    interest = corbit.interest.Interest("Habitat", "Earth")
+    assert interest.relevant(NAMES, positions(), RADII).all()
+
+
+def test_zoomed_in_on_the_habitat():
+    interest = corbit.interest.Interest("Habitat", "Earth", screen_size=(600, 600))
+    interest.update_view(positions()[2], 1.0)  # a pixel a metre, so the screen's 600 m across
+    relevant = dict(zip(NAMES, interest.relevant(NAMES, positions(), RADII)))
+    # the craft and reference always, the rock because it's on screen, and the Sun because it's huge at this zoom
+    assert relevant == {"Sun": True, "Earth": True, "Habitat": True, "Rock": True, "Far rock": False}
+
+
+def test_just_off_screen_is_still_relevant():
+    interest = corbit.interest.Interest("Habitat", "Earth", screen_size=(100, 100))
+    interest.update_view(positions()[2], 1.0)
+    moved = positions()
+    # past the edge of the screen (50 m away), but inside the margin past that
+    edge = 50 + 100 * corbit.interest.MARGIN
+    moved[3] = moved[2] + [edge - 1, 0]
+    assert interest.relevant(NAMES, moved, RADII)[3]
+    moved[3] = moved[2] + [edge + 2, 0]
+    assert not interest.relevant(NAMES, moved, RADII)[3]
+
+
+def test_zoomed_out_only_big_things():
+    interest = corbit.interest.Interest("Habitat", "Earth", screen_size=(600, 600))
+    interest.update_view(positions()[1] + [0, 1e11], 1e-8)  # the screen's 6e10 m across, and Earth's off it
+    relevant = dict(zip(NAMES, interest.relevant(NAMES, positions(), RADII)))
+    assert relevant["Habitat"] and relevant["Earth"]
+    assert relevant["Sun"]  # off screen, but 14 pixels across
+    assert not relevant["Rock"] and not relevant["Far rock"]
+
+
+def test_the_target_is_always_relevant():
+    interest = corbit.interest.Interest("Habitat", "Earth", screen_size=(600, 600), target="Far rock")
+    interest.update_view(positions()[2], 1.0)  # like test_zoomed_in_on_the_habitat, where it wasn't
+    assert interest.relevant(NAMES, positions(), RADII)[NAMES.index("Far rock")]
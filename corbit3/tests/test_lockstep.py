@@ -0,0 +1,112 @@
+from unum.units import s
+
+import corbit.ingest
+import corbit.lockstep
+import corbit.mysqlio
+import corbit.objects
+import corbit.storage
+from conftest import copy
+
+TICK = 1 / 60
+HASH_INTERVAL = 5
+
+
+class Server:
+    """What server.py does in lockstep mode, with the commands already scheduled for their ticks"""
+
+    def __init__(self, entities, storage):
+        self.entities = corbit.lockstep.canonical_order(copy(entities))
+        self.storage = storage
+        self.tick = 0
+        self.time = TICK
+
+    def run(self, ticks, commands=None):
+        """:param commands: {tick: [commands]}"""
+        commands = commands or {}
+        for _ in range(ticks):
+            if self.tick % HASH_INTERVAL == 0:
+                self.storage.push_entities(self.entities)
+                self.storage.push_state_hash(self.tick, corbit.lockstep.state_hash(self.entities))
+            due = corbit.lockstep.canonical_commands(commands.get(self.tick, []))
+            for function, target, amount in due:
+                if function == "accelerate_time":
+                    self.time *= amount
+            corbit.lockstep.act_on_commands(self.entities, due, self.time * s)
+            self.storage.push_command_log(self.tick, due + [(corbit.lockstep.TICK_TIME, None, self.time)])
+            corbit.lockstep.step(self.entities, self.time * s)
+            self.tick += 1
+
+
+def test_same_commands_same_hash(small_world):
+    worlds = [corbit.lockstep.canonical_order(copy(small_world)) for _ in range(2)]
+    for world in worlds:
+        for tick in range(10):
+            corbit.lockstep.act_on_commands(world, [("fire_rcs", "Habitat", 0.5)] if tick == 3 else [], TICK * s)
+            corbit.lockstep.step(world, TICK * s)
+    assert corbit.lockstep.state_hash(worlds[0]) == corbit.lockstep.state_hash(worlds[1])
+    assert corbit.lockstep.state_hash(worlds[0]) != corbit.lockstep.state_hash(
+        corbit.lockstep.canonical_order(copy(small_world)))
+
+
+def test_canonical_commands_ignore_arrival_order():
+    commands = [("fire_rcs", "Habitat", 1.0), ("accelerate_time", None, 1.0), ("fire_rcs", "AYSE", None)]
+    assert corbit.lockstep.canonical_commands(commands) == corbit.lockstep.canonical_commands(commands[::-1])
+
+
+def test_command_schedule_catches_up_on_late_ticks():
+    schedule = corbit.lockstep.CommandSchedule()
+    schedule.schedule(3, [("b",)])
+    schedule.schedule(1, [("a",)])
+    schedule.schedule(9, [("c",)])
+    assert schedule.due(5) == [("a",), ("b",)]
+    assert schedule.due(5) == []
+    assert schedule.due(9) == [("c",)]
+
+
+def test_replica_follows_server_through_commands_and_time_acceleration(small_world, storage):
+    server = Server(small_world, storage)
+    ingest = corbit.ingest.LockstepIngest(storage, "pilot")
+    assert ingest.read() is None  # nothing published yet
+    server.run(3)
+    # starts from the state published on tick 0, and catches up from the log
+    ingest.read()
+    replica = ingest.replica
+    assert replica is not None and replica.tick == server.tick
+
+    server.run(2 * HASH_INTERVAL + 2, {
+        6: [("fire_rcs", "Habitat", 0.0), ("acknowledge", "pilot", 1)],
+        8: [("fire_verniers", "Habitat", 1.0), ("accelerate_time", None, 10)],
+        12: [("change_engines", "Habitat", 0.5)]})
+    acknowledgement, rows, _, _ = ingest.read()
+    assert ingest.replica is replica
+    assert replica.tick == server.tick
+    assert corbit.lockstep.state_hash(replica.entities) == corbit.lockstep.state_hash(server.entities)
+    assert sorted(rows) == sorted(corbit.mysqlio.entity_row(entity) for entity in server.entities)
+    assert acknowledgement == (1, 10 * TICK)
+
+
+def test_replica_starts_again_when_a_world_is_opened(small_world, storage):
+    server = Server(small_world, storage)
+    server.run(1)
+    ingest = corbit.ingest.LockstepIngest(storage, "pilot")
+    ingest.read()
+    assert ingest.replica is not None
+    server.run(2, {1: [("open", "saves/OCESS.json", None)]})
+    assert ingest.read() is None
+    assert ingest.replica is None
+
+
+def test_replica_notices_when_it_diverges(small_world, storage):
+    server = Server(small_world, storage)
+    server.run(1)
+    ingest = corbit.ingest.LockstepIngest(storage, "pilot")
+    ingest.read()
+    # something the log doesn't know about
+    corbit.objects.find_entity("Habitat", ingest.replica.entities).angular_speed *= 2
+    server.run(HASH_INTERVAL + 1)
+    assert ingest.read() is None
+    assert ingest.replica is None
+    # and starts again from the newest state the server published
+    assert ingest.read() is not None
+    assert ingest.replica.tick == server.tick
+    assert corbit.lockstep.state_hash(ingest.replica.entities) == corbit.lockstep.state_hash(server.entities)
@@ -0,0 +1,126 @@
+import pytest
+
+import corbit.mysqlio
+import corbit.storage
+
+# What corbit.mysqlio sends to MySQL, and how MySQLStorage uses its connections, checked against pretend connections
+# that write down everything they're asked to do. tests/test_storage.py checks it against a real database
+
+
+class Cursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.rowcount = 0
+
+    def execute(self, sql, parameters=None):
+        self.connection.log.append(("execute", " ".join(sql.split()), parameters))
+
+    def executemany(self, sql, rows):
+        self.connection.log.append(("executemany", " ".join(sql.split()), list(rows)))
+
+    def fetchall(self):
+        return []
+
+    def fetchone(self):
+        return None
+
+
+class Connection:
+    def __init__(self):
+        self.log = []
+
+    def cursor(self):
+        return Cursor(self)
+
+    def commit(self):
+        self.log.append(("commit",))
+
+    def rollback(self):
+        self.log.append(("rollback",))
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    """Every Connection opened, in order"""
+    opened = []
+
+    def open_connection(db_info):
+        opened.append(Connection())
+        return opened[-1]
+    monkeypatch.setattr(corbit.mysqlio, "open_connection", open_connection)
+    return opened
+
+
+def test_entities_go_in_one_parameterized_insert(ocess):
+    db = Connection()
+    corbit.mysqlio.push_entities(db, ocess)
+    (_, delete, _), (kind, insert, rows) = db.log
+    assert delete == "DELETE FROM flight"
+    assert kind == "executemany" and insert.count("%s") == 18
+    # the values are sent as they are, not turned into text in the SQL
+    assert rows == [corbit.mysqlio.entity_row(entity) for entity in ocess]
+    assert ocess[0].name not in insert
+
+
+def test_commands_are_padded():
+    db = Connection()
+    corbit.mysqlio.push_commands(db, [("accelerate_time",), ("fire_rcs", "AC", 1.5)])
+    assert db.log[0][2] == [("accelerate_time", None, None), ("fire_rcs", "AC", 1.5)]
+    # and nothing's committed, that's up to the caller
+    assert ("commit",) not in db.log
+
+
+def test_pool_hands_connections_back(connections):
+    pool = corbit.mysqlio.ConnectionPool(("host", "user", "password", "corbit"), size=2)
+    assert len(connections) == 2
+    with pytest.raises(RuntimeError):
+        with pool.connection():
+            raise RuntimeError("a query went wrong")
+    # both are still there to be had
+    first = pool.acquire()
+    second = pool.acquire()
+    assert {first, second} == set(connections)
+    assert pool.idle.empty()
+
+
+def test_unbatched_writes_are_committed_right_away(connections, small_world):
+    storage = corbit.storage.MySQLStorage(("host", "user", "password", "corbit"))
+    storage.push_entities(small_world)
+    writer = [connection for connection in connections if connection.log][0]
+    assert writer.log[-1] == ("commit",)
+
+
+def test_batched_writes_share_a_connection_and_commit_together(connections, small_world):
+    storage = corbit.storage.MySQLStorage(("host", "user", "password", "corbit"), commit_interval=3)
+    for _ in range(2):
+        storage.push_entities(small_world)
+        storage.push_commands([("fire_rcs", "AYSE", 0.0)])
+        storage.end_tick()
+    writer, reader = connections if connections[0].log else connections[::-1]
+    assert ("commit",) not in writer.log and reader.log == []
+    # reading doesn't have to wait for the writes to be committed, it's got a connection of its own
+    storage.get_entity_rows()
+    assert reader.log == [("execute", "SELECT * FROM flight", None), ("commit",)]
+    assert ("commit",) not in writer.log
+
+    storage.end_tick()
+    assert writer.log[-1] == ("commit",)
+    assert sum(entry[0] == "executemany" for entry in writer.log) == 4
+
+
+def test_failed_batched_write_is_rolled_back(connections, monkeypatch):
+    storage = corbit.storage.MySQLStorage(("host", "user", "password", "corbit"), commit_interval=3)
+
+    def broken(db, commands):
+        raise RuntimeError("lost the connection")
+    monkeypatch.setattr(corbit.mysqlio, "push_commands", broken)
+    with pytest.raises(RuntimeError):
+        storage.push_commands([("fire_rcs", "AYSE", 0.0)])
+    assert storage.writer is None
+    assert any(("rollback",) in connection.log for connection in connections)
+    assert len(list(storage.pool.idle.queue)) == 2
+
+
+def test_batching_needs_a_connection_to_read_with(connections):
+    with pytest.raises(ValueError):
+        corbit.storage.MySQLStorage(("host", "user", "password", "corbit"), pool_size=1, commit_interval=3)
@@ -0,0 +1,63 @@
+import itertools
+from multiprocessing import shared_memory
+
+import numpy
+import pytest
+from unum.units import m, s
+
+import corbit.batch
+import corbit.parallel
+import corbit.physics
+
+
+@pytest.fixture
+def pool():
+    pool = corbit.parallel.ParallelGravity(64, workers=2)
+    try:
+        yield pool
+    finally:
+        pool.close()
+
+
+def test_same_as_batch(pool):
+    random = numpy.random.RandomState(0)
+    positions = random.uniform(-1e10, 1e10, (50, 2))
+    masses = random.uniform(1e20, 1e25, 50)
+    assert numpy.allclose(pool.gravity(positions, masses), corbit.batch.gravity(positions, masses), rtol=1e-12)
+    with pytest.raises(ValueError):
+        pool.gravity(numpy.zeros((65, 2)), numpy.ones(65))
+
+
+def test_same_as_the_server(pool, small_world):
+    # the server's loop over every pair, see server.py. Saves come with accelerations in, which it adds to
+    before = numpy.array([entity.acceleration.asNumber(m / s / s) for entity in small_world])
+    for A, B in itertools.combinations(small_world, 2):
+        gravity = corbit.physics.gravitational_force(A, B)
+        theta = corbit.physics.angle(A, B)
+        A.accelerate(gravity, theta)
+        B.accelerate(-gravity, theta)
+    expected = numpy.array([entity.acceleration.asNumber(m / s / s) for entity in small_world]) - before
+    assert numpy.allclose(corbit.parallel.entity_gravity(pool, small_world), expected, rtol=1e-9, atol=0)
+
+
+def test_close_cleans_up():
+    pool = corbit.parallel.ParallelGravity(8, workers=2)
+    names = [block.name for block in pool.blocks]
+    processes = list(pool.processes)
+    pool.close()
+    pool.close()  # twice is fine
+    assert not any(process.is_alive() for process in processes)
+    for name in names:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
+
+
+def test_close_after_a_worker_died():
+    pool = corbit.parallel.ParallelGravity(8, workers=2)
+    names = [block.name for block in pool.blocks]
+    pool.processes[0].terminate()
+    pool.processes[0].join()
+    pool.close()
+    for name in names:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
@@ -0,0 +1,89 @@
+import numpy
+import pytest
+from unum.units import m, s, kg, rad
+
+import corbit.physics
+from corbit.objects import Entity
+
+
+def body(name, x, vx, radius=1.0, mass=1.0):
+    return Entity(name, mass, radius, (255, 255, 255), [x, 0.0], [vx, 0.0], [0.0, 0.0], 0, 0, 0)
+
+
+@pytest.fixture
+def moves(monkeypatch):
+    """Records how far every move() takes an entity, in s"""
+    moved = []
+    move = Entity.move
+
+    def recorded(self, time):
+        moved.append((self.name, time.asNumber(s)))
+        return move(self, time)
+    monkeypatch.setattr(Entity, "move", recorded)
+    return moved
+
+
+def momentum(entities):
+    return sum(entity.velocity.asNumber(m/s) * entity.mass_fun().asNumber(kg) for entity in entities)
+
+
+def positions(entities):
+    return numpy.array([entity.displacement.asNumber(m)[0] for entity in entities])
+
+
+def test_three_bodies_touching_at_once(moves):
+    # A and C both reach B, sitting still in the middle, at exactly t = 0.5 s
+    entities = [body("A", -3.0, 2.0), body("B", 0.0, 0.0), body("C", 3.0, -2.0)]
+    before = momentum(entities)
+    collided = corbit.physics.resolve_collisions(entities, 1 * s)
+
+    assert set(collided) == {"A", "B", "C"}
+    assert all(time >= 0 for name, time in moves)
+    # every body got moved through exactly the whole tick
+    for entity in entities:
+        assert sum(time for name, time in moves if name == entity.name) == pytest.approx(1.0)
+    assert numpy.allclose(momentum(entities), before)
+    # nothing's left closing in on anything
+    velocities = [entity.velocity.asNumber(m/s)[0] for entity in entities]
+    assert velocities[0] <= velocities[1] <= velocities[2]
+    x = positions(entities)
+    assert numpy.all(numpy.diff(x) >= 2.0 - 1e-9)
+
+
+def test_overlapping_bodies_bounce_now(moves):
+    # already overlapping and still closing in: the root of the impact time is negative
+    entities = [body("A", -0.5, 1.0), body("B", 0.5, -1.0)]
+    collided = corbit.physics.resolve_collisions(entities, 1 * s)
+
+    assert collided == ["A", "B"]
+    assert all(time >= 0 for name, time in moves)
+    assert entities[0].velocity.asNumber(m/s)[0] < 0 < entities[1].velocity.asNumber(m/s)[0]
+
+
+def test_bodies_moving_apart_pass(moves):
+    entities = [body("A", -0.5, -1.0), body("B", 0.5, 1.0)]
+    assert corbit.physics.resolve_collisions(entities, 1 * s) == []
+    assert numpy.allclose(positions(entities), [-1.5, 1.5])
+
+
+def test_collision_at_the_right_moment(moves):
+    entities = [body("A", -3.0, 1.0), body("B", 3.0, -1.0)]
+    corbit.physics.resolve_collisions(entities, 4 * s)
+    # they touch after 2 s, then have 2 s going back the way they came
+    assert moves[:2] == [("A", pytest.approx(2.0)), ("B", pytest.approx(2.0))]
+    x = positions(entities)
+    assert x[0] < -1.0 and x[1] > 1.0
+
+
+@pytest.mark.parametrize("x", [-3.0, -0.5], ids=["mid tick", "right away"])
+def test_collisions_keep_the_torque(moves, x):
+    # a craft firing its verniers that hits something halfway through the tick, or already overlaps it, still gets
+    # the whole tick's worth of spin, like one that doesn't hit anything
+    spinning, other, alone = body("A", x, 1.0), body("B", -x, -1.0), body("C", 100.0, 0.0)
+    for entity in (spinning, alone):
+        entity.angular_acceleration = 2 * rad / s / s
+    assert corbit.physics.resolve_collisions([spinning, other, alone], 4 * s) == ["A", "B"]
+    for entity in (spinning, alone):
+        assert entity.angular_speed.asNumber(rad / s) == pytest.approx(8.0)
+        assert entity.angular_position.asNumber(rad) == pytest.approx(32.0)
+        assert entity.angular_acceleration.asNumber(rad / s / s) == 0
@@ -0,0 +1,131 @@
+import numpy
+import pytest
+
+import corbit.batch
+import corbit.objects
+import corbit.prediction
+
+
+def counting(predictor):
+    """Counts how many times predictor.update() gets called"""
+    calls = []
+    update = predictor.update
+
+    def counted(*arguments):
+        calls.append(arguments)
+        return update(*arguments)
+    predictor.update = counted
+    return calls
+
+
+def test_prediction_follows_the_craft(small_world):
+    predictor = corbit.prediction.OrbitPredictor()
+    predictor.submit(small_world, "Habitat", "Earth")
+    predictor.refresh()
+    craft, reference, path, closed = predictor.path
+    assert (craft, reference) == ("Habitat", "Earth")
+    assert path.shape[1] == 2 and numpy.isfinite(path).all()
+    assert predictor.encounters == ("Habitat", (), [])
+
+
+def test_missing_target_is_remembered(small_world):
+    predictor = corbit.prediction.OrbitPredictor()
+    calls = counting(predictor)
+    for _ in range(3):
+        predictor.submit(small_world, "Habitat", "Earth", ["nowhere"])
+        predictor.refresh()
+        assert predictor.path is None and predictor.encounters is None
+    # the same names, so trying once was enough
+    assert len(calls) == 1
+
+    # a different reference is worth another go, and works
+    predictor.submit(small_world, "Habitat", "Moon")
+    predictor.refresh()
+    assert predictor.path[:2] == ("Habitat", "Moon")
+    assert predictor.missing is None
+    assert len(calls) == 2
+
+
+def test_missing_body_is_retried_once_it_turns_up(small_world):
+    predictor = corbit.prediction.OrbitPredictor()
+    calls = counting(predictor)
+    without_moon = [entity for entity in small_world if entity.name != "Moon"]
+    predictor.submit(without_moon, "Habitat", "Moon")
+    predictor.refresh()
+    predictor.submit(without_moon, "Habitat", "Moon")
+    predictor.refresh()
+    assert predictor.path is None and len(calls) == 1
+
+    predictor.submit(small_world, "Habitat", "Moon", world=corbit.batch.World.from_entities(small_world))
+    predictor.refresh()
+    assert predictor.path[:2] == ("Habitat", "Moon")
+    assert len(calls) == 2
+
+
+def test_conic_is_the_orbit():
+    mu = corbit.batch.G * 6e24
+    r = 7e6
+    speed = 1.1 * numpy.sqrt(mu / r)  # a bit faster than circular, so we're at periapsis
+    path = corbit.prediction.conic(numpy.array([r, 0.0]), numpy.array([0.0, speed]), mu)
+    assert path.shape == (corbit.prediction.CONIC_POINTS, 2)
+    radii = numpy.linalg.norm(path, axis=1)
+    semimajor_axis = 1 / (2 / r - speed ** 2 / mu)
+    # the points aren't quite at periapsis and apoapsis, but close
+    assert radii.min() == pytest.approx(r, rel=1e-4)
+    assert radii.max() == pytest.approx(2 * semimajor_axis - r, rel=1e-4)
+    # and it goes through where the craft is now
+    assert corbit.prediction.distance_to_path(numpy.array([r, 0.0]), path)[0] < 1e-4 * r
+
+
+def test_hyperbola_is_open():
+    mu = corbit.batch.G * 6e24
+    r = 7e6
+    position, velocity = numpy.array([r, 0.0]), numpy.array([0.0, 2 * numpy.sqrt(mu / r)])
+    path = corbit.prediction.conic(position, velocity, mu)
+    radii = numpy.linalg.norm(path, axis=1)
+    assert radii.min() == pytest.approx(r, rel=1e-4)
+    assert radii.max() == pytest.approx(4 * r)
+    world = corbit.batch.World(["Earth", "Craft"], [6e24, 1e3], [6.4e6, 1], [[0, 0], position], [[0, 0], velocity])
+    assert not corbit.prediction.predict(world, 1, 0)[1]
+
+
+def test_leapfrog_keeps_a_circular_orbit():
+    mu = corbit.batch.G * 6e24
+    r = 7e6
+    world = corbit.batch.World(["Earth", "Craft"], [6e24, 1.0], [6.4e6, 1], [[0, 0], [r, 0]],
+                               [[0, 0], [0, numpy.sqrt(mu / r)]])
+    period = 2 * numpy.pi * numpy.sqrt(r ** 3 / mu)
+    times, positions, velocities = corbit.batch.propagate(world, 10 * period, 10000)
+    radii = numpy.linalg.norm(positions[:, 1] - positions[:, 0], axis=1)
+    assert numpy.abs(radii / r - 1).max() < 1e-3
+
+
+def test_nearby_reference_gets_a_conic(small_world):
+    world = corbit.batch.World.from_entities(small_world)
+    habitat, earth = world.index("Habitat"), world.index("Earth")
+    assert corbit.prediction.perturbation_ratio(world, habitat, earth) < corbit.prediction.PERTURBATION_LIMIT
+    path, closed = corbit.prediction.predict(world, habitat, earth)
+    assert len(path) == corbit.prediction.CONIC_POINTS
+
+
+def test_only_predicts_again_when_needed(small_world):
+    predictor = corbit.prediction.OrbitPredictor()
+    predictor.submit(small_world, "Habitat", "Earth")
+    predictor.refresh()
+    path = predictor.path
+    # the same again, the prediction's still good
+    predictor.submit(small_world, "Habitat", "Earth")
+    predictor.refresh()
+    assert predictor.path is path
+
+    # burning fuel means thrust, so the path's different now
+    habitat = corbit.objects.find_entity("Habitat", small_world)
+    habitat.engine_system.fuel = 0.5 * habitat.engine_system.fuel
+    predictor.submit(small_world, "Habitat", "Earth")
+    predictor.refresh()
+    assert predictor.path is not path
+
+    # and so is a different reference
+    predictor.submit(small_world, "Habitat", "Moon")
+    predictor.refresh()
+    assert predictor.path[:2] == ("Habitat", "Moon")
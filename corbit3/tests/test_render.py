@@ -0,0 +1,39 @@
+import pytest
+
+pytest.importorskip("pygame.base")  # the vendored pygame only works on the Python it was built for
+
+import corbit.render
+
+
+class CountingFont:
+    """Stands in for the HUD's font, keeping every text it was asked to render"""
+
+    def __init__(self, font):
+        self.font = font
+        self.rendered = []
+
+    def render(self, text, antialias, color):
+        self.rendered.append(text)
+        return self.font.render(text, antialias, color)
+
+
+def test_hud_only_renders_what_changed():
+    import pygame
+    pygame.font.init()
+    display = pygame.Surface((300, 200))
+    hud = corbit.render.Hud()
+    hud.font = CountingFont(hud.font)
+    hud.draw(display, [("Altitude:", "1 [m]"), ("Speed:", "2 [m/s]")])
+    assert sorted(hud.font.rendered) == sorted(["Altitude:", "1 [m]", "Speed:", "2 [m/s]"])
+
+    # the same again renders nothing, and only the new value gets rendered when it changes
+    hud.font.rendered = []
+    hud.draw(display, [("Altitude:", "1 [m]"), ("Speed:", "2 [m/s]")])
+    assert hud.font.rendered == []
+    hud.draw(display, [("Altitude:", "1 [m]"), ("Speed:", "3 [m/s]")])
+    assert hud.font.rendered == ["3 [m/s]"]
+
+    # a different size of screen needs a new overlay, but the names are still kept
+    hud.font.rendered = []
+    hud.draw(pygame.Surface((400, 200)), [("Altitude:", "1 [m]"), ("Speed:", "3 [m/s]")])
+    assert sorted(hud.font.rendered) == ["1 [m]", "3 [m/s]"]
@@ -0,0 +1,113 @@
+import os
+import sys
+import threading
+from multiprocessing import shared_memory
+
+import pytest
+
+import corbit.mysqlio
+import corbit.sharedstate
+import corbit.storage
+
+
+@pytest.fixture
+def server():
+    world = corbit.sharedstate.SharedWorld("corbit-test-state-%d" % os.getpid(), capacity=64, create=True)
+    try:
+        yield world
+    finally:
+        world.close()
+
+
+def rows_of(value, count=20):
+    """Flight rows where every number is value, so a row made of two different writes is easy to spot"""
+    return [("entity", "body %d" % i, value, value, int(value), int(value), int(value)) + (value,) * 11
+            for i in range(count)]
+
+
+def test_pilot_reads_what_the_server_wrote(server, ocess):
+    pilot = corbit.sharedstate.SharedWorld(server.block.name)
+    try:
+        assert pilot.read() == (0, [])
+        rows = [corbit.mysqlio.entity_row(entity) for entity in ocess]
+        server.write(rows)
+        assert pilot.generation() == 1
+        assert pilot.read() == (1, rows)
+        server.write(rows[:2])
+        assert pilot.read() == (2, rows[:2])
+        # pilots can't write
+        with pytest.raises(ValueError):
+            pilot.numbers[0, 0, 0] = 1
+    finally:
+        pilot.close()
+    # and a pilot closing doesn't take the world away from everyone else
+    shared_memory.SharedMemory(name=server.block.name).close()
+
+
+def test_too_many_entities(server):
+    with pytest.raises(ValueError):
+        server.write(rows_of(1.0, server.capacity + 1))
+
+
+def test_world_outgrowing_the_block(ocess):
+    # the server moves the world to a bigger block instead of giving up, and pilots follow it there
+    name = "corbit-test-grow-%d" % os.getpid()
+    rows = [corbit.mysqlio.entity_row(entity) for entity in ocess]
+    server = corbit.storage.SharedMemoryStorage(corbit.storage.MemoryStorage(), server=True, name=name, capacity=4)
+    try:
+        # the pilot's own backend is empty, so anything it reads came out of shared memory
+        pilot = corbit.storage.SharedMemoryStorage(corbit.storage.MemoryStorage(), name=name)
+        try:
+            server.push_entities(ocess[:3])
+            assert pilot.get_entity_rows() == rows[:3]
+            server.push_entities(ocess)
+            assert server.world.capacity >= len(ocess) > 4
+            assert pilot.get_entity_rows() == rows
+            assert pilot.world.capacity == server.world.capacity
+
+            server.push_entities(ocess[:2])
+            assert pilot.get_entity_rows() == rows[:2]
+        finally:
+            pilot.close()
+    finally:
+        server.close()
+
+
+def test_something_else_isnt_a_world():
+    block = shared_memory.SharedMemory(name="corbit-test-other-%d" % os.getpid(), create=True, size=4096)
+    try:
+        with pytest.raises(FileNotFoundError):
+            corbit.sharedstate.SharedWorld(block.name)
+    finally:
+        block.close()
+        block.unlink()
+
+
+def test_reads_are_never_torn(server):
+    # switch threads as often as possible, so the server's often halfway through a write when the pilot reads
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    server.write(rows_of(0.0))
+    pilot = corbit.sharedstate.SharedWorld(server.block.name)
+    stop = threading.Event()
+
+    def write():
+        value = 0.0
+        while not stop.is_set():
+            value += 1
+            server.write(rows_of(value))
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        values = []
+        for _ in range(2000):
+            generation, rows = pilot.read()
+            assert len(rows) == 20
+            assert len(set(row[2] for row in rows)) == 1, "rows from different writes"
+            values.append(rows[0][2])
+        assert values == sorted(values) and values[-1] > values[0]
+    finally:
+        stop.set()
+        writer.join()
+        pilot.close()
+        sys.setswitchinterval(switch_interval)
@@ -0,0 +1,120 @@
+import numpy
+import pytest
+
+import corbit.batch
+import corbit.mysqlio
+import corbit.snapshot
+
+TICK = 1 / 60
+
+
+def ticks(entities, count, dt=TICK):
+    """:return: a list of (time, rows), one for every tick of propagating entities"""
+    template = [corbit.mysqlio.entity_row(entity) for entity in entities]
+    world = corbit.batch.World.from_entities(entities)
+    times, positions, velocities = corbit.batch.propagate(world, dt * count, count)
+    return [(t, [row[:7] + tuple(position) + tuple(velocity) + row[11:]
+                 for row, position, velocity in zip(template, tick_positions.tolist(), tick_velocities.tolist())])
+            for t, tick_positions, tick_velocities in zip(times, positions, velocities)]
+
+
+def test_first_message_has_everything(ocess):
+    rows = [corbit.mysqlio.entity_row(entity) for entity in ocess]
+    snapshot = corbit.snapshot.Decoder().decode(corbit.snapshot.Encoder().encode(rows, 0.0))
+    decoded = snapshot.rows()
+    assert [row[:7] for row in decoded] == [tuple(row[:7]) for row in rows]
+    numbers = numpy.array([row[7:] for row in rows], dtype=float)
+    # quantized columns go in full as doubles, the rest as float32
+    assert numpy.array_equal(snapshot.numbers[:, corbit.snapshot.QUANTIZED], numbers[:, corbit.snapshot.QUANTIZED])
+    assert numpy.array_equal(snapshot.numbers[:, corbit.snapshot.OTHER],
+                             numbers[:, corbit.snapshot.OTHER].astype(numpy.float32))
+
+
+@pytest.mark.parametrize("zoom_level", [1e-4, 1000.0])
+def test_positions_stay_within_the_error(ocess, zoom_level):
+    encoder = corbit.snapshot.Encoder()
+    decoder = corbit.snapshot.Decoder()
+    allowed = corbit.snapshot.position_error(zoom_level)
+    sizes = []
+    for t, rows in ticks(ocess, 60, dt=TICK * 100):
+        message = encoder.encode(rows, t)
+        snapshot = decoder.decode(message)
+        # the decoder ends up with exactly what the encoder thinks it has, so errors never build up
+        assert numpy.array_equal(snapshot.numbers, encoder.sent[encoder.seq].numbers)
+        if encoder.acknowledged is not None:
+            exact = numpy.array([row[7:9] for row in rows])
+            error = numpy.abs(snapshot.numbers[:, 0:2] - exact)
+            assert (error <= encoder.error + 4 * numpy.spacing(numpy.abs(exact))).all()
+            sizes.append(len(message))
+        encoder.acknowledge(decoder.latest, zoom_level)
+    assert encoder.error == allowed
+    # deltas are a lot smaller than the first message, which has everything
+    assert max(sizes) < len(corbit.snapshot.Encoder().encode(ticks(ocess, 1)[0][1], 0.0)) / 2
+
+
+def test_bodies_coming_and_going(ocess):
+    rows = [corbit.mysqlio.entity_row(entity) for entity in ocess]
+    encoder = corbit.snapshot.Encoder()
+    decoder = corbit.snapshot.Decoder()
+    decoder.decode(encoder.encode(rows, 0.0))
+    encoder.acknowledge(decoder.latest)
+    snapshot = decoder.decode(encoder.encode(rows[1:] + [("entity", "Rock", 1.0, 1.0, 1, 2, 3) + rows[0][7:]], 1.0))
+    names = [row[1] for row in snapshot.rows()]
+    assert rows[0][1] not in names
+    assert "Rock" in names
+    assert len(names) == len(rows)
+
+
+def test_message_against_a_lost_one(ocess):
+    rows = [corbit.mysqlio.entity_row(entity) for entity in ocess]
+    encoder = corbit.snapshot.Encoder()
+    decoder = corbit.snapshot.Decoder()
+    decoder.decode(encoder.encode(rows, 0.0))
+    encoder.acknowledge(decoder.latest)
+    # a pilot that's lost track, e.g. it restarted
+    with pytest.raises(ValueError):
+        corbit.snapshot.Decoder().decode(encoder.encode(rows, 1.0))
+    encoder.reset()
+    assert corbit.snapshot.Decoder().decode(encoder.encode(rows, 2.0)).rows()[0][1] == rows[0][1]
+
+
+def test_irrelevant_bodies_are_sent_a_few_at_a_time(monkeypatch, ocess):
+    monkeypatch.setattr(corbit.snapshot, "LOW_RATE_BODIES", 2)
+    encoder = corbit.snapshot.Encoder()
+    decoder = corbit.snapshot.Decoder()
+    relevant = numpy.zeros(len(ocess), dtype=bool)
+    relevant[:3] = True
+    recorded = ticks(ocess, 4, dt=TICK * 1000)
+    decoder.decode(encoder.encode(recorded[0][1], recorded[0][0], relevant))
+    encoder.acknowledge(decoder.latest, 1000.0)
+    for t, rows in recorded[1:]:
+        base = encoder.sent[encoder.acknowledged]
+        snapshot = decoder.decode(encoder.encode(rows, t, relevant))
+        exact = numpy.array([row[7:9] for row in rows])
+        # the relevant ones are as good as ever
+        error = numpy.abs(snapshot.numbers[:3, 0:2] - exact[:3])
+        assert (error <= encoder.error + 4 * numpy.spacing(numpy.abs(exact[:3]))).all()
+        # and only 2 of the rest were sent, the others were just carried on from the last message
+        carried = corbit.snapshot.extrapolate(base.numbers, t - base.time)
+        moved = (snapshot.numbers[3:] != carried[3:]).any(axis=1)
+        assert moved.sum() <= 2
+        encoder.acknowledge(decoder.latest, 1000.0)
+
+
+def test_pilots_sharing_a_table(ocess):
+    recorded = ticks(ocess, 3, dt=TICK * 1000)
+    # a body that changes mass in the last tick has to be sent again, even though the table's the same shape
+    t, rows = recorded[-1]
+    recorded[-1] = (t, [rows[0][:2] + (rows[0][2] * 2,) + rows[0][3:]] + rows[1:])
+    sharing = [corbit.snapshot.Encoder(), corbit.snapshot.Encoder()]
+    alone = corbit.snapshot.Encoder()
+    decoder = corbit.snapshot.Decoder()
+    table = None
+    for t, rows in recorded:
+        table = corbit.snapshot.Table(rows, table)
+        message = alone.encode(rows, t)
+        assert [encoder.encode(table, t) for encoder in sharing] == [message, message]
+        snapshot = decoder.decode(message)
+        for encoder in sharing + [alone]:
+            encoder.acknowledge(decoder.latest)
+    assert snapshot.rows()[0][2] == rows[0][2]
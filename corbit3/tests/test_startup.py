@@ -0,0 +1,86 @@
+import importlib.util
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import CORBIT3
+
+
+def load_benchmark():
+    spec = importlib.util.spec_from_file_location("startup", os.path.join(CORBIT3, "benchmarks", "startup.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_heavy_imports_are_deferred():
+    # what the server needs before its first tick shouldn't drag in the database driver or scipy
+    output = subprocess.check_output(
+        [sys.executable, "-c", "import sys, corbit.mysqlio, corbit.storage, corbit.physics, corbit.lockstep; "
+                               "print('MySQLdb' in sys.modules, 'scipy' in sys.modules)"],
+        cwd=CORBIT3, universal_newlines=True)
+    assert output.split() == ["False", "False"]
+
+
+def test_pygame_imports_lazily():
+    pytest.importorskip("pygame.base")  # the vendored pygame only works on the Python it was built for
+    snippet = ("import sys, pygame; print('pygame.transform' in sys.modules, 'pygame.display' in sys.modules); "
+               "pygame.transform; print('pygame.transform' in sys.modules)")
+    environment = dict(os.environ, PYGAME_LAZY_IMPORT="1", PYGAME_EAGER_MODULES="display")
+    output = subprocess.check_output([sys.executable, "-c", snippet], cwd=CORBIT3, env=environment,
+                                     universal_newlines=True)
+    assert output.split() == ["False", "True", "True"]
+
+    # and without PYGAME_LAZY_IMPORT everything's imported straight away, like always
+    environment.pop("PYGAME_LAZY_IMPORT")
+    output = subprocess.check_output([sys.executable, "-c", snippet], cwd=CORBIT3, env=environment,
+                                     universal_newlines=True)
+    assert output.split() == ["True", "True", "True"]
+
+
+def test_server_stops_after_its_first_tick(tmp_path):
+    # the same run the benchmark times, against a SQLite file instead of MySQL
+    startup = load_benchmark()
+    seconds = startup.time_to(startup.FIRST_TICK, str(tmp_path / "corbit.sqlite3"))
+    assert 0 < seconds < startup.TIMEOUT
+
+
+def test_failed_start_fails(monkeypatch, tmp_path):
+    startup = load_benchmark()
+    monkeypatch.setattr(startup, "BASELINE_FILE", str(tmp_path / "startup_baseline.json"))
+    monkeypatch.setattr(startup, "import_times", lambda *arguments: [])
+    monkeypatch.setattr(sys, "argv", ["startup.py", "--save"])
+    monkeypatch.setattr(startup, "time_to", lambda *arguments: 1.0)
+    assert startup.main() == 0
+
+    def broken(entry_point, sqlite_file):
+        raise subprocess.CalledProcessError(1, [sys.executable, entry_point[0]])
+    monkeypatch.setattr(sys, "argv", ["startup.py"])
+    monkeypatch.setattr(startup, "time_to", broken)
+    assert startup.main() == 1
+
+
+def test_missing_baseline_fails(monkeypatch, tmp_path):
+    startup = load_benchmark()
+    monkeypatch.setattr(startup, "BASELINE_FILE", str(tmp_path / "startup_baseline.json"))
+    monkeypatch.setattr(startup, "time_to", lambda *arguments: 1.0)
+    monkeypatch.setattr(startup, "import_times", lambda *arguments: [])
+    monkeypatch.setattr(sys, "argv", ["startup.py"])
+    assert startup.main() == 1
+
+
+def test_regression_against_baseline(monkeypatch, tmp_path):
+    startup = load_benchmark()
+    monkeypatch.setattr(startup, "BASELINE_FILE", str(tmp_path / "startup_baseline.json"))
+    monkeypatch.setattr(startup, "import_times", lambda *arguments: [])
+    monkeypatch.setattr(sys, "argv", ["startup.py", "--save"])
+    monkeypatch.setattr(startup, "time_to", lambda *arguments: 1.0)
+    assert startup.main() == 0
+
+    monkeypatch.setattr(sys, "argv", ["startup.py"])
+    monkeypatch.setattr(startup, "time_to", lambda *arguments: 1.2)
+    assert startup.main() == 0
+    monkeypatch.setattr(startup, "time_to", lambda *arguments: 2.0)
+    assert startup.main() == 1
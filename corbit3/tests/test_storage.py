@@ -0,0 +1,154 @@
+import os
+
+import numpy
+import pytest
+
+import corbit.mysqlio
+import corbit.particles
+import corbit.sharedstate
+import corbit.storage
+import corbit.telemetry
+from conftest import empty_storage
+
+# What every storage backend has to do, see corbit.storage. Writes are committed before they're read back, since a
+# backend that batches them doesn't have to show them before then.
+
+
+@pytest.fixture(params=["memory", "sqlite", "shared memory", "mysql", "mysql, batched"])
+def storage(request, tmp_path):
+    """Every backend, not just the ones the storage fixture in conftest.py has. MySQL is only checked if CORBIT_MYSQL
+    is set to host,user,password,database, and that database gets emptied out!
+    """
+    yield from empty_storage(request.param, tmp_path)
+
+
+def test_base_is_abstract():
+    with pytest.raises(TypeError):
+        corbit.storage.Storage()
+
+
+def test_empty_after_flush(storage):
+    assert storage.get_entities() == []
+    assert storage.pop_commands() == []
+    assert storage.get_latest_state_hash() is None
+    assert len(storage.get_particles()[0]) == 0
+    assert storage.get_particles_generation() is None
+    assert storage.get_acknowledgement("pilot") is None
+    assert list(storage.get_telemetry()) == []
+
+
+def test_entities(storage, ocess):
+    # entities have to come back exactly, as new objects
+    storage.push_entities(ocess)
+    storage.commit()
+    retrieved = storage.get_entities()
+    assert sorted(corbit.mysqlio.entity_row(entity) for entity in retrieved) == \
+        sorted(corbit.mysqlio.entity_row(entity) for entity in ocess)
+    assert sorted((entity.name, type(entity).__name__) for entity in retrieved) == \
+        sorted((entity.name, type(entity).__name__) for entity in ocess)
+    assert not any(a is b for a in retrieved for b in ocess)
+
+    storage.push_entities(ocess[:3])
+    storage.commit()
+    assert sorted(entity.name for entity in storage.get_entities()) == sorted(entity.name for entity in ocess[:3])
+
+
+def test_some_entities(storage, ocess):
+    storage.push_entities(ocess)
+    storage.commit()
+    rows = [corbit.mysqlio.entity_row(entity) for entity in ocess]
+    assert sorted(storage.get_entity_rows([ocess[2].name, ocess[0].name, "nobody"])) == sorted([rows[0], rows[2]])
+    assert list(storage.get_entity_rows([])) == []
+
+
+def test_commands(storage):
+    # commands come back padded out, in order, once
+    storage.push_commands([("fire_rcs", "AC", 1.5), ("accelerate_time",)])
+    storage.push_commands([("open", "saves/OCESS.json", None)])
+    storage.commit()
+    assert storage.pop_commands() == [("fire_rcs", "AC", 1.5), ("accelerate_time", None, None),
+                                      ("open", "saves/OCESS.json", None)]
+    assert storage.pop_commands() == []
+
+
+def test_command_log_and_state_hashes(storage):
+    storage.push_command_log(5, [("a", None, 1.0), ("b", "AC", None)])
+    storage.push_command_log(7, [("c", None, None)])
+    storage.commit()
+    assert storage.get_command_log(6) == {7: [("c", None, None)]}
+    assert storage.get_command_log(0) == {5: [("a", None, 1.0), ("b", "AC", None)], 7: [("c", None, None)]}
+    storage.push_state_hash(60, "a" * 40)
+    storage.push_state_hash(120, "b" * 40)
+    storage.commit()
+    assert tuple(storage.get_latest_state_hash()) == (120, "b" * 40)
+
+
+def test_particles(storage):
+    particles = corbit.particles.Particles()
+    particles.add(numpy.random.RandomState(0).uniform(-1e12, 1e12, (100, 2)), numpy.zeros((100, 2)), (1, 2, 3))
+    storage.push_particles(particles)
+    storage.commit()
+    positions, colors = storage.get_particles()
+    assert positions.tolist() == particles.positions[:100].tolist()
+    assert colors.tolist() == particles.colors[:100].tolist()
+
+    generation = storage.get_particles_generation()
+    assert generation is not None
+    assert storage.get_particles_generation() == generation
+    particles.keep(numpy.arange(100) < 10)
+    storage.push_particles(particles)
+    storage.commit()
+    assert storage.get_particles_generation() not in (None, generation)
+    assert len(storage.get_particles()[0]) == 10
+
+
+def test_acknowledgements(storage):
+    storage.push_acknowledgement("pilot", 3, 1 / 60)
+    storage.push_acknowledgement("pilot", 4, 1 / 6)
+    storage.push_acknowledgement("other pilot", 1, 1 / 6)
+    storage.commit()
+    assert tuple(storage.get_acknowledgement("pilot")) == (4, 1 / 6)
+    assert storage.get_acknowledgement("nobody") is None
+
+
+def test_telemetry(storage, ocess):
+    # telemetry comes back in order, with None where a channel didn't make sense
+    telemetry = corbit.telemetry.Telemetry()
+    telemetry.watch("Habitat", "Earth")
+    telemetry.watch("Moon", "Earth")
+    rows = telemetry.compute(ocess) + [("Habitat", "Habitat", "altitude", None)]
+    storage.push_telemetry(rows[::-1])
+    storage.push_telemetry(rows)
+    storage.commit()
+    assert [tuple(row) for row in storage.get_telemetry()] == rows
+
+
+def test_pilot_reads_shared_memory(ocess):
+    name = "corbit-test-pilot-%d" % os.getpid()
+    server = corbit.storage.SharedMemoryStorage(corbit.storage.MemoryStorage(), server=True, name=name)
+    pilot = None
+    try:
+        server.flush()
+        server.push_entities(ocess)
+        # the pilot's own backend is empty, so anything it gets has come through shared memory
+        pilot = corbit.storage.SharedMemoryStorage(corbit.storage.MemoryStorage(), name=name)
+        rows = pilot.get_entity_rows()
+        assert rows == [corbit.mysqlio.entity_row(entity) for entity in ocess]
+        # the same list until the server writes again
+        assert pilot.get_entity_rows() is rows
+        server.push_entities(ocess[:2])
+        assert len(pilot.get_entity_rows()) == 2
+    finally:
+        if pilot is not None:
+            pilot.close()
+        server.close()
+    with pytest.raises(FileNotFoundError):
+        corbit.sharedstate.SharedWorld(name)
+
+
+def test_pilot_without_a_server_uses_the_backend(ocess):
+    backend = corbit.storage.MemoryStorage()
+    backend.push_entities(ocess[:3])
+    pilot = corbit.storage.SharedMemoryStorage(backend, name="corbit-test-nobody-%d" % os.getpid())
+    assert pilot.world is None
+    assert len(pilot.get_entity_rows()) == 3
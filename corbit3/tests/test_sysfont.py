@@ -0,0 +1,76 @@
+import importlib.util
+import os
+
+import pytest
+
+from conftest import CORBIT3
+
+
+@pytest.fixture
+def sysfont(monkeypatch, tmp_path):
+    """The vendored pygame's sysfont on its own, since the rest of the vendored pygame might not load here, with
+    its font cache and font directories in tmp_path, and a pretend fc-list that counts how often it's run
+    """
+    spec = importlib.util.spec_from_file_location("sysfont", os.path.join(CORBIT3, "pygame", "sysfont.py"))
+    sysfont = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(sysfont)
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    (tmp_path / "fonts").mkdir()
+    monkeypatch.setattr(sysfont, "_unix_font_roots", [str(tmp_path / "fonts")])
+    sysfont.fc_list_runs = 0
+
+    def fc_list():
+        sysfont.fc_list_runs += 1
+        fonts = {}
+        sysfont._addfont("dejavusans", False, False, "/fonts/DejaVuSans.ttf", fonts)
+        sysfont._addfont("dejavusans", True, False, "/fonts/DejaVuSans-Bold.ttf", fonts)
+        return fonts
+    monkeypatch.setattr(sysfont, "initsysfonts_unix", fc_list)
+    return sysfont
+
+
+def test_second_start_uses_the_cache(sysfont):
+    fonts = sysfont.initsysfonts_unix_cached()
+    assert sysfont.fc_list_runs == 1
+    assert os.path.isfile(sysfont._unix_cache_path())
+    assert sysfont.initsysfonts_unix_cached() == fonts
+    assert sysfont.fc_list_runs == 1
+    assert sysfont._unix_cached_key is not None
+
+
+def test_stale_cache_is_refreshed(sysfont, tmp_path):
+    sysfont.initsysfonts_unix_cached()
+    key, _ = sysfont._read_unix_cache()
+    # nothing's changed, so fc-list isn't run again
+    sysfont._refresh_unix_cache(key)
+    assert sysfont.fc_list_runs == 1
+
+    (tmp_path / "fonts" / "new").mkdir()
+    sysfont._refresh_unix_cache(key)
+    assert sysfont.fc_list_runs == 2
+    assert "dejavusans" in sysfont.Sysfonts
+    assert sysfont._read_unix_cache()[0] != key
+
+
+def test_broken_cache_is_ignored(sysfont):
+    os.makedirs(os.path.dirname(sysfont._unix_cache_path()))
+    with open(sysfont._unix_cache_path(), "w") as cachefile:
+        cachefile.write("{not json")
+    assert sysfont._read_unix_cache() == (None, None)
+    assert "dejavusans" in sysfont.initsysfonts_unix_cached()
+    assert sysfont.fc_list_runs == 1
+
+
+def test_refresh_swaps_the_tables_in_whole(sysfont, tmp_path):
+    fonts = sysfont.initsysfonts_unix_cached()
+    key, _ = sysfont._read_unix_cache()
+    sysfont.Sysfonts.update(fonts)
+    sysfont.create_aliases()
+    before = sysfont.Sysfonts
+    contents = dict(before)
+
+    (tmp_path / "fonts" / "new").mkdir()
+    sysfont._refresh_unix_cache(key)
+    # a lookup half way through in another thread still has the whole of the old table
+    assert before == contents
+    assert sysfont.Sysfonts is not before and "dejavusans" in sysfont.Sysfonts
@@ -0,0 +1,116 @@
+import itertools
+
+import numpy
+import pytest
+from unum.units import m, s
+
+import corbit.ingest
+import corbit.lockstep
+import corbit.mysqlio
+import corbit.objects
+import corbit.physics
+import corbit.storage
+import corbit.telemetry
+from conftest import copy
+
+
+def add_gravity(entities):
+    """What the server does every tick before resolve_collisions(), see server.py"""
+    for A, B in itertools.combinations(entities, 2):
+        gravity = corbit.physics.gravitational_force(A, B)
+        theta = corbit.physics.angle(A, B)
+        A.accelerate(gravity, theta)
+        B.accelerate(-gravity, theta)
+
+
+def test_same_as_physics(small_world):
+    telemetry = corbit.telemetry.Telemetry(list(corbit.telemetry.CHANNELS))
+    telemetry.watch("Habitat", "Earth")
+    telemetry.watch("AYSE", "Moon")
+    readings = corbit.telemetry.readings(telemetry.compute(small_world))
+    assert set(readings) == {("Habitat", "Earth"), ("AYSE", "Moon")}
+    for craft, reference in readings:
+        A = corbit.objects.find_entity(craft, small_world)
+        B = corbit.objects.find_entity(reference, small_world)
+        reading = readings[(craft, reference)]
+        for channel, function in [("altitude", corbit.physics.altitude), ("speed", corbit.physics.speed),
+                                  ("orbital_speed", corbit.physics.Vorbit), ("periapsis", corbit.physics.periapsis),
+                                  ("apoapsis", corbit.physics.apoapsis)]:
+            unit = corbit.telemetry.CHANNELS[channel][1]
+            assert reading[channel].asNumber(unit) == pytest.approx(function(A, B).asNumber(unit), rel=1e-9, abs=1e-6)
+        assert reading["eccentricity"] == pytest.approx(corbit.physics.ecc(A, B), rel=1e-9)
+
+
+def test_acceleration_is_without_the_references_pull(small_world):
+    entities = copy(small_world)
+    for entity in entities:
+        entity.acceleration = 0 * entity.acceleration  # nobody's firing their engines
+    add_gravity(entities)
+    habitat = corbit.objects.find_entity("Habitat", entities)
+    earth = corbit.objects.find_entity("Earth", entities)
+    telemetry = corbit.telemetry.Telemetry()
+    telemetry.watch("Habitat", "Earth")
+    acceleration = corbit.telemetry.readings(telemetry.compute(entities))[("Habitat", "Earth")]["acceleration"]
+    # the Moon's (and AYSE's) pull is all that's left, a lot less than Earth's
+    earth_pull = numpy.linalg.norm((corbit.physics.gravitational_force(habitat, earth) / habitat.mass_fun())
+                                   .asNumber(m / s / s))
+    assert 0 < acceleration.asNumber(m / s / s) < 1e-3 * earth_pull
+
+    # it's there for the server to read until resolve_collisions() uses it up, which is why telemetry goes before it
+    corbit.physics.resolve_collisions(entities, 1 / 60 * s)
+    assert telemetry.compute(entities)[2][3] == pytest.approx(earth_pull, rel=1e-6)
+
+
+def test_lockstep_step_shows_the_accelerations(small_world):
+    entities = corbit.lockstep.canonical_order(copy(small_world))
+    expected = copy(entities)
+    add_gravity(expected)
+    seen = []
+    corbit.lockstep.step(entities, 1 / 60 * s,
+                         after_gravity=lambda: seen.append([entity.acceleration.asNumber(m / s / s).tolist()
+                                                            for entity in entities]))
+    assert seen == [[entity.acceleration.asNumber(m / s / s).tolist() for entity in expected]]
+
+
+def test_commands():
+    telemetry = corbit.telemetry.Telemetry()
+    assert telemetry.act_on_command((corbit.telemetry.WATCH, corbit.telemetry.pair_target("AYSE", "Moon"), None))
+    assert telemetry.act_on_command((corbit.telemetry.WATCH, corbit.telemetry.pair_target("AYSE", "Moon"), None))
+    assert telemetry.act_on_command((corbit.telemetry.WATCH, "nonsense", None))
+    assert telemetry.pairs == [("AYSE", "Moon")]
+    assert telemetry.act_on_command((corbit.telemetry.FORGET, corbit.telemetry.pair_target("AYSE", "Moon"), None))
+    assert telemetry.pairs == []
+    assert not telemetry.act_on_command(("fire_rcs", "AYSE", 0))
+    with pytest.raises(ValueError):
+        corbit.telemetry.Telemetry(["altitude", "colour"])
+
+
+def test_only_pairs_that_are_there(small_world):
+    telemetry = corbit.telemetry.Telemetry(["altitude"])
+    telemetry.watch("Habitat", "Earth")
+    telemetry.watch("Habitat", "Mars")
+    telemetry.watch("Habitat", "Habitat")
+    assert [row[:3] for row in telemetry.compute(small_world)] == [("Habitat", "Earth", "altitude")]
+
+
+def test_readings():
+    readings = corbit.telemetry.readings([("AC", "Earth", "altitude", 5.0), ("AC", "Earth", "periapsis", None),
+                                          ("AC", "Earth", "eccentricity", 0.5), ("AC", "Moon", "speed", 2.0)])
+    assert readings == {("AC", "Earth"): {"altitude": 5.0 * m, "periapsis": None, "eccentricity": 0.5},
+                        ("AC", "Moon"): {"speed": 2.0 * m / s}}
+
+
+def test_pilot_gets_telemetry_from_ingest(small_world):
+    storage = corbit.storage.MemoryStorage()
+    storage.push_entities(small_world)
+    ingest = corbit.ingest.StateIngest(storage, "pilot", particles=False)
+    assert list(ingest.read()[3]) == []
+
+    # what the pilot sends when its control or reference changes, through to what the server publishes
+    telemetry = corbit.telemetry.Telemetry()
+    storage.push_commands([(corbit.telemetry.WATCH, corbit.telemetry.pair_target("AYSE", "Moon"), None)])
+    for command in storage.pop_commands():
+        telemetry.act_on_command(command)
+    storage.push_telemetry(telemetry.compute(small_world))
+    readings = corbit.telemetry.readings(ingest.read()[3])
+    assert set(readings[("AYSE", "Moon")]) == set(corbit.telemetry.DEFAULT_CHANNELS)
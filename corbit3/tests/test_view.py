@@ -0,0 +1,60 @@
+import numpy
+import pytest
+
+import corbit.mysqlio
+import corbit.objects
+import corbit.view
+
+
+def brute_force(positions, radii, left, bottom, right, top):
+    dx = positions[:, 0] - numpy.clip(positions[:, 0], left, right)
+    dy = positions[:, 1] - numpy.clip(positions[:, 1], bottom, top)
+    return numpy.flatnonzero(dx * dx + dy * dy <= radii * radii)
+
+
+def test_pack_rows_matches_entities(ocess):
+    positions, radii = corbit.view.pack_rows([corbit.mysqlio.entity_row(entity) for entity in ocess])
+    assert positions.tolist() == [entity.displacement.asNumber().tolist() for entity in ocess]
+    assert radii.tolist() == [entity.radius.asNumber() for entity in ocess]
+
+
+def test_pack_rows_with_nothing():
+    positions, radii = corbit.view.pack_rows([])
+    assert positions.shape == (0, 2) and radii.shape == (0,)
+
+
+def test_spatial_index_finds_what_brute_force_does():
+    random = numpy.random.RandomState(0)
+    positions = random.uniform(-1e9, 1e9, (2000, 2))
+    radii = numpy.where(random.uniform(size=2000) < 0.01, 1e8, random.uniform(1, 1e6, 2000))
+    index = corbit.view.SpatialIndex(positions, radii)
+    for _ in range(50):
+        x, y = random.uniform(-1e9, 1e9, 2)
+        half = random.uniform(1e3, 3e8)
+        rectangle = (x - half, y - half, x + half, y + half)
+        assert index.query(*rectangle).tolist() == brute_force(positions, radii, *rectangle).tolist()
+
+
+def test_view_rectangle_is_relative_to_origin(ocess):
+    camera = corbit.objects.Camera(0.001, "Earth")
+    camera.update(corbit.objects.find_entity("Earth", ocess))
+    earth = corbit.objects.find_entity("Earth", ocess).displacement.asNumber()
+    left, bottom, right, top = corbit.view.view_rectangle(camera, (1000, 500), earth)
+    assert (left, bottom, right, top) == pytest.approx((-5e5, -2.5e5, 5e5, 2.5e5))
+
+
+def test_world_to_screen_flips_y():
+    screen = corbit.view.world_to_screen(numpy.array([[0.0, 0.0], [10.0, 10.0]]), (0, 0), 2.0, (100, 50))
+    assert screen.tolist() == [[50.0, 25.0], [70.0, 5.0]]
+
+
+def test_view_rectangle_corners_are_the_screen_corners(ocess):
+    # y goes up in the world and down on screen, so the bottom left of the view is the bottom left of the screen
+    earth = corbit.objects.find_entity("Earth", ocess)
+    camera = corbit.objects.Camera(0.001, "Earth")
+    camera.update(earth)
+    origin = earth.displacement.asNumber()
+    left, bottom, right, top = corbit.view.view_rectangle(camera, (1000, 500), origin)
+    corners = corbit.view.world_to_screen(numpy.array([[left, bottom], [right, top]]),
+                                            camera.displacement.asNumber() - origin, camera.zoom_level, (1000, 500))
+    assert corners.tolist() == [pytest.approx([0, 500]), pytest.approx([1000, 0])]